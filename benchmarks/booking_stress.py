@@ -0,0 +1,169 @@
+"""
+Prueba de estrés de reservas concurrentes: varios procesos (como workers de
+gunicorn) con varios hilos cada uno crean y mueven citas del mismo
+profesional en una ventana chica de horarios, para que casi todas choquen.
+
+Al final verifica en la base que no haya dos citas activas solapadas del
+mismo profesional (ver project.booking) y termina con error si las hay.
+
+Uso:
+    python -m benchmarks.booking_stress [--processes 4] [--threads 8]
+        [--requests 200] [--hours 10] [--db /ruta/existente.db]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+DAY = datetime(2030, 1, 7, 8, 0)
+
+
+def _configure_env():
+    # Muchos logins simultáneos: bcrypt barato y sin ruido del log de consultas lentas
+    os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+    os.environ.setdefault('SLOW_QUERY_SECONDS', '10')
+
+
+def prepare(db_path):
+    _configure_env()
+    from benchmarks import datagen
+    from benchmarks.common import make_app
+
+    app = make_app(db_path)
+    with app.app_context():
+        datagen.generate(professionals=1, clients=5, years=0, per_day=0, notifications=0)
+
+
+def random_slot(rng, hours):
+    start = DAY + timedelta(minutes=15 * rng.randrange(hours * 4))
+    return start, start + timedelta(minutes=rng.choice((30, 45, 60)))
+
+
+def run_thread(client, seed, count, hours, stats, lock):
+    rng = random.Random(seed)
+    created = []
+    local = Counter()
+    for i in range(count):
+        start, end = random_slot(rng, hours)
+        body = {
+            'start_datetime': start.strftime('%Y-%m-%dT%H:%M'),
+            'end_datetime': end.strftime('%Y-%m-%dT%H:%M'),
+        }
+        try:
+            if created and rng.random() < 0.3:
+                # Mover una cita propia, como un drag-and-drop en el calendario
+                response = client.put(f'/api/appointments/{rng.choice(created)}', json=body)
+                kind = 'move'
+            else:
+                body['patient_name'] = f'Estrés {seed}-{i}'
+                response = client.post('/api/appointments', json=body)
+                kind = 'create'
+        except Exception as error:  # la app propaga la excepción en modo TESTING
+            local[f'error: {str(error).splitlines()[0][:80]}'] += 1
+            continue
+        if response.status_code in (200, 201):
+            local[f'{kind} ok'] += 1
+            if kind == 'create':
+                created.append(response.get_json()['id'])
+        elif response.status_code == 400 and 'solapa' in response.get_json().get('error', ''):
+            local[f'{kind} rechazada (solapa)'] += 1
+        else:
+            local[f'{kind} HTTP {response.status_code}'] += 1
+    with lock:
+        stats.update(local)
+
+
+def worker(db_path, index, threads, count, hours, ready, start, results):
+    _configure_env()
+    from benchmarks import datagen
+    from benchmarks.common import login, make_app
+
+    app = make_app(db_path, setup=False)
+    clients = []
+    for _ in range(threads):
+        client = app.test_client()
+        login(client, datagen.professional_name(0), datagen.PASSWORD)
+        clients.append(client)
+
+    stats, lock = Counter(), threading.Lock()
+    pool = [
+        threading.Thread(target=run_thread, args=(client, index * 1000 + t, count, hours, stats, lock))
+        for t, client in enumerate(clients)
+    ]
+    ready.put(index)
+    start.wait()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(stats)
+
+
+def count_double_bookings(db_path):
+    """Pares de citas activas del mismo profesional que se solapan."""
+    import sqlite3
+
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("""
+            SELECT COUNT(*) FROM appointment a JOIN appointment b
+              ON a.professional_id = b.professional_id AND a.id < b.id
+             AND a.start_datetime < b.end_datetime AND b.start_datetime < a.end_datetime
+             WHERE a.status IN ('programada', 'completada') AND b.status IN ('programada', 'completada')
+        """).fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8, help='Hilos por proceso')
+    parser.add_argument('--requests', type=int, default=200, help='Requests por hilo')
+    parser.add_argument('--hours', type=int, default=10, help='Horas de la ventana disputada')
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    fd, db_path = tempfile.mkstemp(suffix='.db', prefix='agendapro-stress-')
+    os.close(fd)
+    os.remove(db_path)
+
+    setup = ctx.Process(target=prepare, args=(db_path,))
+    setup.start()
+    setup.join()
+
+    ready, start, results = ctx.Queue(), ctx.Event(), ctx.Queue()
+    processes = [
+        ctx.Process(target=worker, args=(db_path, i, args.threads, args.requests, args.hours, ready, start, results))
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.get()
+    began = time.perf_counter()
+    start.set()
+    stats = sum((results.get() for _ in processes), Counter())
+    elapsed = time.perf_counter() - began
+    for process in processes:
+        process.join()
+
+    double_bookings = count_double_bookings(db_path)
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    total = sum(stats.values())
+    print(f'{args.processes} procesos x {args.threads} hilos: {total} requests en {elapsed:.1f} s '
+          f'({total / elapsed:.0f}/s)')
+    for key, value in sorted(stats.items()):
+        print(f'  {key:32} {value:6}')
+    print(f'Citas solapadas en la base: {double_bookings}')
+    if double_bookings:
+        raise SystemExit('Doble reserva detectada')
+
+
+if __name__ == '__main__':
+    main()
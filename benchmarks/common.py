@@ -0,0 +1,56 @@
+"""
+Utilidades compartidas por los scripts de benchmark.
+
+Los benchmarks crean su propia base SQLite temporal; nunca tocan la base
+configurada en DATABASE_URL.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+def make_app(db_path=None, setup=True):
+    """Crea la app apuntando a una base SQLite temporal (con esquema y usuarios de prueba)."""
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(suffix='.db', prefix='agendapro-bench-')
+        os.close(fd)
+        os.remove(db_path)
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    # Los benchmarks inician sesión muchas veces desde la misma "IP"
+    for name in ('LOGIN_RATE_PER_IP', 'LOGIN_RATE_PER_USERNAME', 'REGISTER_RATE_PER_IP'):
+        os.environ.setdefault(name, '1000000/1')
+    # Sin los hilos del outbox, del scheduler y del relay, para que sus consultas no se cuenten en las mediciones
+    os.environ.setdefault('OUTBOX_WORKER_THREAD', '0')
+    os.environ.setdefault('SCHEDULER_THREAD', '0')
+    os.environ.setdefault('RELAY_POLL_SECONDS', '0')
+
+    from project import create_app
+    from project.seed import setup_database
+    app = create_app()
+    app.config['TESTING'] = True
+    if setup:
+        with app.app_context():
+            setup_database(verbose=False)
+    return app
+
+
+def login(client, username, password):
+    client.get('/logout')
+    return client.post('/login', data={'username': username, 'password': password})
+
+
+@contextmanager
+def count_statements(engine):
+    """Cuenta las sentencias SQL ejecutadas dentro del bloque."""
+    counter = {'count': 0}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter['count'] += 1
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
@@ -0,0 +1,243 @@
+"""
+Escrituras concurrentes sobre un mismo archivo SQLite desde varios procesos,
+como varios workers de gunicorn: cada escritor es un profesional que crea
+citas por POST /api/appointments mientras otros procesos leen su calendario.
+
+Compara dos perfiles de SQLite (cada uno con una base nueva):
+  - legacy: lo que usaba la app antes (journal DELETE, synchronous FULL, el
+    timeout de 5 s por defecto de sqlite3, sin mmap y caché de 2 MB)
+  - tuned: Config.SQLITE_PRAGMAS (WAL, synchronous NORMAL, busy_timeout, mmap)
+
+Informa escrituras por segundo, latencias y los errores ("database is locked").
+
+Además verifica que /api/availability deje de ofrecer un horario reservado
+por otro proceso después de una vuelta del relay (ConflictEngine.sync), aunque
+la disponibilidad del día ya estuviera en la caché del proceso que la lee.
+
+Uso:
+    python -m benchmarks.concurrent_writes [--writers 4] [--readers 2]
+        [--writes 200] [--reads 400] [--profiles legacy,tuned]
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+PROFILES = {
+    'legacy': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_BUSY_TIMEOUT_MS': '5000',
+        'SQLITE_MMAP_SIZE': '0',
+        'SQLITE_CACHE_SIZE': '-2000',
+    },
+    # Los valores por defecto de Config
+    'tuned': {},
+}
+
+
+def _setup_app(db_path, profile, setup=False):
+    # Cada proceso lee Config al importar project: el perfil va antes
+    os.environ.update(PROFILES[profile])
+    # Las esperas por el lock son lo que se mide: no llenar la salida con el log de consultas lentas
+    os.environ.setdefault('SLOW_QUERY_SECONDS', '10')
+    from benchmarks.common import make_app
+    return make_app(db_path, setup=setup)
+
+
+def prepare(db_path, profile, writers):
+    from benchmarks import datagen
+
+    app = _setup_app(db_path, profile, setup=True)
+    with app.app_context():
+        datagen.generate(professionals=writers, clients=10, years=0, per_day=0, notifications=0)
+
+
+AVAILABILITY_DAY = datetime(2030, 3, 1)
+AVAILABILITY_URL = '/api/availability?start=2030-03-01&end=2030-03-02&duration=30'
+
+
+def availability_reader(db_path, profile, commands, answers):
+    """Lee la disponibilidad del primer profesional con la caché del proceso."""
+    from benchmarks import datagen
+    from benchmarks.common import login
+    from project.relay import relay
+
+    app = _setup_app(db_path, profile)
+    client = app.test_client()
+    login(client, datagen.professional_name(0), datagen.PASSWORD)
+    booked = (AVAILABILITY_DAY + timedelta(hours=10)).strftime('%Y-%m-%dT%H:%M')
+    for command in iter(commands.get, None):
+        if command == 'sync':
+            # Una vuelta del hilo del relay (desactivado en los benchmarks)
+            relay.poll()
+        slots = client.get(AVAILABILITY_URL).json['professionals'][0]['slots']
+        answers.put(any(slot['start'].startswith(booked) for slot in slots))
+
+
+def availability_writer(db_path, profile, results):
+    from benchmarks import datagen
+    from benchmarks.common import login
+
+    app = _setup_app(db_path, profile)
+    client = app.test_client()
+    login(client, datagen.professional_name(0), datagen.PASSWORD)
+    slot = AVAILABILITY_DAY + timedelta(hours=10)
+    response = client.post('/api/appointments', json={
+        'patient_name': 'Reserva de otro proceso',
+        'start_datetime': slot.strftime('%Y-%m-%dT%H:%M'),
+        'end_datetime': (slot + timedelta(minutes=30)).strftime('%Y-%m-%dT%H:%M'),
+    })
+    results.put(response.status_code)
+
+
+def check_availability(profile):
+    """Reserva en un proceso y lee la disponibilidad en otro."""
+    ctx = multiprocessing.get_context('spawn')
+    fd, db_path = tempfile.mkstemp(suffix='.db', prefix=f'agendapro-{profile}-availability-')
+    os.close(fd)
+    os.remove(db_path)
+
+    setup = ctx.Process(target=prepare, args=(db_path, profile, 1))
+    setup.start()
+    setup.join()
+
+    commands, answers, results = ctx.Queue(), ctx.Queue(), ctx.Queue()
+    reader = ctx.Process(target=availability_reader, args=(db_path, profile, commands, answers))
+    reader.start()
+    commands.put('sync')
+    offered_before = answers.get()
+
+    writer = ctx.Process(target=availability_writer, args=(db_path, profile, results))
+    writer.start()
+    status = results.get()
+    writer.join()
+
+    commands.put('read')
+    offered_cached = answers.get()
+    commands.put('sync')
+    offered_after = answers.get()
+    commands.put(None)
+    reader.join()
+
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    ok = offered_before and status == 201 and not offered_after
+    print(f'{profile:7} disponibilidad entre procesos: {"OK" if ok else "FALLA"}   '
+          f'(antes {offered_before}, reserva HTTP {status}, con caché {offered_cached}, '
+          f'tras sincronizar {offered_after})')
+    return ok
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+
+def worker(db_path, profile, role, index, count, ready, start, results):
+    from benchmarks import datagen
+    from benchmarks.common import login
+
+    app = _setup_app(db_path, profile)
+    client = app.test_client()
+    username = datagen.professional_name(index)
+    login(client, username, datagen.PASSWORD)
+    base = datetime(2030, 1, 1, 8, 0)
+    month = '/api/appointments?start=2030-01-01T00:00:00&end=2030-02-01T00:00:00'
+
+    ready.put(index)
+    start.wait()
+    latencies, errors = [], Counter()
+    for i in range(count):
+        t = time.perf_counter()
+        try:
+            if role == 'writer':
+                slot = base + timedelta(hours=i)
+                response = client.post('/api/appointments', json={
+                    'patient_name': f'Paciente {index}-{i}',
+                    'start_datetime': slot.strftime('%Y-%m-%dT%H:%M'),
+                    'end_datetime': (slot + timedelta(minutes=30)).strftime('%Y-%m-%dT%H:%M'),
+                })
+            else:
+                response = client.get(month)
+            if response.status_code >= 300:
+                errors[f'HTTP {response.status_code}'] += 1
+                continue
+        except Exception as error:  # la app propaga la excepción en modo TESTING
+            errors[str(error).splitlines()[0][:80]] += 1
+            continue
+        latencies.append(time.perf_counter() - t)
+    results.put((role, time.perf_counter(), latencies, errors))
+
+
+def run_profile(profile, args):
+    ctx = multiprocessing.get_context('spawn')
+    fd, db_path = tempfile.mkstemp(suffix='.db', prefix=f'agendapro-{profile}-')
+    os.close(fd)
+    os.remove(db_path)
+
+    setup = ctx.Process(target=prepare, args=(db_path, profile, args.writers))
+    setup.start()
+    setup.join()
+
+    ready, start, results = ctx.Queue(), ctx.Event(), ctx.Queue()
+    processes = [
+        ctx.Process(target=worker, args=(db_path, profile, 'writer', i, args.writes, ready, start, results))
+        for i in range(args.writers)
+    ] + [
+        ctx.Process(target=worker, args=(db_path, profile, 'reader', i % args.writers, args.reads, ready, start, results))
+        for i in range(args.readers)
+    ]
+    for process in processes:
+        process.start()
+    # Medir desde que todos importaron la app e iniciaron sesión
+    for _ in processes:
+        ready.get()
+    began = time.perf_counter()
+    start.set()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    writes = [r for r in collected if r[0] == 'writer']
+    reads = [r for r in collected if r[0] == 'reader']
+    write_latencies = [lat for r in writes for lat in r[2]]
+    read_latencies = [lat for r in reads for lat in r[2]]
+    elapsed = max(r[1] for r in writes) - began
+    errors = sum((r[3] for r in collected), Counter())
+
+    print(f'{profile:7} escrituras {len(write_latencies):6}  {len(write_latencies) / elapsed:7.1f}/s   '
+          f'p50 {_percentile(write_latencies, 50) * 1000:7.1f} ms   p95 {_percentile(write_latencies, 95) * 1000:7.1f} ms   '
+          f'p99 {_percentile(write_latencies, 99) * 1000:7.1f} ms   lecturas p95 {_percentile(read_latencies, 95) * 1000:7.1f} ms   '
+          f'errores {sum(errors.values())}')
+    for message, count in errors.most_common(5):
+        print(f'          {count:5} x {message}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=2)
+    parser.add_argument('--writes', type=int, default=200, help='Citas por escritor')
+    parser.add_argument('--reads', type=int, default=400, help='Lecturas por lector')
+    parser.add_argument('--profiles', default='legacy,tuned')
+    args = parser.parse_args()
+
+    for profile in args.profiles.split(','):
+        if profile not in PROFILES:
+            parser.error(f'Perfil desconocido: {profile}')
+        run_profile(profile, args)
+        check_availability(profile)
+
+
+if __name__ == '__main__':
+    main()
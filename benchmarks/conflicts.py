@@ -0,0 +1,97 @@
+"""
+Compara el índice de conflictos en memoria (project.conflicts) con la
+consulta SQL de solapamiento, para un profesional con muchas citas.
+
+Uso:
+    python -m benchmarks.conflicts [--appointments 100000] [--checks 2000]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import make_app
+
+
+def sql_first_conflict(professional_id, start, end):
+    """La verificación original: una consulta por candidato."""
+    from project.models import Appointment, ACTIVE_STATUSES
+
+    return Appointment.query.filter(
+        Appointment.professional_id == professional_id,
+        Appointment.status.in_(ACTIVE_STATUSES),
+        Appointment.start_datetime < end,
+        Appointment.end_datetime > start
+    ).first()
+
+
+def populate(professional_id, appointments):
+    from project import db
+    from project.models import Appointment
+
+    base = datetime(2020, 1, 1, 8, 0)
+    rows = []
+    for i in range(appointments):
+        # Citas de 30 minutos cada 45 minutos, con algunos huecos
+        start = base + timedelta(minutes=45 * i)
+        rows.append({
+            'patient_name': f'Paciente {i}',
+            'start_datetime': start,
+            'end_datetime': start + timedelta(minutes=30),
+            'status': 'cancelada' if i % 10 == 0 else 'programada',
+            'professional_id': professional_id
+        })
+    db.session.execute(Appointment.__table__.insert(), rows)
+    db.session.commit()
+    return base, base + timedelta(minutes=45 * appointments)
+
+
+def timed(label, fn, count):
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    print(f'{label:42} {elapsed * 1000:10.1f} ms   {elapsed / count * 1e6:9.1f} µs/op')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--appointments', type=int, default=100000)
+    parser.add_argument('--checks', type=int, default=2000)
+    args = parser.parse_args()
+
+    from project.conflicts import conflict_engine
+    from project.models import User
+
+    app = make_app()
+    with app.app_context():
+        professional_id = User.query.filter_by(username='doctor').first().id
+        first, last = populate(professional_id, args.appointments)
+
+        rng = random.Random(7)
+        span = int((last - first).total_seconds() // 60)
+        candidates = []
+        for _ in range(args.checks):
+            start = first + timedelta(minutes=rng.randrange(span))
+            candidates.append((start, start + timedelta(minutes=rng.choice([15, 30, 60]))))
+
+        print(f'{args.appointments} citas, {args.checks} verificaciones\n')
+        sql = timed('SQL (una consulta por verificación)',
+                    lambda: [sql_first_conflict(professional_id, s, e) is not None for s, e in candidates],
+                    args.checks)
+        timed('Construcción del índice', lambda: conflict_engine.index_for(professional_id), 1)
+        mem = timed('Índice: overlaps()',
+                    lambda: [conflict_engine.overlaps(professional_id, s, e) for s, e in candidates],
+                    args.checks)
+        timed('Índice: check_many() (lote)',
+              lambda: conflict_engine.check_many(professional_id, candidates), args.checks)
+        timed('Índice: next_free_slot(90 min)',
+              lambda: [conflict_engine.next_free_slot(professional_id, timedelta(minutes=90), s) for s, _ in candidates],
+              args.checks)
+
+        assert sql == mem, 'El índice y la consulta SQL no coinciden'
+        print('\nResultados idénticos entre SQL e índice')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Genera una clínica sintética para los benchmarks de carga: profesionales,
+clientes, años de citas (de lunes a viernes, sin solapamientos por
+profesional) y notificaciones leídas y no leídas.
+
+Mezcla de estados:
+  - pasadas: 70% completadas, 20% canceladas, 10% programadas sin cerrar
+  - futuras: 90% programadas, 10% canceladas
+
+Todos los usuarios generados usan la contraseña PASSWORD. Las filas se
+insertan con Core en lotes y llevan un change_seq propio (ver
+project.changes), así que la sincronización incremental las ve como un
+único cambio.
+
+Uso:
+    python -m benchmarks.datagen --db /tmp/clinica.db [--professionals 10]
+        [--clients 500] [--years 2] [--per-day 8] [--notifications 20]
+"""
+import argparse
+import os
+import random
+import time
+from datetime import timedelta
+
+PASSWORD = 'bench123'
+BATCH_SIZE = 5000
+FUTURE_DAYS = 60
+
+
+def professional_name(i):
+    return f'pro_{i}'
+
+
+def client_name(i):
+    return f'cli_{i}'
+
+
+def _insert_batches(model, rows):
+    from project import db
+
+    for i in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(db.insert(model), rows[i:i + BATCH_SIZE])
+
+
+def _pick_status(rng, start, now):
+    roll = rng.random()
+    if start < now:
+        if roll < 0.7:
+            return 'completada'
+        return 'cancelada' if roll < 0.9 else 'programada'
+    return 'cancelada' if roll < 0.1 else 'programada'
+
+
+def generate(professionals=10, clients=500, years=2, per_day=8, notifications=20, seed=42):
+    """
+    Inserta los datos en la base de la app actual (requiere app context).
+
+    Returns:
+        dict con la cantidad de filas creadas por tipo.
+    """
+    from project import db, security
+    from project.changes import next_change_seq
+    from project.models import Appointment, Notification, User, get_peru_time
+    from project.versions import bump_users
+
+    rng = random.Random(seed)
+    password_hash = security.hash_password(PASSWORD)
+    now = get_peru_time().replace(tzinfo=None)
+
+    users = [
+        {'username': professional_name(i), 'email': f'{professional_name(i)}@example.com',
+         'password_hash': password_hash, 'role': 'profesional', 'is_active': True, 'created_at': now}
+        for i in range(professionals)
+    ] + [
+        {'username': client_name(i), 'email': f'{client_name(i)}@example.com',
+         'password_hash': password_hash, 'role': 'cliente', 'is_active': rng.random() > 0.02,
+         'created_at': now}
+        for i in range(clients)
+    ]
+    _insert_batches(User, users)
+
+    ids = dict(db.session.execute(
+        db.select(User.username, User.id).where(User.username.in_([u['username'] for u in users]))
+    ).all())
+    professional_ids = [ids[professional_name(i)] for i in range(professionals)]
+    client_ids = [ids[client_name(i)] for i in range(clients)]
+
+    seq = next_change_seq(db.session.connection())
+    appointments = []
+    day = (now - timedelta(days=365 * years)).replace(hour=0, minute=0, second=0, microsecond=0)
+    last_day = now + timedelta(days=FUTURE_DAYS)
+    while day < last_day:
+        if day.weekday() < 5:
+            for professional_id in professional_ids:
+                start = day + timedelta(hours=8)
+                for _ in range(per_day):
+                    duration = timedelta(minutes=rng.choice((30, 30, 45, 60)))
+                    end = start + duration
+                    if end > day + timedelta(hours=18):
+                        break
+                    status = _pick_status(rng, start, now)
+                    client_id = rng.choice(client_ids) if client_ids and rng.random() < 0.85 else None
+                    appointments.append({
+                        'patient_name': f'Paciente {len(appointments)}',
+                        'start_datetime': start,
+                        'end_datetime': end,
+                        'status': status,
+                        'notes': 'Control' if rng.random() < 0.3 else None,
+                        'created_at': start - timedelta(days=rng.randint(1, 30)),
+                        'cancelled_at': start - timedelta(hours=rng.randint(1, 48)) if status == 'cancelada' else None,
+                        'cancellation_reason': 'Cancelada por el cliente' if status == 'cancelada' else None,
+                        'professional_id': professional_id,
+                        'client_id': client_id,
+                        'change_seq': seq,
+                        'updated_at': now,
+                    })
+                    start = end + timedelta(minutes=rng.choice((0, 0, 15, 30)))
+        day += timedelta(days=1)
+    _insert_batches(Appointment, appointments)
+
+    notification_rows = []
+    for user_id in professional_ids + client_ids:
+        for _ in range(notifications):
+            created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))
+            notification_rows.append({
+                'user_id': user_id,
+                'message': 'Tienes una nueva cita programada',
+                'type': rng.choice(('info', 'success', 'warning')),
+                'is_read': rng.random() < 0.7,
+                'created_at': created,
+            })
+    _insert_batches(Notification, notification_rows)
+
+    db.session.commit()
+    bump_users()
+    return {
+        'professionals': professionals,
+        'clients': clients,
+        'appointments': len(appointments),
+        'notifications': len(notification_rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', required=True, help='Archivo SQLite a crear (no debe existir)')
+    parser.add_argument('--professionals', type=int, default=10)
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--years', type=int, default=2)
+    parser.add_argument('--per-day', type=int, default=8)
+    parser.add_argument('--notifications', type=int, default=20, help='Notificaciones por usuario')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    if os.path.exists(args.db):
+        parser.error(f'{args.db} ya existe')
+
+    from benchmarks.common import make_app
+
+    app = make_app(args.db)
+    start = time.perf_counter()
+    with app.app_context():
+        counts = generate(args.professionals, args.clients, args.years, args.per_day,
+                          args.notifications, args.seed)
+    print(f'{args.db}: {counts} en {time.perf_counter() - start:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,445 @@
+"""
+Prueba de carga de los blueprints reales (auth, api, admin) sobre una clínica
+sintética (ver benchmarks.datagen).
+
+Por escenario informa latencia p50/p95/p99, throughput y sentencias SQL por
+request, y escribe el resultado en JSON para comparar entre cambios:
+
+    python -m benchmarks.load --output antes.json
+    ... cambios en api_routes.py / models.py ...
+    python -m benchmarks.load --baseline antes.json
+
+Con --baseline muestra las diferencias y termina con error si algún
+escenario ejecuta más sentencias SQL que antes.
+
+Modos:
+  - por defecto, Flask test client en el mismo proceso (un request a la vez)
+  - --gunicorn: levanta `gunicorn run:app` como en producción y lo carga con
+    --concurrency hilos; las sentencias SQL salen de /metrics
+
+Uso:
+    python -m benchmarks.load [--requests 200] [--warmup 5] [--only calendar_month_admin,...]
+        [--professionals 10] [--clients 500] [--years 2] [--output resultado.json]
+        [--gunicorn] [--concurrency 8] [--baseline anterior.json]
+"""
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import platform
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from benchmarks import datagen
+from benchmarks.common import count_statements, login, make_app
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# path se completa con str.format(**contexto); body(contexto, i) arma el JSON.
+# max_requests limita los escenarios caros (bcrypt en el login).
+Scenario = namedtuple('Scenario', 'name role method path body max_requests', defaults=(None, None))
+
+SCENARIOS = [
+    Scenario('login', None, 'POST', '/login', max_requests=20),
+    Scenario('dashboard_professional', 'profesional', 'GET', '/dashboard'),
+    Scenario('dashboard_bootstrap_professional', 'profesional', 'GET', '/api/dashboard/bootstrap?start={month_start}&end={month_end}'),
+    Scenario('dashboard_bootstrap_client', 'cliente', 'GET', '/api/dashboard/bootstrap?start={month_start}&end={month_end}'),
+    Scenario('calendar_month_professional', 'profesional', 'GET', '/api/appointments?start={month_start}&end={month_end}'),
+    Scenario('calendar_month_client', 'cliente', 'GET', '/api/appointments?start={month_start}&end={month_end}'),
+    Scenario('calendar_month_admin', 'admin', 'GET', '/api/appointments?start={month_start}&end={month_end}'),
+    Scenario('calendar_changes_professional', 'profesional', 'GET', '/api/appointments/changes?since={change_token}'),
+    Scenario('search_professional', 'profesional', 'GET', '/api/appointments/search?q=paciente+1'),
+    Scenario('cancelled_professional', 'profesional', 'GET', '/api/appointments/cancelled?limit=50'),
+    Scenario('availability_week', 'cliente', 'GET', '/api/availability?start={today}&professional_ids={professional_id}'),
+    Scenario('clients_professional', 'profesional', 'GET', '/api/clients'),
+    Scenario('clients_search_professional', 'profesional', 'GET', '/api/clients?q=cli_1'),
+    Scenario('stats_professional', 'profesional', 'GET', '/api/stats'),
+    Scenario('stats_admin', 'admin', 'GET', '/api/stats'),
+    Scenario('notifications_client', 'cliente', 'GET', '/api/notifications'),
+    Scenario('admin_panel', 'admin', 'GET', '/admin/panel'),
+    Scenario('admin_users', 'admin', 'GET', '/admin/users?limit=50'),
+    Scenario('admin_users_search', 'admin', 'GET', '/admin/users?limit=50&q=cli_2&sort=username'),
+    Scenario('create_appointment', 'profesional', 'POST', '/api/appointments', lambda ctx, i: {
+        # Un día distinto por request, lejos de los datos generados: nunca se solapa
+        'patient_name': f'Carga {i}',
+        'start_datetime': (ctx['create_base'] + timedelta(days=i)).strftime('%Y-%m-%dT%H:%M'),
+        'end_datetime': (ctx['create_base'] + timedelta(days=i, minutes=30)).strftime('%Y-%m-%dT%H:%M'),
+        'client_id': ctx['client_id'],
+    }),
+]
+
+
+def build_context(app):
+    """Usuarios y fechas que usan los escenarios."""
+    from project import db
+    from project.changes import current_change_seq
+    from project.models import User, get_peru_time
+
+    with app.app_context():
+        client = db.session.execute(
+            db.select(User.id, User.username)
+            .where(User.role == 'cliente', User.is_active.is_(True), User.username.startswith(datagen.client_name(''), autoescape=True))
+            .order_by(User.id).limit(1)
+        ).one()
+        professional_id = db.session.execute(
+            db.select(User.id).where(User.username == datagen.professional_name(0))
+        ).scalar_one()
+        change_token = current_change_seq()
+
+    today = get_peru_time().replace(tzinfo=None)
+    month_start = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return {
+        'credentials': {
+            'admin': ('admin', 'admin123'),
+            'profesional': (datagen.professional_name(0), datagen.PASSWORD),
+            'cliente': (client.username, datagen.PASSWORD),
+        },
+        'client_id': client.id,
+        'professional_id': professional_id,
+        'change_token': change_token,
+        'today': today.strftime('%Y-%m-%d'),
+        'month_start': month_start.strftime('%Y-%m-%dT%H:%M:%S'),
+        'month_end': (month_start + timedelta(days=31)).strftime('%Y-%m-%dT%H:%M:%S'),
+        'create_base': (today + timedelta(days=datagen.FUTURE_DAYS + 30)).replace(hour=10, minute=0, second=0, microsecond=0),
+    }
+
+
+def percentile(sorted_values, p):
+    """Percentil por rango más cercano."""
+    if not sorted_values:
+        return None
+    k = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+
+def is_error(scenario, status):
+    # El login correcto redirige al dashboard; en el resto, una redirección
+    # (al login) indica que el escenario no hizo lo esperado
+    if scenario.name == 'login':
+        return status != 302
+    return status >= 300 and status != 304
+
+
+def summarize(scenario, latencies, elapsed, errors, statements):
+    latencies = sorted(latencies)
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'method': scenario.method,
+        'path': scenario.path,
+        'role': scenario.role,
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'sql_per_request': round(statements, 2) if statements is not None else None,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Flask test client
+# ---------------------------------------------------------------------------
+
+def run_test_client(app, scenario, ctx, requests, warmup):
+    from project import db
+
+    with app.app_context():
+        engine = db.engine
+    client = app.test_client()
+    if scenario.role:
+        login(client, *ctx['credentials'][scenario.role])
+    path = scenario.path.format(**ctx)
+
+    def send(i):
+        if scenario.name == 'login':
+            # Cliente nuevo, sin sesión: solo se mide el POST
+            username, password = ctx['credentials']['profesional']
+            return app.test_client().post(path, data={'username': username, 'password': password})
+        body = scenario.body(ctx, i) if scenario.body else None
+        return client.open(path, method=scenario.method, json=body)
+
+    for i in range(warmup):
+        send(i)
+
+    latencies, errors, statements = [], 0, 0
+    start = time.perf_counter()
+    for i in range(warmup, warmup + requests):
+        with count_statements(engine) as counter:
+            t = time.perf_counter()
+            response = send(i)
+            response.get_data()
+            latencies.append(time.perf_counter() - t)
+        statements += counter['count']
+        errors += is_error(scenario, response.status_code)
+    return summarize(scenario, latencies, time.perf_counter() - start, errors, statements / requests)
+
+
+# ---------------------------------------------------------------------------
+# gunicorn
+# ---------------------------------------------------------------------------
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(port, threads, env):
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'run:app', '--bind', f'127.0.0.1:{port}',
+         '--worker-class', 'gthread', '--workers', '1', '--threads', str(threads)],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit('gunicorn terminó al arrancar:\n' + process.stderr.read().decode())
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=1)
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit('gunicorn no respondió en 30 s')
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Devuelve las redirecciones como respuesta, igual que el test client."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    """Cliente HTTP con cookies, como un navegador con la sesión iniciada."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect()
+        )
+
+    def request(self, method, path, json_body=None, form=None, headers=None):
+        data = None
+        headers = dict(headers or {})
+        if json_body is not None:
+            data = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            data = urllib.parse.urlencode(form).encode()
+        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read()
+
+    def login(self, username, password):
+        self.request('GET', '/logout')
+        return self.request('POST', '/login', form={'username': username, 'password': password})
+
+
+def scrape_sql(base_url, token):
+    """Suma de sentencias SQL y de requests según /metrics (sin contar /metrics)."""
+    session = HttpSession(base_url)
+    _, body = session.request('GET', '/metrics', headers={'Authorization': f'Bearer {token}'})
+    totals = {'sum': 0.0, 'count': 0.0}
+    for line in body.decode().splitlines():
+        if not line.startswith('agendapro_http_request_sql_statements_') or 'metrics.metrics' in line:
+            continue
+        name, value = line.rsplit(' ', 1)
+        kind = name.split('{', 1)[0].rsplit('_', 1)[1]
+        if kind in totals:
+            totals[kind] += float(value)
+    return totals
+
+
+def run_gunicorn(base_url, token, scenario, ctx, requests, warmup, concurrency):
+    sessions = [HttpSession(base_url) for _ in range(concurrency)]
+    if scenario.role:
+        for session in sessions:
+            session.login(*ctx['credentials'][scenario.role])
+    path = scenario.path.format(**ctx)
+    local = threading.local()
+    counter = iter(range(10 ** 9))
+    lock = threading.Lock()
+
+    def send(i):
+        session = getattr(local, 'session', None)
+        if session is None:
+            with lock:
+                session = local.session = sessions.pop()
+        t = time.perf_counter()
+        if scenario.name == 'login':
+            username, password = ctx['credentials']['profesional']
+            status, _ = HttpSession(base_url).request('POST', path, form={'username': username, 'password': password})
+        else:
+            body = scenario.body(ctx, i) if scenario.body else None
+            status, _ = session.request(scenario.method, path, json_body=body)
+        return time.perf_counter() - t, status
+
+    def next_index():
+        with lock:
+            return next(counter)
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(lambda _: send(next_index()), range(warmup)))
+        before = scrape_sql(base_url, token)
+        start = time.perf_counter()
+        results = list(pool.map(lambda _: send(next_index()), range(requests)))
+        elapsed = time.perf_counter() - start
+        after = scrape_sql(base_url, token)
+
+    handled = after['count'] - before['count']
+    statements = (after['sum'] - before['sum']) / handled if handled else None
+    errors = sum(is_error(scenario, status) for _, status in results)
+    return summarize(scenario, [latency for latency, _ in results], elapsed, errors, statements)
+
+
+# ---------------------------------------------------------------------------
+# Reporte
+# ---------------------------------------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results, file=sys.stderr):
+    print(f'{"escenario":32} {"req":>5} {"err":>4} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"req/s":>8} {"SQL":>6}', file=file)
+    for name, r in results.items():
+        sql = '-' if r['sql_per_request'] is None else f'{r["sql_per_request"]:.1f}'
+        print(f'{name:32} {r["requests"]:5} {r["errors"]:4} {r["p50_ms"]:9.2f} {r["p95_ms"]:9.2f} '
+              f'{r["p99_ms"]:9.2f} {r["throughput_rps"]:8.1f} {sql:>6}', file=file)
+
+
+def compare(results, mode, baseline_path, file=sys.stderr):
+    """Muestra diferencias con un resultado anterior; True si el SQL por request creció."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressed = False
+    print(f'\nComparación con {baseline_path}:', file=file)
+    if baseline.get('mode') != mode:
+        print(f'Aviso: la corrida anterior usó el modo {baseline.get("mode")}; las latencias no son comparables', file=file)
+    baseline = baseline['endpoints']
+    for name, r in results.items():
+        old = baseline.get(name)
+        if old is None:
+            print(f'{name:32} (nuevo)', file=file)
+            continue
+        p95 = (r['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0.0
+        line = f'{name:32} p95 {old["p95_ms"]:9.2f} -> {r["p95_ms"]:9.2f} ms ({p95:+6.1f}%)'
+        if r['sql_per_request'] is not None and old.get('sql_per_request') is not None:
+            line += f'   SQL {old["sql_per_request"]:.1f} -> {r["sql_per_request"]:.1f}'
+            if r['sql_per_request'] > old['sql_per_request']:
+                line += '   <- más consultas'
+                regressed = True
+        print(line, file=file)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help='Requests medidos por escenario')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--only', help='Escenarios separados por coma')
+    parser.add_argument('--professionals', type=int, default=10)
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--years', type=int, default=2)
+    parser.add_argument('--per-day', type=int, default=8)
+    parser.add_argument('--notifications', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--gunicorn', action='store_true', help='Medir contra gunicorn en vez del test client')
+    parser.add_argument('--concurrency', type=int, default=8, help='Hilos cliente (y del worker) con --gunicorn')
+    parser.add_argument('--output', help='Archivo JSON de salida (por defecto stdout)')
+    parser.add_argument('--baseline', help='JSON de una corrida anterior para comparar')
+    args = parser.parse_args()
+
+    scenarios = SCENARIOS
+    if args.only:
+        names = set(args.only.split(','))
+        unknown = names - {s.name for s in SCENARIOS}
+        if unknown:
+            parser.error(f'Escenarios desconocidos: {", ".join(sorted(unknown))}')
+        scenarios = [s for s in SCENARIOS if s.name in names]
+
+    fd, db_path = tempfile.mkstemp(suffix='.db', prefix='agendapro-load-')
+    os.close(fd)
+    os.remove(db_path)
+    if args.gunicorn:
+        # Las métricas dan el conteo de SQL; el outbox corre como en producción
+        os.environ['METRICS_TOKEN'] = secrets.token_hex(16)
+        os.environ['OUTBOX_WORKER_THREAD'] = '1'
+
+    app = make_app(db_path)
+    started = time.perf_counter()
+    with app.app_context():
+        dataset = datagen.generate(args.professionals, args.clients, args.years, args.per_day,
+                                   args.notifications, args.seed)
+    print(f'Datos generados en {time.perf_counter() - started:.1f} s: {dataset}', file=sys.stderr)
+    ctx = build_context(app)
+
+    results = {}
+    process = None
+    try:
+        if args.gunicorn:
+            port = free_port()
+            process = start_gunicorn(port, args.concurrency, dict(os.environ))
+            base_url = f'http://127.0.0.1:{port}'
+        for scenario in scenarios:
+            requests = min(args.requests, scenario.max_requests or args.requests)
+            if args.gunicorn:
+                results[scenario.name] = run_gunicorn(base_url, os.environ['METRICS_TOKEN'], scenario, ctx,
+                                                      requests, args.warmup, args.concurrency)
+            else:
+                results[scenario.name] = run_test_client(app, scenario, ctx, requests, args.warmup)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        os.remove(db_path)
+
+    report = {
+        'benchmark': 'load',
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'mode': 'gunicorn' if args.gunicorn else 'test_client',
+        'settings': {
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'concurrency': args.concurrency if args.gunicorn else 1,
+        },
+        'dataset': dataset,
+        'endpoints': results,
+    }
+    print_table(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline and compare(results, report['mode'], args.baseline):
+        raise SystemExit('Hay escenarios con más sentencias SQL que en la corrida anterior')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Verifica que la cantidad de sentencias SQL por request no crece con el
+número de citas (sin consultas N+1).
+
+Uso:
+    python -m benchmarks.query_counts
+"""
+from datetime import datetime, timedelta
+
+from benchmarks.common import make_app, login, count_statements
+
+ENDPOINTS = [
+    ('doctor', 'doctor123', '/api/appointments'),
+    ('doctor', 'doctor123', '/api/appointments/cancelled'),
+    ('admin', 'admin123', '/api/appointments'),
+    ('admin', 'admin123', '/api/appointments/cancelled'),
+    ('admin', 'admin123', '/admin/users'),
+    ('admin', 'admin123', '/admin/users?limit=20'),
+    ('doctor', 'doctor123', '/api/dashboard/bootstrap'),
+    ('admin', 'admin123', '/api/dashboard/bootstrap'),
+    ('doctor', 'doctor123', '/api/appointments/search?q=paciente'),
+]
+
+
+def add_appointments(app, count, offset):
+    from project import db
+    from project.models import Appointment, User
+
+    with app.app_context():
+        doctor = User.query.filter_by(username='doctor').first()
+        base = datetime(2024, 1, 1, 8, 0)
+        for i in range(offset, offset + count):
+            # Un cliente distinto por cita para que una carga perezosa
+            # no quede oculta por el identity map de la sesión
+            cliente = User(username=f'cliente_{i}', email=f'cliente_{i}@example.com', role='cliente')
+            db.session.add(cliente)
+            db.session.flush()
+            start = base + timedelta(hours=i)
+            db.session.add(Appointment(
+                patient_name=f'Paciente {i}',
+                start_datetime=start,
+                end_datetime=start + timedelta(minutes=45),
+                status='cancelada' if i % 3 == 0 else 'programada',
+                cancelled_at=start if i % 3 == 0 else None,
+                professional_id=doctor.id,
+                client_id=cliente.id
+            ))
+        db.session.commit()
+
+
+def measure(app):
+    from project import db
+
+    results = {}
+    client = app.test_client()
+    for username, password, url in ENDPOINTS:
+        login(client, username, password)
+        # Calentar la caché de identidad para medir solo las consultas de la ruta
+        client.get(url)
+        with app.app_context():
+            engine = db.engine
+        with count_statements(engine) as counter:
+            response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+        results[(username, url)] = counter['count']
+    return results
+
+
+def main():
+    app = make_app()
+    add_appointments(app, 5, 0)
+    small = measure(app)
+    add_appointments(app, 500, 5)
+    large = measure(app)
+
+    failed = False
+    for key in ENDPOINTS:
+        key = key[0], key[2]
+        status = 'OK' if small[key] == large[key] else 'FALLA'
+        failed = failed or status == 'FALLA'
+        print(f'{status:5} {key[0]:8} {key[1]:32} 5 citas: {small[key]:3} sentencias   505 citas: {large[key]:3} sentencias')
+
+    if failed:
+        raise SystemExit('El número de sentencias crece con las filas (N+1)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Muestra el plan de ejecución (SQLite EXPLAIN QUERY PLAN) y el tiempo de las
+consultas más frecuentes, con y sin índices. El esquema original no tenía
+índices en appointment ni notification: la corrida "sin índices" borra todos
+los que hay ahí (los leídos de sqlite_master, no una lista fija que quedaría
+desactualizada al agregar otros).
+
+Uso:
+    python -m benchmarks.query_plans [--appointments 200000]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from benchmarks.common import make_app
+
+HOT_QUERIES = [
+    ('Calendario profesional (rango)',
+     "SELECT id FROM appointment WHERE professional_id = :prof AND status IN ('programada', 'completada') "
+     "AND start_datetime < :end AND end_datetime > :start"),
+    ('Solapamiento',
+     "SELECT id FROM appointment WHERE professional_id = :prof AND status IN ('programada', 'completada') "
+     "AND start_datetime < :end AND end_datetime > :start LIMIT 1"),
+    ('Calendario cliente',
+     "SELECT id FROM appointment WHERE client_id = :client AND status IN ('programada', 'completada')"),
+    ('Calendario admin (rango)',
+     "SELECT id FROM appointment WHERE status IN ('programada', 'completada') "
+     "AND start_datetime < :end AND end_datetime > :start"),
+    ('Historial canceladas (admin)',
+     "SELECT id FROM appointment WHERE status = 'cancelada' ORDER BY cancelled_at DESC LIMIT 50"),
+    ('Estadísticas por estado',
+     "SELECT status, count(*) FROM appointment WHERE professional_id = :prof GROUP BY status"),
+    ('Notificaciones no leídas',
+     "SELECT id FROM notification WHERE user_id = :client AND is_read = 0 ORDER BY created_at DESC LIMIT 10"),
+]
+
+def added_indexes(conn):
+    """
+    Índices explícitos de appointment y notification. Los automáticos de
+    PRIMARY KEY y UNIQUE (sql nulo) son del esquema original y no se borran.
+    """
+    return [name for name, in conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+        "AND tbl_name IN ('appointment', 'notification') ORDER BY name"
+    ))]
+
+
+def populate(conn, appointments, professionals=20, clients=500):
+    rng = random.Random(42)
+    conn.execute(text("INSERT INTO user (username, email, role, is_active) VALUES (:u, :e, :r, 1)"), [
+        {'u': f'bench_{role}_{i}', 'e': f'bench_{role}_{i}@example.com', 'r': role}
+        for role, n in (('profesional', professionals), ('cliente', clients))
+        for i in range(n)
+    ])
+    prof_ids = [r[0] for r in conn.execute(text("SELECT id FROM user WHERE role = 'profesional'"))]
+    client_ids = [r[0] for r in conn.execute(text("SELECT id FROM user WHERE role = 'cliente'"))]
+
+    base = datetime(2020, 1, 1, 8, 0)
+    rows = []
+    for i in range(appointments):
+        start = base + timedelta(minutes=30 * i // professionals)
+        status = rng.choices(['completada', 'programada', 'cancelada'], [70, 20, 10])[0]
+        rows.append({
+            'p': f'Paciente {i}', 's': start, 'e': start + timedelta(minutes=30), 'st': status,
+            'c': start if status == 'cancelada' else None,
+            'prof': prof_ids[i % professionals], 'client': rng.choice(client_ids)
+        })
+    conn.execute(text(
+        "INSERT INTO appointment (patient_name, start_datetime, end_datetime, status, cancelled_at, professional_id, client_id) "
+        "VALUES (:p, :s, :e, :st, :c, :prof, :client)"
+    ), rows)
+    conn.execute(text("INSERT INTO notification (user_id, message, type, is_read, created_at) VALUES (:u, 'x', 'info', :r, :c)"), [
+        {'u': rng.choice(client_ids), 'r': rng.random() < 0.9, 'c': base + timedelta(hours=i)}
+        for i in range(appointments // 2)
+    ])
+    conn.execute(text("ANALYZE"))
+    # "Hoy" cae al 90% del historial: la semana consultada es reciente
+    now = base + timedelta(minutes=30 * appointments // professionals * 9 // 10)
+    return prof_ids[0], client_ids[0], now
+
+
+def run(conn, params, repeat):
+    results = []
+    for label, sql in HOT_QUERIES:
+        plan = ' | '.join(row[3] for row in conn.execute(text('EXPLAIN QUERY PLAN ' + sql), params))
+        started = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(text(sql), params).fetchall()
+        elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+        results.append((label, plan, elapsed_ms))
+    return results
+
+
+def report(title, results):
+    print(f'\n=== {title} ===')
+    for label, plan, elapsed_ms in results:
+        print(f'{label:32} {elapsed_ms:9.3f} ms   {plan}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--appointments', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    from project import db
+
+    app = make_app()
+    with app.app_context(), db.engine.begin() as conn:
+        prof, client, week_start = populate(conn, args.appointments)
+        params = {'prof': prof, 'client': client, 'start': week_start, 'end': week_start + timedelta(days=7)}
+
+        report(f'Con índices ({args.appointments} citas)', run(conn, params, args.repeat))
+
+        dropped = added_indexes(conn)
+        for name in dropped:
+            conn.execute(text(f'DROP INDEX {name}'))
+        conn.execute(text("ANALYZE"))
+        report(f'Sin índices ({", ".join(dropped)})', run(conn, params, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Tareas del scheduler (project.jobs) con muchas citas vencidas a la vez.
+
+Genera una clínica sintética (benchmarks.datagen, con un 10% de citas
+pasadas aún programadas) y agrega --due citas que empiezan dentro de la
+anticipación de los recordatorios. Luego mide una pasada de cada tarea:
+citas por segundo y sentencias SQL (constantes por lote, no por cita).
+
+Uso:
+    python -m benchmarks.scheduler_jobs [--due 20000] [--batch-size 1000]
+        [--professionals 20] [--clients 2000] [--years 1]
+"""
+import argparse
+import random
+import time
+from datetime import timedelta
+
+LEAD_MINUTES = 60
+
+
+def add_due_appointments(count, seed=7):
+    """Citas programadas que empiezan dentro de los próximos LEAD_MINUTES."""
+    from project import db
+    from project.changes import next_change_seq
+    from project.models import Appointment, User, get_peru_time
+
+    rng = random.Random(seed)
+    now = get_peru_time().replace(tzinfo=None)
+    professional_ids = db.session.scalars(db.select(User.id).where(User.role == 'profesional')).all()
+    client_ids = db.session.scalars(db.select(User.id).where(User.role == 'cliente')).all()
+    seq = next_change_seq(db.session.connection())
+    rows = []
+    for i in range(count):
+        start = now + timedelta(seconds=rng.randint(60, LEAD_MINUTES * 60 - 60))
+        rows.append({
+            'patient_name': f'Próximo {i}',
+            'start_datetime': start,
+            'end_datetime': start + timedelta(minutes=30),
+            'status': 'programada',
+            'professional_id': rng.choice(professional_ids),
+            'client_id': rng.choice(client_ids) if rng.random() < 0.85 else None,
+            'change_seq': seq,
+            'updated_at': now,
+        })
+    db.session.execute(db.insert(Appointment), rows)
+    db.session.commit()
+
+
+def measure(engine, fn):
+    from benchmarks.common import count_statements
+
+    with count_statements(engine) as counter:
+        start = time.perf_counter()
+        processed = fn()
+        elapsed = time.perf_counter() - start
+    return processed, elapsed, counter['count']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--due', type=int, default=20000, help='Citas a recordar')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--professionals', type=int, default=20)
+    parser.add_argument('--clients', type=int, default=2000)
+    parser.add_argument('--years', type=int, default=1)
+    args = parser.parse_args()
+
+    from benchmarks import datagen
+    from benchmarks.common import make_app
+    from project import db, jobs
+
+    app = make_app()
+    with app.app_context():
+        counts = datagen.generate(args.professionals, args.clients, args.years, per_day=8, notifications=0)
+        add_due_appointments(args.due)
+        print(f"{counts['appointments'] + args.due} citas ({args.due} por recordar)")
+
+        results = [
+            ('send_reminders', measure(db.engine, lambda: jobs.send_reminders(LEAD_MINUTES, args.batch_size))),
+            ('auto_complete', measure(db.engine, jobs.auto_complete)),
+        ]
+        for name, (processed, elapsed, statements) in results:
+            rate = processed / elapsed if elapsed else 0
+            print(f'  {name:15} {processed:7} citas en {elapsed * 1000:7.0f} ms '
+                  f'({rate:8.0f}/s, {statements} sentencias SQL)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Compara la serialización original de eventos del calendario (objetos ORM +
+serialize_event + jsonify) con project.serializers (filas de columnas, "ahora"
+calculado una vez y orjson si está instalado).
+
+Uso:
+    python -m benchmarks.serialization [--sizes 10000,100000] [--repeat 3]
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import make_app
+
+
+def legacy_serialize_event(apt):
+    """El serializador original de api_routes: tz, color y can_be_completed por fila."""
+    from project.models import PERU_TZ
+
+    if apt.status == 'completada':
+        color = '#198754'
+    else:
+        color = '#0d6efd'
+
+    start_aware = apt.start_datetime.replace(tzinfo=PERU_TZ) if apt.start_datetime.tzinfo is None else apt.start_datetime
+    end_aware = apt.end_datetime.replace(tzinfo=PERU_TZ) if apt.end_datetime.tzinfo is None else apt.end_datetime
+
+    return {
+        'id': apt.id,
+        'title': apt.patient_name,
+        'start': start_aware.isoformat(),
+        'end': end_aware.isoformat(),
+        'backgroundColor': color,
+        'borderColor': color,
+        'extendedProps': {
+            'patient_name': apt.patient_name,
+            'status': apt.status,
+            'notes': apt.notes or '',
+            'professional': apt.professional.username if apt.professional else 'N/A',
+            'client': apt.client.username if apt.client else 'N/A',
+            'client_id': apt.client_id,
+            'can_complete': apt.can_be_completed(),
+            'can_cancel': apt.can_be_cancelled()
+        }
+    }
+
+
+def populate(count):
+    from project import db
+    from project.models import Appointment, User
+
+    doctor = User.query.filter_by(username='doctor').first()
+    cliente = User.query.filter_by(username='cliente').first()
+    db.session.query(Appointment).delete()
+    base = datetime(2025, 1, 1, 8, 0)
+    rows = []
+    for i in range(count):
+        start = base + timedelta(minutes=30 * i)
+        rows.append({
+            'patient_name': f'Paciente {i}',
+            'start_datetime': start,
+            'end_datetime': start + timedelta(minutes=30),
+            'status': 'completada' if i % 4 == 0 else 'programada',
+            'notes': 'Control' if i % 2 else None,
+            'professional_id': doctor.id,
+            'client_id': cliente.id if i % 3 else None,
+        })
+    db.session.execute(db.insert(Appointment), rows)
+    db.session.commit()
+
+
+def legacy_path(app):
+    from project import db
+    from project.models import Appointment, ACTIVE_STATUSES
+    from project.queries import appointments_with_names
+
+    rows = appointments_with_names().filter(Appointment.status.in_(ACTIVE_STATUSES)) \
+        .order_by(Appointment.start_datetime, Appointment.id).all()
+    body = app.json.dumps([legacy_serialize_event(apt) for apt in rows])
+    db.session.expunge_all()
+    return body
+
+
+def fast_path(app):
+    from project.models import Appointment, ACTIVE_STATUSES
+    from project.queries import appointment_rows
+    from project.serializers import dumps, serialize_events
+
+    rows = appointment_rows().filter(Appointment.status.in_(ACTIVE_STATUSES)) \
+        .order_by(Appointment.start_datetime, Appointment.id).all()
+    return dumps(serialize_events(rows))
+
+
+def best_of(fn, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    from project.serializers import orjson
+
+    app = make_app()
+    print(f'Encoder rápido: {"orjson" if orjson else "json (orjson no instalado)"}')
+    with app.app_context():
+        for size in [int(s) for s in args.sizes.split(',')]:
+            populate(size)
+            legacy_time, legacy_body = best_of(lambda: legacy_path(app), args.repeat)
+            fast_time, fast_body = best_of(lambda: fast_path(app), args.repeat)
+            if json.loads(legacy_body) != json.loads(fast_body):
+                raise SystemExit(f'Las salidas difieren con {size} eventos')
+            print(f'{size:>7} eventos   original {legacy_time * 1000:8.1f} ms   '
+                  f'rápido {fast_time * 1000:8.1f} ms   x{legacy_time / fast_time:4.1f}')
+
+
+if __name__ == '__main__':
+    main()
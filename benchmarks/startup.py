@@ -0,0 +1,88 @@
+"""
+Mide el arranque en frío de un worker: importar el paquete y ejecutar
+create_app() en un proceso nuevo, como hace gunicorn al levantar un worker.
+
+Compara dos escenarios sobre una base ya preparada:
+  - create_app: el arranque actual, que no debe ejecutar SQL
+  - create_app + setup: lo que hacía antes cada worker (migraciones y
+    búsqueda de los usuarios de prueba)
+
+Uso:
+    python -m benchmarks.startup [--runs 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = r'''
+import json, sys, time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+statements = [0]
+@event.listens_for(Engine, 'before_cursor_execute')
+def count(*args):
+    statements[0] += 1
+
+t0 = time.perf_counter()
+from project import create_app
+app = create_app()
+t1 = time.perf_counter()
+if sys.argv[1] == 'setup':
+    from project.seed import setup_database
+    with app.app_context():
+        setup_database(verbose=False)
+t2 = time.perf_counter()
+print(json.dumps({
+    'seconds': t2 - t0,
+    'factory_seconds': t1 - t0,
+    'statements': statements[0],
+    'flask_dance_loaded': 'flask_dance' in sys.modules,
+}))
+'''
+
+
+def run_child(mode, env):
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, mode],
+        env=env, capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix='.db', prefix='agendapro-startup-')
+    os.close(fd)
+    os.remove(db_path)
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}')
+    env.pop('GOOGLE_OAUTH_CLIENT_ID', None)
+
+    try:
+        # Preparar la base una vez (incluye el bcrypt de los usuarios de prueba)
+        run_child('setup', env)
+
+        for mode in ('factory', 'setup'):
+            results = [run_child(mode, env) for _ in range(args.runs)]
+            times = sorted(r['seconds'] * 1000 for r in results)
+            label = 'create_app' if mode == 'factory' else 'create_app + setup'
+            print(f'{label:20} mediana {statistics.median(times):7.1f} ms   '
+                  f'mín {times[0]:7.1f} ms   máx {times[-1]:7.1f} ms   '
+                  f'SQL: {results[0]["statements"]}   flask_dance: {results[0]["flask_dance_loaded"]}')
+            if mode == 'factory' and results[0]['statements']:
+                raise SystemExit('create_app ejecutó SQL durante el arranque')
+    finally:
+        if os.path.exists(db_path):
+            os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,11 @@
 import os
+import click
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 from flask_cors import CORS
-from flask_dance.contrib.google import make_google_blueprint
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 db = SQLAlchemy()
 bcrypt = Bcrypt()
@@ -20,6 +21,9 @@ def create_app():
         os.makedirs(instance_path)
         print(f"✅ Carpeta instance creada en: {instance_path}")
     
+    if app.config['TRUSTED_PROXIES']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'])
+    
     db.init_app(app)
     bcrypt.init_app(app)
     login_manager.init_app(app)
@@ -29,8 +33,10 @@ def create_app():
     login_manager.login_message = 'Por favor inicia sesión para acceder a esta página.'
     login_manager.login_message_category = 'warning'
     
-    # Google OAuth Blueprint
+    # Google OAuth Blueprint (Flask-Dance se importa solo si está configurado)
     if app.config.get('GOOGLE_OAUTH_CLIENT_ID'):
+        from flask_dance.contrib.google import make_google_blueprint
+        
         google_bp = make_google_blueprint(
             client_id=app.config['GOOGLE_OAUTH_CLIENT_ID'],
             client_secret=app.config['GOOGLE_OAUTH_CLIENT_SECRET'],
@@ -40,11 +46,27 @@ def create_app():
         )
         app.register_blueprint(google_bp, url_prefix="/login")
     
-    from project.models import User
+    from project import compression, database, identity, metrics, security
+    from project.outbox import worker as outbox_worker
+    from project.relay import relay
+    from project.scheduler import scheduler
+    
+    # Primero: su after_request corre al final y mide también la compresión
+    metrics.init_app(app)
+    database.init_app(app)
+    identity.init_app(app)
+    security.init_app(app)
+    outbox_worker.init_app(app)
+    relay.init_app(app)
+    scheduler.init_app(app)
+    compression.init_app(app)
+    
+    timed_load_identity = metrics.timed('load_user')(identity.load_identity)
     
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        # ✅ Identidad cacheada: evita consultar la tabla user en cada request
+        return timed_load_identity(int(user_id))
     
     from project.auth_routes import auth_bp
     from project.api_routes import api_bp
@@ -54,43 +76,48 @@ def create_app():
     app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(admin_bp, url_prefix='/admin')
     
-    with app.app_context():
-        db.create_all()
-        
-        # Crear usuario admin si no existe
-        if not User.query.filter_by(username='admin').first():
-            admin = User(
-                username='admin',
-                email='admin@agendapro.com',
-                role='admin'
-            )
-            admin.set_password('admin123')
-            db.session.add(admin)
-            db.session.commit()
-            print("✅ Usuario admin creado")
+    from project import migrations
+    
+    # ✅ create_app no toca la base: el esquema y los usuarios de prueba se
+    # preparan con `flask setup` antes de arrancar los workers
+    @app.cli.command('setup')
+    @click.option('--no-seed', is_flag=True, help='Solo aplica las migraciones.')
+    def setup_command(no_seed):
+        """Aplica las migraciones y crea los usuarios de prueba que falten."""
+        from project.seed import setup_database
         
-        # Crear usuario profesional de prueba
-        if not User.query.filter_by(username='doctor').first():
-            doctor = User(
-                username='doctor',
-                email='doctor@agendapro.com',
-                role='profesional'
-            )
-            doctor.set_password('doctor123')
-            db.session.add(doctor)
-            db.session.commit()
-            print("✅ Usuario doctor creado")
+        setup_database(seed=not no_seed)
+        print("✅ Base de datos lista")
+    
+    @app.cli.command('db-upgrade')
+    def db_upgrade():
+        """Aplica las migraciones pendientes del esquema."""
+        applied = migrations.upgrade(db.engine)
+        if not applied:
+            print("✅ El esquema ya está al día")
+    
+    @app.cli.command('outbox-worker')
+    @click.option('--once', is_flag=True, help='Procesa los eventos pendientes y termina.')
+    def outbox_worker_command(once):
+        """Convierte los eventos del outbox en notificaciones."""
+        outbox_worker.run(once=once)
+    
+    @app.cli.command('scheduler')
+    @click.option('--once', is_flag=True, help='Ejecuta todas las tareas una vez y termina.')
+    def scheduler_command(once):
+        """Ejecuta las tareas periódicas (recordatorios, autocompletado)."""
+        scheduler.run(once=once)
+    
+    @app.cli.command('prune-notifications')
+    def prune_notifications_command():
+        """Borra en lotes las notificaciones leídas o antiguas."""
+        from project.retention import prune_notifications
         
-        # Crear usuario cliente de prueba
-        if not User.query.filter_by(username='cliente').first():
-            cliente = User(
-                username='cliente',
-                email='cliente@agendapro.com',
-                role='cliente'
-            )
-            cliente.set_password('cliente123')
-            db.session.add(cliente)
-            db.session.commit()
-            print("✅ Usuario cliente creado")
+        deleted = prune_notifications(
+            read_days=app.config['NOTIFICATION_RETENTION_READ_DAYS'],
+            unread_days=app.config['NOTIFICATION_RETENTION_UNREAD_DAYS'],
+            batch_size=app.config['NOTIFICATION_PRUNE_BATCH_SIZE']
+        )
+        print(f"✅ {deleted} notificaciones eliminadas")
     
     return app
@@ -1,8 +1,13 @@
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, current_app
 from flask_login import login_required, current_user
 from functools import wraps
 from project import db
 from project.models import User, Appointment
+from project.pagination import paginated_response
+from project.queries import count_appointments_by_professional
+from project.identity import invalidate_identity
+from project.user_search import parse_search_args, search_users
+from project.versions import ALL_APPOINTMENTS, USERS, bump_users, make_etag, not_modified, with_etag
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -19,23 +24,52 @@ def admin_required(f):
 @login_required
 @admin_required
 def panel():
-    users = User.query.all()
-    return render_template('admin_panel.html', users=users)
+    # ✅ La tabla se llena desde /admin/users (búsqueda y paginación en el servidor)
+    return render_template('admin_panel.html')
 
 @admin_bp.route('/users', methods=['GET'])
 @login_required
 @admin_required
 def get_users():
-    users = User.query.all()
-    return jsonify([{
-        'id': u.id,
-        'username': u.username,
-        'email': u.email,
-        'role': u.role,
-        'is_active': u.is_active,
-        'created_at': u.created_at.strftime('%Y-%m-%d'),
-        'appointments_count': len(u.appointments_as_professional)
-    } for u in users])
+    """
+    Acepta q, match, role, active y sort (ver project.user_search), limit,
+    cursor y stream (ver project.pagination) e If-None-Match.
+    """
+    # Los conteos de citas también forman parte de la respuesta
+    etag = make_etag([USERS, ALL_APPOINTMENTS], request.query_string)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    
+    # Conteos solo de los usuarios que se envían, por lote (ver paginated_response)
+    appointment_counts = {}
+    
+    def count_appointments(users):
+        appointment_counts.update(count_appointments_by_professional([u.id for u in users]))
+    
+    def serialize(u):
+        return {
+            'id': u.id,
+            'username': u.username,
+            'email': u.email,
+            'role': u.role,
+            'is_active': u.is_active,
+            'created_at': u.created_at.strftime('%Y-%m-%d'),
+            'appointments_count': appointment_counts.get(u.id, 0)
+        }
+    
+    try:
+        filters, order = parse_search_args(request.args)
+        return with_etag(paginated_response(
+            search_users(User.query, **filters),
+            order,
+            serialize,
+            request.args,
+            current_app.config['PAGINATION_MAX_LIMIT'],
+            prepare=count_appointments
+        ), etag)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
 @admin_bp.route('/users/<int:id>/toggle-active', methods=['POST'])
 @login_required
@@ -48,6 +82,8 @@ def toggle_user_active(id):
     
     user.is_active = not user.is_active
     db.session.commit()
+    invalidate_identity(user.id)
+    bump_users()
     
     status = 'activado' if user.is_active else 'desactivado'
     return jsonify({'message': f'Usuario {status} exitosamente', 'is_active': user.is_active})
@@ -68,5 +104,7 @@ def change_user_role(id):
     
     user.role = new_role
     db.session.commit()
+    invalidate_identity(user.id)
+    bump_users()
     
     return jsonify({'message': f'Rol actualizado a {new_role}'})
@@ -1,11 +1,55 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app
 from flask_login import login_required, current_user
 from project import db
-from project.models import Appointment, Notification, User, PERU_TZ, get_peru_time
-from datetime import datetime
+from project.metrics import timed
+from project.changes import current_change_seq, next_change_seq
+from project.models import Appointment, AppointmentTombstone, Notification, User, PERU_TZ, ACTIVE_STATUSES, get_peru_time, to_peru_iso
+from project.availability import get_availability, invalidate_availability
+from project.booking import OverlapConflict, booking_transaction
+from project.cache import TTLCache
+from project.conflicts import IntervalIndex, conflict_engine, queue_changes
+from project.notifications import (
+    bus, dismiss_ephemeral, ephemeral_notifications, serialize_notification, stream_events, stream_slots
+)
+from project.outbox import enqueue as enqueue_notification
+from project.pagination import (
+    NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, first_page, paginated_response
+)
+from project.queries import appointment_rows, count_appointments_by_status
+from project.search import parse_terms, search_appointments, serialize_result
+from project.serializers import event_serializer, json_response, serialize_cancelled
+from project.user_search import parse_search_args, search_users
+from project.versions import (
+    ALL_APPOINTMENTS, USERS, appointment_scope, bump_appointments, make_etag, not_modified, with_etag
+)
+from datetime import datetime, timedelta, time
+from sqlalchemy import insert
+from werkzeug.http import quote_etag
 
 api_bp = Blueprint('api', __name__)
 
+# Estadísticas del dashboard por rol/usuario (ver get_stats)
+stats_cache = TTLCache()
+
+CHANGE_TOKEN_HEADER = 'X-Change-Token'
+
+# Orden del calendario y del historial de canceladas (también para sus cursores)
+CALENDAR_ORDER = [(Appointment.start_datetime, 'asc'), (Appointment.id, 'asc')]
+CANCELLED_ORDER = [(Appointment.cancelled_at, 'desc'), (Appointment.id, 'desc')]
+
+# Canceladas que trae /dashboard/bootstrap (= CANCELLED_PAGE_SIZE de dashboard.js)
+BOOTSTRAP_CANCELLED_LIMIT = 50
+
+# Sugerencias por búsqueda del selector de clientes si no se pide limit
+CLIENT_SEARCH_LIMIT = 20
+
+# Resultados por página de /appointments/search si no se pide limit
+SEARCH_PAGE_SIZE = 20
+APPOINTMENT_STATUSES = ('programada', 'completada', 'cancelada')
+
+# Máximo de duration y step en GET /availability (minutos)
+AVAILABILITY_MAX_SLOT_MINUTES = 24 * 60
+
 
 def parse_datetime(date_string):
     """
@@ -37,34 +81,336 @@ def parse_datetime(date_string):
             return dt
 
 
+@timed('check_appointment_overlap')
 def check_appointment_overlap(professional_id, start_dt, end_dt, exclude_appointment_id=None):
     """
     Verifica solapamiento excluyendo citas canceladas.
+    ✅ Delegado al índice en memoria de project.conflicts; solo consulta la
+    base para traer la cita en conflicto, si la hay.
+    """
+    conflict_id = conflict_engine.first_conflict(
+        professional_id, start_dt, end_dt, exclude_id=exclude_appointment_id
+    )
+    if conflict_id is None:
+        return None
+    return db.session.get(Appointment, conflict_id)
+
+
+def overlap_response(overlapping):
+    """El 400 "se solapa" de crear y editar citas."""
+    body = {'error': 'La cita se solapa con otra existente'}
+    if overlapping is not None:
+        body['conflicting_appointment'] = {
+            'id': overlapping.id,
+            'patient': overlapping.patient_name,
+            'start': overlapping.start_datetime.isoformat(),
+            'end': overlapping.end_datetime.isoformat()
+        }
+    return jsonify(body), 400
+
+
+@api_bp.errorhandler(OverlapConflict)
+def handle_overlap_conflict(error):
+    """PostgreSQL rechazó la escritura: otro request reservó el horario a la vez."""
+    overlapping = None
+    if error.professional_id is not None:
+        with booking_transaction():
+            overlapping = check_appointment_overlap(
+                error.professional_id, error.start, error.end, exclude_appointment_id=error.exclude_id
+            )
+    return overlap_response(overlapping)
+
+
+def invalidate_appointment_caches(professional_id, *client_ids):
+    """
+    Descarta las cachés afectadas por un cambio en las citas de un profesional.
+    Llamar después del commit.
+    
+    Las estadísticas cacheadas llevan la versión en la clave, así que basta
+    con incrementar las versiones (que además renuevan los ETag).
+    """
+    invalidate_availability(professional_id)
+    bump_appointments(professional_id, *client_ids)
+
+
+def expand_recurrence(rule, max_items):
+    """
+    Expande una regla de recurrencia en una lista de citas.
+    
+    Args:
+        rule: dict con los campos de una cita más 'frequency' ('daily' o
+              'weekly'), 'interval' (por defecto 1) y 'count' o 'until'
+        max_items: Máximo de citas a generar
+    """
+    frequency = rule.get('frequency', 'weekly')
+    if frequency not in ('daily', 'weekly'):
+        raise ValueError('frequency debe ser "daily" o "weekly"')
+    
+    interval = int(rule.get('interval', 1))
+    if interval < 1:
+        raise ValueError('interval debe ser mayor a 0')
+    step = timedelta(days=interval if frequency == 'daily' else 7 * interval)
+    
+    if 'count' not in rule and 'until' not in rule:
+        raise ValueError('Se requiere count o until')
+    count = int(rule['count']) if 'count' in rule else max_items + 1
+    if count < 1:
+        raise ValueError('count debe ser mayor a 0')
+    until = parse_datetime(rule['until']) if 'until' in rule else None
+    
+    start_dt = parse_datetime(rule['start_datetime'])
+    end_dt = parse_datetime(rule['end_datetime'])
+    if until is not None and until < start_dt:
+        raise ValueError('until no puede ser anterior a start_datetime')
+    
+    items = []
+    while len(items) < count and (until is None or start_dt <= until):
+        if len(items) >= max_items:
+            raise ValueError(f'La recurrencia genera más de {max_items} citas')
+        items.append({
+            'patient_name': rule.get('patient_name'),
+            'start_datetime': start_dt,
+            'end_datetime': end_dt,
+            'notes': rule.get('notes', ''),
+            'client_id': rule.get('client_id')
+        })
+        start_dt += step
+        end_dt += step
+    return items
+
+
+def parse_range_args(args):
     """
-    query = Appointment.query.filter(
-        Appointment.professional_id == professional_id,
-        Appointment.status != 'cancelada',  # ✅ Ignorar canceladas
-        Appointment.start_datetime < end_dt,
-        Appointment.end_datetime > start_dt
+    Lee los parámetros opcionales start/end de la ventana del calendario.
+    Retorna (None, None) si no se enviaron; lanza ValueError si son inválidos.
+    """
+    start_str = args.get('start')
+    end_str = args.get('end')
+    
+    if not start_str and not end_str:
+        return None, None
+    
+    if not start_str or not end_str:
+        raise ValueError('Se requieren ambos parámetros start y end')
+    
+    start_dt = parse_datetime(start_str)
+    end_dt = parse_datetime(end_str)
+    
+    if end_dt <= start_dt:
+        raise ValueError('El parámetro end debe ser posterior a start')
+    
+    return start_dt, end_dt
+
+
+def visible_appointments(query, user):
+    """Admin ve todas las citas; profesionales y clientes solo las suyas."""
+    if user.is_admin():
+        return query
+    if user.is_professional():
+        return query.filter(Appointment.professional_id == user.id)
+    return query.filter(Appointment.client_id == user.id)
+
+
+def calendar_query(user, range_start=None, range_end=None):
+    """
+    ✅ Citas programadas y completadas del usuario (solo las columnas
+    necesarias, sin hidratar objetos ORM), opcionalmente solo las que se
+    solapan con la ventana visible del calendario.
+    """
+    query = visible_appointments(
+        appointment_rows().filter(Appointment.status.in_(ACTIVE_STATUSES)), user
+    )
+    if range_start is not None:
+        query = query.filter(
+            Appointment.start_datetime < range_end,
+            Appointment.end_datetime > range_start
+        )
+    return query
+
+
+def cancelled_query(user):
+    return visible_appointments(appointment_rows().filter(Appointment.status == 'cancelada'), user)
+
+
+def notifications_etag(user_id, since_id=None):
+    """
+    ETag de GET /notifications. La versión del bus es un contador por
+    usuario que no lo identifica: sin el id, el ETag de un usuario podría
+    coincidir con el de otro (p. ej. en un navegador compartido).
+    """
+    return make_etag((), user_id, bus.version(user_id), since_id)
+
+
+def unread_notifications(user_id, since_id=None):
+    """
+    Las 10 notificaciones no leídas más recientes. Las efímeras (sesión) van
+    primero; con since_id ya se entregaron.
+    """
+    query = Notification.query.filter_by(
+        user_id=user_id, 
+        is_read=False
     )
     
-    if exclude_appointment_id:
-        query = query.filter(Appointment.id != exclude_appointment_id)
+    if since_id is not None:
+        query = query.filter(Notification.id > since_id)
+        items = []
+    else:
+        items = ephemeral_notifications()
     
-    return query.first()
+    notifications = query.order_by(Notification.created_at.desc()).limit(10).all()
+    items.extend(serialize_notification(n) for n in notifications)
+    return items[:10]
+
+
+def stats_scope(user):
+    """
+    Clave de caché y alcances de las estadísticas de un usuario (las de admin
+    son globales y se comparten).
+    """
+    if user.is_admin():
+        return ('admin',), [ALL_APPOINTMENTS, USERS]
+    if user.is_professional():
+        return ('profesional', user.id), [appointment_scope(user)]
+    return ('cliente', user.id), [appointment_scope(user)]
+
+
+def user_stats(user, cache_key, etag):
+    """
+    Estadísticas del dashboard: un solo GROUP BY por estado, cacheado unos
+    segundos. La versión (etag) va en la clave: una entrada nunca sobrevive a
+    un cambio.
+    """
+    cache_key += (etag,)
+    stats = stats_cache.get(cache_key)
+    if stats is not None:
+        return stats
+    
+    if user.is_admin():
+        counts = count_appointments_by_status()
+        stats = {
+            'total_users': User.query.count(),
+            'total_appointments': counts.get('programada', 0) + counts.get('completada', 0),
+            'active_appointments': counts.get('programada', 0),
+            'cancelled_appointments': counts.get('cancelada', 0)
+        }
+    elif user.is_professional():
+        counts = count_appointments_by_status(professional_id=user.id)
+        stats = {
+            'my_appointments': counts.get('programada', 0) + counts.get('completada', 0),
+            'pending': counts.get('programada', 0),
+            'completed': counts.get('completada', 0),
+            'cancelled': counts.get('cancelada', 0)
+        }
+    else:
+        counts = count_appointments_by_status(client_id=user.id)
+        stats = {
+            'my_appointments': counts.get('programada', 0) + counts.get('completada', 0),
+            'upcoming': counts.get('programada', 0)
+        }
+    
+    stats_cache.set(cache_key, stats, ttl=current_app.config['STATS_CACHE_TTL'])
+    return stats
+
+
+@api_bp.route('/dashboard/bootstrap', methods=['GET'])
+@login_required
+def get_dashboard_bootstrap():
+    """
+    ✅ NUEVO: Todo lo que el dashboard necesita para el primer render en una
+    sola respuesta, en vez de /clients, /appointments, /appointments/cancelled,
+    /stats y /notifications por separado.
+    
+    Query params opcionales:
+        start, end: Ventana visible del calendario (como en GET /appointments)
+    
+    Returns:
+        {"appointments": [...], "change_token": n, "stats": {...},
+         "notifications": [...], "notifications_etag": "W/...",
+         "cancelled": {"items": [...], "next_cursor": ...}}
+        Cada parte tiene el mismo formato que su endpoint; cancelled solo
+        para profesionales y admin. next_cursor se usa como cursor de
+        /appointments/cancelled y notifications_etag como If-None-Match de
+        /notifications. Los clientes se buscan a medida que se escribe
+        (GET /clients?q=).
+    
+    ✅ Responde 304 si no cambiaron las citas (ni, para admin, los usuarios) ni
+    las notificaciones. can_complete depende de la hora: el ETag se renueva
+    cada minuto.
+    """
+    user = current_user
+    stats_key, stats_scopes = stats_scope(user)
+    scopes = [appointment_scope(user)] + stats_scopes
+    notifications_version = notifications_etag(user.id)
+    etag = make_etag(scopes, user.id, notifications_version, request.query_string, ttl=60)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    
+    try:
+        range_start, range_end = parse_range_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Rango de fechas inválido: {str(e)}'}), 400
+    
+    # Token para pedir después solo los cambios (se lee antes que las citas)
+    change_token = current_change_seq()
+    serialize = event_serializer()
+    query = calendar_query(user, range_start, range_end).order_by(
+        Appointment.start_datetime, Appointment.id
+    )
+    
+    data = {
+        'appointments': [serialize(row) for row in query],
+        'change_token': str(change_token),
+        'stats': user_stats(user, stats_key, make_etag(stats_scopes, stats_key)),
+        'notifications': unread_notifications(user.id),
+        'notifications_etag': quote_etag(notifications_version, weak=True),
+    }
+    
+    if user.is_professional():
+        rows, next_cursor = first_page(cancelled_query(user), CANCELLED_ORDER, BOOTSTRAP_CANCELLED_LIMIT)
+        data['cancelled'] = {
+            'items': [serialize_cancelled(row) for row in rows],
+            'next_cursor': next_cursor
+        }
+    
+    return with_etag(json_response(data), etag)
 
 
 @api_bp.route('/clients', methods=['GET'])
 @login_required
 def get_clients():
+    """
+    ✅ MEJORADO: Clientes activos para el selector del dashboard, buscados en
+    el servidor a medida que se escribe (no se envían todos los clientes).
+    
+    Query params opcionales:
+        q, match, sort: Búsqueda por usuario o email (ver project.user_search);
+                        por defecto ordenados por usuario
+        limit, cursor: Paginación por cursor; limit por defecto CLIENT_SEARCH_LIMIT
+    """
     if not current_user.is_professional():
         return jsonify({'error': 'No autorizado'}), 403
     
-    clients = User.query.filter_by(role='cliente', is_active=True).all()
-    return jsonify([
-        {'id': c.id, 'username': c.username, 'email': c.email}
-        for c in clients
-    ])
+    etag = make_etag([USERS], request.query_string)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    
+    args = request.args.copy()
+    args.setdefault('limit', str(CLIENT_SEARCH_LIMIT))
+    try:
+        filters, order = parse_search_args(args, default_sort='username')
+        filters.update(role='cliente', active=True)
+        query = search_users(db.session.query(User.id, User.username, User.email), **filters)
+        return with_etag(paginated_response(
+            query,
+            order,
+            lambda c: {'id': c.id, 'username': c.username, 'email': c.email},
+            args,
+            current_app.config['PAGINATION_MAX_LIMIT']
+        ), etag)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
 
 @api_bp.route('/appointments', methods=['GET'])
@@ -73,56 +419,100 @@ def get_appointments():
     """
     ✅ MEJORADO: Solo retorna citas programadas y completadas para el calendario
     Las canceladas se obtienen por endpoint separado
+    
+    Query params opcionales:
+        start, end: Ventana visible (ISO 8601). Solo se retornan las citas que se solapan con ella.
+        limit, cursor, stream: Paginación por cursor / streaming (ver project.pagination)
+    
+    ✅ Responde 304 sin consultar la base si no hubo cambios (If-None-Match).
+    can_complete depende de la hora: el ETag se renueva cada minuto.
     """
-    if current_user.is_admin():
-        appointments = Appointment.query.filter(
-            Appointment.status.in_(['programada', 'completada'])
-        ).all()
-    elif current_user.is_professional():
-        appointments = Appointment.query.filter_by(
-            professional_id=current_user.id
-        ).filter(
-            Appointment.status.in_(['programada', 'completada'])
-        ).all()
-    else:
-        appointments = Appointment.query.filter_by(
-            client_id=current_user.id
-        ).filter(
-            Appointment.status.in_(['programada', 'completada'])
-        ).all()
-    
-    events = []
-    for apt in appointments:
-        # Color por estado
-        if apt.status == 'completada':
-            color = '#198754'  # Verde
-        else:  # programada
-            color = '#0d6efd'  # Azul
-        
-        # ✅ FIX: Timezone aware para evitar desfase
-        start_aware = apt.start_datetime.replace(tzinfo=PERU_TZ) if apt.start_datetime.tzinfo is None else apt.start_datetime
-        end_aware = apt.end_datetime.replace(tzinfo=PERU_TZ) if apt.end_datetime.tzinfo is None else apt.end_datetime
-        
-        events.append({
-            'id': apt.id,
-            'title': apt.patient_name,
-            'start': start_aware.isoformat(),
-            'end': end_aware.isoformat(),
-            'backgroundColor': color,
-            'borderColor': color,
-            'extendedProps': {
-                'patient_name': apt.patient_name,
-                'status': apt.status,
-                'notes': apt.notes or '',
-                'professional': apt.professional.username if apt.professional else 'N/A',
-                'client': apt.client.username if apt.client else 'N/A',
-                'client_id': apt.client_id,
-                'can_complete': apt.can_be_completed(),
-                'can_cancel': apt.can_be_cancelled()
-            }
-        })
+    etag = make_etag([appointment_scope(current_user)], current_user.id, request.query_string, ttl=60)
+    response = not_modified(etag)
+    if response is not None:
+        return response
     
-    return jsonify(events)
+    try:
+        range_start, range_end = parse_range_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Rango de fechas inválido: {str(e)}'}), 400
+    
+    query = calendar_query(current_user, range_start, range_end)
+    
+    # Token para pedir después solo los cambios (se lee antes que las citas)
+    change_token = current_change_seq()
+    
+    try:
+        response = paginated_response(
+            query,
+            CALENDAR_ORDER,
+            event_serializer(),
+            request.args,
+            current_app.config['PAGINATION_MAX_LIMIT']
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response.headers[CHANGE_TOKEN_HEADER] = str(change_token)
+    return with_etag(response, etag)
+
+
+@api_bp.route('/appointments/changes', methods=['GET'])
+@login_required
+def get_appointment_changes():
+    """
+    ✅ NUEVO: Sincronización incremental del calendario.
+    
+    Query params:
+        since: Token recibido en X-Change-Token o en `next` de la respuesta anterior
+    
+    Returns:
+        {"events": [...], "removed": [ids], "next": token}. Los eventos tienen
+        el mismo formato que GET /appointments; las citas canceladas, borradas o
+        que dejaron de ser visibles para el usuario van en `removed`.
+        {"reset": true, "next": token} si hay demasiados cambios o el token no
+        es válido: el cliente debe recargar todo.
+    """
+    since = request.args.get('since', type=int)
+    if since is None or since < 0:
+        return jsonify({'error': 'Parámetro since inválido'}), 400
+    
+    etag = make_etag([appointment_scope(current_user)], current_user.id, since, ttl=60)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    
+    current = current_change_seq()
+    if since > current:
+        return with_etag(jsonify({'reset': True, 'next': current}), etag)
+    
+    query = appointment_rows().filter(Appointment.change_seq > since)
+    tombstones = db.session.query(AppointmentTombstone.appointment_id).filter(
+        AppointmentTombstone.change_seq > since
+    )
+    if not current_user.is_admin():
+        if current_user.is_professional():
+            query = query.filter(Appointment.professional_id == current_user.id)
+            tombstones = tombstones.filter(AppointmentTombstone.professional_id == current_user.id)
+        else:
+            query = query.filter(Appointment.client_id == current_user.id)
+            tombstones = tombstones.filter(AppointmentTombstone.client_id == current_user.id)
+    
+    limit = current_app.config['SYNC_MAX_CHANGES']
+    rows = query.order_by(Appointment.change_seq).limit(limit + 1).all()
+    if len(rows) > limit:
+        return with_etag(jsonify({'reset': True, 'next': current}), etag)
+    
+    serialize = event_serializer()
+    visible = {row.id for row in rows}
+    removed = {row.id for row in rows if row.status not in ACTIVE_STATUSES}
+    removed.update(id for id, in tombstones.all() if id not in visible)
+    
+    return with_etag(json_response({
+        'events': [serialize(row) for row in rows if row.status in ACTIVE_STATUSES],
+        'removed': sorted(removed),
+        'next': current
+    }), etag)
 
 
 @api_bp.route('/appointments/cancelled', methods=['GET'])
@@ -130,34 +520,73 @@ def get_appointments():
 def get_cancelled_appointments():
     """
     ✅ NUEVO: Endpoint para obtener citas canceladas (historial)
+    Acepta limit, cursor y stream (ver project.pagination) e If-None-Match.
     """
-    if current_user.is_admin():
-        appointments = Appointment.query.filter_by(status='cancelada').order_by(Appointment.cancelled_at.desc()).all()
-    elif current_user.is_professional():
-        appointments = Appointment.query.filter_by(
-            professional_id=current_user.id,
-            status='cancelada'
-        ).order_by(Appointment.cancelled_at.desc()).all()
-    else:
-        appointments = Appointment.query.filter_by(
-            client_id=current_user.id,
-            status='cancelada'
-        ).order_by(Appointment.cancelled_at.desc()).all()
-    
-    return jsonify([
-        {
-            'id': apt.id,
-            'patient_name': apt.patient_name,
-            'start_datetime': apt.start_datetime.isoformat(),
-            'end_datetime': apt.end_datetime.isoformat(),
-            'professional': apt.professional.username if apt.professional else 'N/A',
-            'client': apt.client.username if apt.client else 'Sin asignar',
-            'cancelled_at': apt.cancelled_at.isoformat() if apt.cancelled_at else None,
-            'cancellation_reason': apt.cancellation_reason or 'Sin motivo especificado',
-            'notes': apt.notes or ''
-        }
-        for apt in appointments
-    ])
+    etag = make_etag([appointment_scope(current_user)], current_user.id, request.query_string)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    
+    try:
+        return with_etag(paginated_response(
+            cancelled_query(current_user),
+            CANCELLED_ORDER,
+            serialize_cancelled,
+            request.args,
+            current_app.config['PAGINATION_MAX_LIMIT']
+        ), etag)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@api_bp.route('/appointments/search', methods=['GET'])
+@login_required
+def get_appointment_search():
+    """
+    ✅ NUEVO: Búsqueda de texto completo por nombre del paciente y notas
+    (ver project.search), con las mismas reglas de visibilidad que el
+    calendario.
+    
+    Query params:
+        q: Texto a buscar; la última palabra se busca como prefijo
+        status: Estados separados por coma (por defecto, todos)
+        limit, cursor: Paginación (X-Next-Cursor, como en los listados)
+    
+    Returns:
+        Lista de citas de la más a la menos relevante, con `highlight`: el
+        paciente y un fragmento de las notas en HTML escapado, con las
+        coincidencias entre <mark>.
+    """
+    etag = make_etag([appointment_scope(current_user)], current_user.id, request.query_string)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    
+    try:
+        terms = parse_terms(request.args.get('q'))
+        statuses = [s for s in request.args.get('status', '').split(',') if s]
+        if any(s not in APPOINTMENT_STATUSES for s in statuses):
+            raise ValueError('Estado inválido')
+        limit = request.args.get('limit', default=SEARCH_PAGE_SIZE, type=int)
+        max_limit = current_app.config['PAGINATION_MAX_LIMIT']
+        if not 1 <= limit <= max_limit:
+            raise ValueError(f'limit debe estar entre 1 y {max_limit}')
+        # Los resultados van por relevancia: el cursor es la posición
+        offset = decode_cursor(request.args['cursor'])[0] if request.args.get('cursor') else 0
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError('Cursor inválido')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = visible_appointments(appointment_rows(), current_user)
+    if statuses:
+        query = query.filter(Appointment.status.in_(statuses))
+    rows = search_appointments(query, terms).offset(offset).limit(limit + 1).all()
+    
+    response = json_response([serialize_result(row) for row in rows[:limit]])
+    if len(rows) > limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([offset + limit])
+    return with_etag(response, etag)
 
 
 @api_bp.route('/appointments', methods=['POST'])
@@ -180,40 +609,28 @@ def create_appointment():
     if end_dt <= start_dt:
         return jsonify({'error': 'La fecha de fin debe ser posterior a la fecha de inicio'}), 400
     
-    # Verificar solapamiento
-    overlapping = check_appointment_overlap(current_user.id, start_dt, end_dt)
-    if overlapping:
-        return jsonify({
-            'error': 'La cita se solapa con otra existente',
-            'conflicting_appointment': {
-                'id': overlapping.id,
-                'patient': overlapping.patient_name,
-                'start': overlapping.start_datetime.isoformat(),
-                'end': overlapping.end_datetime.isoformat()
-            }
-        }), 400
-    
-    appointment = Appointment(
-        patient_name=data.get('patient_name'),
-        start_datetime=start_dt,
-        end_datetime=end_dt,
-        status='programada',  # ✅ Siempre inicia como programada
-        notes=data.get('notes', ''),
-        professional_id=current_user.id,
-        client_id=data.get('client_id')
-    )
-    
-    db.session.add(appointment)
-
-    if appointment.client_id:
-        notif = Notification(
-            user_id=appointment.client_id,
-            message=f'Nueva cita: {appointment.patient_name} el {start_dt.strftime("%d/%m/%Y %H:%M")}',
-            type='info'
+    # ✅ Verificación y escritura en la misma transacción (ver project.booking)
+    with booking_transaction(current_user.id, start_dt, end_dt):
+        overlapping = check_appointment_overlap(current_user.id, start_dt, end_dt)
+        if overlapping:
+            return overlap_response(overlapping)
+        
+        appointment = Appointment(
+            patient_name=data.get('patient_name'),
+            start_datetime=start_dt,
+            end_datetime=end_dt,
+            status='programada',  # ✅ Siempre inicia como programada
+            notes=data.get('notes', ''),
+            professional_id=current_user.id,
+            client_id=data.get('client_id')
         )
-        db.session.add(notif)
-    
-    db.session.commit()
+        
+        db.session.add(appointment)
+        db.session.flush()
+        enqueue_notification(appointment.client_id, 'created', appointment)
+        
+        db.session.commit()
+    invalidate_appointment_caches(appointment.professional_id, appointment.client_id)
     
     return jsonify({
         'message': 'Cita creada exitosamente',
@@ -222,6 +639,169 @@ def create_appointment():
     }), 201
 
 
+@api_bp.route('/appointments/bulk', methods=['POST'])
+@login_required
+def create_appointments_bulk():
+    """
+    ✅ NUEVO: Crea muchas citas en una sola transacción.
+    
+    Body JSON, una de dos formas:
+        {"appointments": [{patient_name, start_datetime, end_datetime, notes?, client_id?}, ...]}
+        {"recurrence": {patient_name, start_datetime, end_datetime, notes?, client_id?,
+                        frequency: "daily"|"weekly", interval?, count? | until?}}
+    Opcional: "atomic" (por defecto true). Si es false se crean las citas
+    válidas y se reportan las demás.
+    
+    Los solapamientos se validan en una sola pasada contra las citas
+    existentes y contra las demás citas del lote.
+    """
+    if not current_user.is_professional():
+        return jsonify({'error': 'Solo profesionales pueden crear citas'}), 403
+    
+    data = request.get_json() or {}
+    max_items = current_app.config['BULK_MAX_APPOINTMENTS']
+    atomic = data.get('atomic', True)
+    
+    try:
+        if 'recurrence' in data:
+            raw_items = expand_recurrence(data['recurrence'], max_items)
+        else:
+            raw_items = data.get('appointments')
+            if not isinstance(raw_items, list) or not raw_items:
+                return jsonify({'error': 'Se requiere una lista "appointments" o una regla "recurrence"'}), 400
+            if len(raw_items) > max_items:
+                return jsonify({'error': f'Máximo {max_items} citas por lote'}), 400
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({'error': f'Recurrencia inválida: {str(e)}'}), 400
+    
+    # 1) Validar campos y fechas de cada item
+    errors = []
+    valid = []
+    for index, item in enumerate(raw_items):
+        if not isinstance(item, dict) or not all(item.get(k) for k in ['patient_name', 'start_datetime', 'end_datetime']):
+            errors.append({'index': index, 'error': 'Faltan campos requeridos'})
+            continue
+        try:
+            start_dt = item['start_datetime']
+            end_dt = item['end_datetime']
+            if isinstance(start_dt, str):
+                start_dt = parse_datetime(start_dt)
+            if isinstance(end_dt, str):
+                end_dt = parse_datetime(end_dt)
+        except (ValueError, TypeError) as e:
+            errors.append({'index': index, 'error': f'Formato de fecha inválido: {str(e)}'})
+            continue
+        if end_dt <= start_dt:
+            errors.append({'index': index, 'error': 'La fecha de fin debe ser posterior a la fecha de inicio'})
+            continue
+        valid.append((index, item, start_dt, end_dt))
+    
+    # ✅ Verificación y escritura en la misma transacción (ver project.booking)
+    with booking_transaction(current_user.id):
+        # 2) Solapamientos contra citas existentes (una pasada sobre el índice)
+        existing_conflicts = conflict_engine.check_many(
+            current_user.id, [(start_dt, end_dt) for _, _, start_dt, end_dt in valid]
+        )
+        conflicting_ids = {id for ids in existing_conflicts for id in ids}
+        conflicting = {}
+        if conflicting_ids:
+            conflicting = {
+                apt.id: apt for apt in Appointment.query.filter(Appointment.id.in_(conflicting_ids))
+            }
+        
+        # 3) Solapamientos dentro del lote
+        batch_index = IntervalIndex()
+        accepted = []
+        for (index, item, start_dt, end_dt), existing in zip(valid, existing_conflicts):
+            if existing:
+                errors.append({
+                    'index': index,
+                    'error': 'La cita se solapa con otra existente',
+                    'conflicting_appointments': [
+                        {
+                            'id': conflicting[id].id,
+                            'patient': conflicting[id].patient_name,
+                            'start': conflicting[id].start_datetime.isoformat(),
+                            'end': conflicting[id].end_datetime.isoformat()
+                        }
+                        for id in existing if id in conflicting
+                    ]
+                })
+                continue
+            in_batch = batch_index.conflicts(start_dt, end_dt)
+            if in_batch:
+                errors.append({
+                    'index': index,
+                    'error': 'La cita se solapa con otra del mismo lote',
+                    'conflicting_indexes': in_batch
+                })
+                continue
+            batch_index.add(index, start_dt, end_dt)
+            accepted.append((index, item, start_dt, end_dt))
+        
+        errors.sort(key=lambda e: e['index'])
+        # Sin citas aceptadas no se toma número de cambio ni se inserta nada
+        if not accepted or (errors and atomic):
+            return jsonify({
+                'error': 'Ninguna cita fue creada',
+                'errors': errors
+            }), 400
+        
+        # 4) Insertar citas con executemany y los eventos del outbox en una transacción
+        # El insert Core no pasa por el flush: número de cambio explícito,
+        # tomado recién después de la verificación de solapamientos
+        change_seq = next_change_seq(db.session.connection())
+        updated_at = get_peru_time().replace(tzinfo=None)
+        rows = [
+            {
+                'patient_name': item['patient_name'],
+                'start_datetime': start_dt,
+                'end_datetime': end_dt,
+                'status': 'programada',
+                'notes': item.get('notes', ''),
+                'professional_id': current_user.id,
+                'client_id': item.get('client_id'),
+                'change_seq': change_seq,
+                'updated_at': updated_at
+            }
+            for _, item, start_dt, end_dt in accepted
+        ]
+        ids = db.session.execute(
+            insert(Appointment).returning(Appointment.id, sort_by_parameter_order=True),
+            rows
+        ).scalars().all()
+        
+        # Un evento por cliente, resumiendo si recibe varias citas
+        by_client = {}
+        for id, row in zip(ids, rows):
+            if row['client_id']:
+                by_client.setdefault(row['client_id'], []).append((id, row))
+        for client_id, client_rows in by_client.items():
+            first_id, first = min(client_rows, key=lambda r: r[1]['start_datetime'])
+            start = first['start_datetime'].strftime('%d/%m/%Y %H:%M')
+            if len(client_rows) == 1:
+                enqueue_notification(client_id, 'created', appointment_id=first_id,
+                                     patient_name=first['patient_name'], start=start)
+            else:
+                enqueue_notification(client_id, 'bulk_created', count=len(client_rows), start=start)
+        
+        queue_changes(db.session, [
+            (id, current_user.id, row['start_datetime'], row['end_datetime'], True)
+            for id, row in zip(ids, rows)
+        ], change_seq=change_seq)
+        db.session.commit()
+    invalidate_appointment_caches(current_user.id, *by_client)
+    
+    return jsonify({
+        'message': f'{len(ids)} citas creadas exitosamente',
+        'created': [
+            {'index': index, 'id': id}
+            for (index, _, _, _), id in zip(accepted, ids)
+        ],
+        'errors': errors
+    }), 201
+
+
 @api_bp.route('/appointments/<int:id>', methods=['PUT'])
 @login_required
 def update_appointment(id):
@@ -254,53 +834,37 @@ def update_appointment(id):
     if end_dt <= start_dt:
         return jsonify({'error': 'La fecha de fin debe ser posterior a la fecha de inicio'}), 400
     
-    # Verificar solapamiento si cambiaron las fechas
-    if 'start_datetime' in data or 'end_datetime' in data:
-        overlapping = check_appointment_overlap(
-            appointment.professional_id,
-            start_dt,
-            end_dt,
-            exclude_appointment_id=id
-        )
+    # ✅ Verificación y escritura en la misma transacción (ver project.booking);
+    # la cita se vuelve a leer dentro de ella
+    with booking_transaction(appointment.professional_id, start_dt, end_dt, exclude_id=id):
+        # Verificar solapamiento si cambiaron las fechas
+        if 'start_datetime' in data or 'end_datetime' in data:
+            overlapping = check_appointment_overlap(
+                appointment.professional_id,
+                start_dt,
+                end_dt,
+                exclude_appointment_id=id
+            )
+            
+            if overlapping:
+                return overlap_response(overlapping)
+        
+        # Actualizar campos permitidos
+        appointment.patient_name = data.get('patient_name', appointment.patient_name)
+        appointment.start_datetime = start_dt
+        appointment.end_datetime = end_dt
+        appointment.notes = data.get('notes', appointment.notes)
         
-        if overlapping:
-            return jsonify({
-                'error': 'La cita se solapa con otra existente',
-                'conflicting_appointment': {
-                    'id': overlapping.id,
-                    'patient': overlapping.patient_name,
-                    'start': overlapping.start_datetime.isoformat(),
-                    'end': overlapping.end_datetime.isoformat()
-                }
-            }), 400
-    
-    # Actualizar campos permitidos
-    appointment.patient_name = data.get('patient_name', appointment.patient_name)
-    appointment.start_datetime = start_dt
-    appointment.end_datetime = end_dt
-    appointment.notes = data.get('notes', appointment.notes)
-    
-    if 'client_id' in data:
         old_client_id = appointment.client_id
-        appointment.client_id = data.get('client_id')
+        if 'client_id' in data:
+            appointment.client_id = data.get('client_id')
         
-        if appointment.client_id and appointment.client_id != old_client_id:
-            notif = Notification(
-                user_id=appointment.client_id,
-                message=f'Cita asignada: {appointment.patient_name} el {start_dt.strftime("%d/%m/%Y %H:%M")}',
-                type='info'
-            )
-            db.session.add(notif)
-    
-    if appointment.client_id:
-        notif = Notification(
-            user_id=appointment.client_id,
-            message=f'Cita actualizada: {appointment.patient_name} el {start_dt.strftime("%d/%m/%Y %H:%M")}',
-            type='warning'
-        )
-        db.session.add(notif)
-    
-    db.session.commit()
+        # ✅ Un solo evento por edición: "asignada" si cambió el cliente
+        kind = 'assigned' if appointment.client_id != old_client_id else 'updated'
+        enqueue_notification(appointment.client_id, kind, appointment)
+        
+        db.session.commit()
+    invalidate_appointment_caches(appointment.professional_id, appointment.client_id, old_client_id)
     return jsonify({
         'message': 'Cita actualizada exitosamente',
         'appointment': appointment.to_dict()
@@ -323,16 +887,10 @@ def complete_appointment(id):
     
     try:
         appointment.complete()
-        
-        if appointment.client_id:
-            notif = Notification(
-                user_id=appointment.client_id,
-                message=f'Cita completada: {appointment.patient_name}',
-                type='success'
-            )
-            db.session.add(notif)
+        enqueue_notification(appointment.client_id, 'completed', appointment)
         
         db.session.commit()
+        invalidate_appointment_caches(appointment.professional_id, appointment.client_id)
         return jsonify({
             'message': 'Cita marcada como completada',
             'appointment': appointment.to_dict()
@@ -360,16 +918,10 @@ def cancel_appointment(id):
     
     try:
         appointment.cancel(reason)
-        
-        if appointment.client_id:
-            notif = Notification(
-                user_id=appointment.client_id,
-                message=f'Cita cancelada: {appointment.patient_name}. Motivo: {reason}',
-                type='danger'
-            )
-            db.session.add(notif)
+        enqueue_notification(appointment.client_id, 'cancelled', appointment, reason=reason)
         
         db.session.commit()
+        invalidate_appointment_caches(appointment.professional_id, appointment.client_id)
         return jsonify({
             'message': 'Cita cancelada exitosamente',
             'appointment': appointment.to_dict()
@@ -391,35 +943,143 @@ def delete_appointment(id):
     if not current_user.is_admin():
         return jsonify({'error': 'Solo administradores pueden eliminar citas permanentemente'}), 403
     
-    if appointment.client_id:
-        notif = Notification(
-            user_id=appointment.client_id,
-            message=f'Cita eliminada: {appointment.patient_name}',
-            type='danger'
-        )
-        db.session.add(notif)
+    enqueue_notification(appointment.client_id, 'deleted', appointment)
     
+    professional_id, client_id = appointment.professional_id, appointment.client_id
     db.session.delete(appointment)
     db.session.commit()
+    invalidate_appointment_caches(professional_id, client_id)
     return jsonify({'message': 'Cita eliminada permanentemente'})
 
 
+@api_bp.route('/availability', methods=['GET'])
+@login_required
+def get_availability_slots():
+    """
+    ✅ NUEVO: Horarios libres de uno o varios profesionales.
+    
+    Query params:
+        start: Fecha inicial (YYYY-MM-DD). Por defecto hoy
+        end: Fecha final exclusiva. Por defecto start + 7 días
+        duration: Minutos por slot (por defecto 30)
+        step: Minutos entre inicios de slot (por defecto = duration)
+        work_start, work_end: Horario laboral HH:MM (por defecto 08:00-18:00)
+        professional_ids: Ids separados por coma. Por defecto el usuario
+                          actual si es profesional, o todos los profesionales activos
+    """
+    config = current_app.config
+    try:
+        start_date = parse_datetime(request.args['start']).date() if request.args.get('start') else get_peru_time().date()
+        end_date = parse_datetime(request.args['end']).date() if request.args.get('end') else start_date + timedelta(days=7)
+        duration_minutes = int(request.args.get('duration', 30))
+        step_minutes = int(request.args.get('step', duration_minutes))
+        work_start = time.fromisoformat(request.args.get('work_start', '08:00'))
+        work_end = time.fromisoformat(request.args.get('work_end', '18:00'))
+        professional_ids = [int(x) for x in request.args['professional_ids'].split(',') if x.strip()] \
+            if request.args.get('professional_ids') else None
+    except ValueError as e:
+        return jsonify({'error': f'Parámetros inválidos: {str(e)}'}), 400
+    
+    if end_date <= start_date or (end_date - start_date).days > config['AVAILABILITY_MAX_DAYS']:
+        return jsonify({'error': f'El rango debe tener entre 1 y {config["AVAILABILITY_MAX_DAYS"]} días'}), 400
+    # Acotar antes de construir el timedelta: un valor enorme lanza OverflowError
+    if not (0 < duration_minutes <= AVAILABILITY_MAX_SLOT_MINUTES and 0 < step_minutes <= AVAILABILITY_MAX_SLOT_MINUTES):
+        return jsonify({'error': f'duration y step deben estar entre 1 y {AVAILABILITY_MAX_SLOT_MINUTES} minutos'}), 400
+    duration = timedelta(minutes=duration_minutes)
+    step = timedelta(minutes=step_minutes)
+    if work_end <= work_start:
+        return jsonify({'error': 'work_end debe ser posterior a work_start'}), 400
+    
+    professionals_query = db.session.query(User.id, User.username).filter(
+        User.role.in_(['admin', 'profesional']),
+        User.is_active == True
+    )
+    if professional_ids is not None:
+        professionals_query = professionals_query.filter(User.id.in_(professional_ids))
+    elif current_user.is_professional() and not current_user.is_admin():
+        professionals_query = professionals_query.filter(User.id == current_user.id)
+    professionals = professionals_query.order_by(User.username).limit(config['AVAILABILITY_MAX_PROFESSIONALS']).all()
+    
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days)]
+    availability = get_availability(
+        [p.id for p in professionals], days, duration, step, work_start, work_end,
+        ttl=config['AVAILABILITY_CACHE_TTL']
+    )
+    
+    # Los slots cacheados no dependen de la hora; los pasados se filtran aquí
+    now = get_peru_time().replace(tzinfo=None)
+    return jsonify({
+        'start': start_date.isoformat(),
+        'end': end_date.isoformat(),
+        'duration': int(duration.total_seconds() // 60),
+        'professionals': [
+            {
+                'id': p.id,
+                'username': p.username,
+                'slots': [
+                    {
+                        'start': to_peru_iso(slot_start),
+                        'end': to_peru_iso(slot_end)
+                    }
+                    for day in days
+                    for slot_start, slot_end in availability[p.id][day]
+                    if slot_start >= now
+                ]
+            }
+            for p in professionals
+        ]
+    })
+
+
 @api_bp.route('/notifications', methods=['GET'])
 @login_required
 def get_notifications():
-    notifications = Notification.query.filter_by(
-        user_id=current_user.id, 
-        is_read=False
-    ).order_by(Notification.created_at.desc()).limit(10).all()
+    """
+    Notificaciones no leídas más recientes.
+    
+    ✅ Responde 304 sin consultar la base si el ETag (usuario y versión en
+    memoria de sus notificaciones) no cambió.
     
-    return jsonify([
-        {
-            'id': n.id,
-            'message': n.message,
-            'type': n.type,
-            'created_at': n.created_at.strftime('%Y-%m-%d %H:%M')
-        } for n in notifications
-    ])
+    Query params opcionales:
+        since_id: Solo notificaciones con id mayor a este
+    """
+    since_id = request.args.get('since_id', type=int)
+    etag = notifications_etag(current_user.id, since_id)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    
+    items = unread_notifications(current_user.id, since_id)
+    return with_etag(jsonify(items), etag)
+
+
+@api_bp.route('/notifications/stream', methods=['GET'])
+@login_required
+def stream_notifications():
+    """
+    ✅ NUEVO: Stream Server-Sent Events con las notificaciones nuevas del usuario.
+    
+    Cada stream ocupa un hilo: pasado NOTIFICATIONS_STREAM_MAX_CONNECTIONS
+    responde 204, con lo que EventSource no reconecta y la página sigue con
+    el polling de /notifications.
+    """
+    config = current_app.config
+    if not stream_slots.acquire(config['NOTIFICATIONS_STREAM_MAX_CONNECTIONS']):
+        return Response(status=204)
+    
+    user_id = current_user.id
+    # El stream no usa la base: liberar la conexión antes de empezar
+    db.session.remove()
+    
+    response = Response(
+        stream_events(user_id, max_seconds=config['NOTIFICATIONS_STREAM_MAX_SECONDS']),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # El servidor cierra la respuesta al terminar o cortarse el stream,
+    # aunque el generador no haya llegado a empezar
+    response.call_on_close(stream_slots.release)
+    return response
 
 
 @api_bp.route('/notifications/<int:id>/read', methods=['POST'])
@@ -432,41 +1092,32 @@ def mark_notification_read(id):
     
     notification.is_read = True
     db.session.commit()
+    bus.publish(current_user.id, 'read', {'id': id})
+    return jsonify({'message': 'Notificación marcada como leída'})
+
+
+@api_bp.route('/notifications/<key>/read', methods=['POST'])
+@login_required
+def dismiss_ephemeral_notification(key):
+    """Marca como leída una notificación efímera (id no numérico)."""
+    if not dismiss_ephemeral(key):
+        return jsonify({'error': 'Notificación no encontrada'}), 404
+    bus.publish(current_user.id, 'read', {'id': key})
     return jsonify({'message': 'Notificación marcada como leída'})
 
 
 @api_bp.route('/stats', methods=['GET'])
 @login_required
 def get_stats():
-    stats = {}
-    
-    if current_user.is_admin():
-        stats['total_users'] = User.query.count()
-        stats['total_appointments'] = Appointment.query.filter(
-            Appointment.status != 'cancelada'
-        ).count()
-        stats['active_appointments'] = Appointment.query.filter_by(status='programada').count()
-        stats['cancelled_appointments'] = Appointment.query.filter_by(status='cancelada').count()
-    elif current_user.is_professional():
-        stats['my_appointments'] = Appointment.query.filter_by(
-            professional_id=current_user.id
-        ).filter(Appointment.status != 'cancelada').count()
-        stats['pending'] = Appointment.query.filter_by(
-            professional_id=current_user.id, status='programada'
-        ).count()
-        stats['completed'] = Appointment.query.filter_by(
-            professional_id=current_user.id, status='completada'
-        ).count()
-        stats['cancelled'] = Appointment.query.filter_by(
-            professional_id=current_user.id, status='cancelada'
-        ).count()
-    else:
-        stats['my_appointments'] = Appointment.query.filter_by(
-            client_id=current_user.id
-        ).filter(Appointment.status != 'cancelada').count()
-        stats['upcoming'] = Appointment.query.filter_by(
-            client_id=current_user.id, status='programada'
-        ).count()
+    """
+    ✅ MEJORADO: Un solo GROUP BY por estado por rol, cacheado unos segundos
+    por usuario (las estadísticas de admin son globales y se comparten).
+    Responde 304 si las citas (y, para admin, los usuarios) no cambiaron.
+    """
+    cache_key, scopes = stats_scope(current_user)
+    etag = make_etag(scopes, cache_key)
+    response = not_modified(etag)
+    if response is not None:
+        return response
     
-    return jsonify(stats)
-
+    return with_etag(jsonify(user_stats(current_user, cache_key, etag)), etag)
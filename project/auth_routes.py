@@ -1,8 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
-from flask_dance.contrib.google import google
 from project import db
-from project.models import User, Notification
+from project.models import User
+from project.notifications import push_ephemeral
+from project.security import PasswordPoolBusy, charge_rate, rate_exhausted, rate_limited
+from project.versions import bump_users
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -16,29 +18,47 @@ def login():
         username = request.form.get('username')
         password = request.form.get('password')
         
+        # ✅ Rate limiting antes de tocar la base o calcular bcrypt. El límite
+        # por usuario es por (IP, usuario) y solo cuenta los fallos: desde otra
+        # IP no se puede bloquear a un usuario ni lo agotan sus propios logins
+        username_key = (request.remote_addr, (username or '').lower())
+        if (rate_limited('LOGIN_RATE_PER_IP', request.remote_addr) or
+                rate_exhausted('LOGIN_RATE_PER_USERNAME', username_key)):
+            flash('Demasiados intentos. Espera un momento e inténtalo de nuevo.', 'danger')
+            return render_template('login.html'), 429
+        
         user = User.query.filter_by(username=username).first()
         
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and user.check_password(password)
+        except PasswordPoolBusy:
+            flash('El servidor está ocupado. Inténtalo de nuevo en unos segundos.', 'warning')
+            return render_template('login.html'), 503
+        
+        if valid:
             if not user.is_active:
                 flash('Tu cuenta ha sido desactivada. Contacta al administrador.', 'danger')
                 return redirect(url_for('auth.login'))
             
+            # Regenerar el hash si se cambió BCRYPT_LOG_ROUNDS
+            if user.password_needs_rehash():
+                try:
+                    user.set_password(password)
+                    db.session.commit()
+                except PasswordPoolBusy:
+                    pass
+            
             login_user(user, remember=True)
             
-            # Crear notificación de bienvenida
-            welcome_msg = Notification(
-                user_id=user.id,
-                message=f'¡Bienvenido de nuevo, {user.username}!',
-                type='success'
-            )
-            db.session.add(welcome_msg)
-            db.session.commit()
+            # ✅ Bienvenida efímera: vive en la sesión, no en la tabla notification
+            push_ephemeral(user.id, f'¡Bienvenido de nuevo, {user.username}!', type='success')
             
             flash(f'¡Bienvenido, {user.username}!', 'success')
             
             next_page = request.args.get('next')
             return redirect(next_page) if next_page else redirect(url_for('auth.dashboard'))
         else:
+            charge_rate('LOGIN_RATE_PER_USERNAME', username_key)
             flash('Credenciales inválidas. Verifica tu usuario y contraseña.', 'danger')
     
     return render_template('login.html')
@@ -46,7 +66,13 @@ def login():
 @auth_bp.route('/google-login')
 def google_login():
     # Verificar si Google OAuth está configurado
+    if not current_app.config.get('GOOGLE_OAUTH_CLIENT_ID'):
+        flash('Google OAuth no está configurado. Por favor usa registro tradicional.', 'warning')
+        return redirect(url_for('auth.register'))
+    
     try:
+        from flask_dance.contrib.google import google
+        
         if not google.authorized:
             return redirect(url_for('google.login'))
         
@@ -75,6 +101,7 @@ def google_login():
                 )
                 db.session.add(user)
                 db.session.commit()
+                bump_users()
                 flash('¡Cuenta creada exitosamente!', 'success')
             else:
                 user.google_id = google_id
@@ -103,6 +130,10 @@ def register():
         password = request.form.get('password')
         confirm_password = request.form.get('confirm_password')
         
+        if rate_limited('REGISTER_RATE_PER_IP', request.remote_addr):
+            flash('Demasiados registros desde esta conexión. Inténtalo más tarde.', 'danger')
+            return render_template('register.html'), 429
+        
         if password != confirm_password:
             flash('Las contraseñas no coinciden.', 'danger')
             return redirect(url_for('auth.register'))
@@ -120,10 +151,15 @@ def register():
             email=email,
             role='cliente'
         )
-        new_user.set_password(password)
+        try:
+            new_user.set_password(password)
+        except PasswordPoolBusy:
+            flash('El servidor está ocupado. Inténtalo de nuevo en unos segundos.', 'warning')
+            return redirect(url_for('auth.register'))
         
         db.session.add(new_user)
         db.session.commit()
+        bump_users()
         
         flash('¡Registro exitoso! Ahora puedes iniciar sesión.', 'success')
         return redirect(url_for('auth.login'))
@@ -0,0 +1,155 @@
+"""
+Búsqueda de horarios libres (GET /api/availability).
+
+Las citas ocupadas de todos los profesionales pedidos se leen en una sola
+consulta, se fusionan en intervalos disjuntos y se recorren una vez junto con
+las ventanas de horario laboral de cada día. El resultado por
+profesional/día se cachea; invalidate_availability() descarta todo lo del
+profesional cuando cambian sus citas, en este proceso o en otro (ver
+ConflictEngine.sync).
+"""
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from project import db
+from project.cache import TTLCache
+from project.models import Appointment, ACTIVE_STATUSES
+
+_cache = TTLCache(ttl=300, maxsize=20000)
+_generations = defaultdict(int)
+_generations_lock = threading.Lock()
+
+
+def invalidate_availability(professional_id=None):
+    """
+    Las entradas anteriores del profesional quedan inaccesibles y expiran
+    solas. Sin profesional se descarta toda la caché.
+    """
+    if professional_id is None:
+        _cache.clear()
+        return
+    with _generations_lock:
+        _generations[professional_id] += 1
+
+
+def _generation(professional_id):
+    with _generations_lock:
+        return _generations[professional_id]
+
+
+def merge_intervals(intervals):
+    """Fusiona intervalos (start, end) ordenados por inicio en intervalos disjuntos."""
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def free_slots(merged, windows, duration, step):
+    """
+    Recorre una sola vez los intervalos ocupados (disjuntos y ordenados) y
+    las ventanas laborales (ordenadas) y genera los slots libres.
+
+    Los slots empiezan en múltiplos de `step` desde el inicio de cada ventana.
+
+    Returns:
+        Lista de slots (start, end) por ventana, en el mismo orden
+    """
+    result = []
+    i = 0
+    for window_start, window_end in windows:
+        slots = []
+        # Saltar ocupados que terminan antes de la ventana
+        while i < len(merged) and merged[i][1] <= window_start:
+            i += 1
+
+        cursor = window_start
+        j = i
+        while True:
+            if j < len(merged) and merged[j][0] < window_end:
+                gap_end = merged[j][0]
+            else:
+                gap_end = window_end
+            if gap_end > cursor:
+                # Primer punto de la grilla >= cursor
+                offset = (cursor - window_start) % step
+                slot_start = cursor if not offset else cursor + (step - offset)
+                while slot_start + duration <= gap_end:
+                    slots.append((slot_start, slot_start + duration))
+                    slot_start += step
+            if gap_end == window_end:
+                break
+            cursor = max(cursor, merged[j][1])
+            j += 1
+            if cursor >= window_end:
+                break
+        result.append(slots)
+    return result
+
+
+def day_windows(days, work_start, work_end):
+    return [
+        (datetime.combine(day, work_start), datetime.combine(day, work_end))
+        for day in days
+    ]
+
+
+def get_availability(professional_ids, days, duration, step, work_start, work_end, ttl=300):
+    """
+    Slots libres por profesional y día.
+
+    Args:
+        professional_ids: Ids de profesionales
+        days: Lista ordenada de fechas (date)
+        duration, step: timedelta
+        work_start, work_end: time del horario laboral
+
+    Returns:
+        dict {professional_id: {date: [(start, end), ...]}}
+    """
+    params = (work_start, work_end, duration, step)
+    result = {pid: {} for pid in professional_ids}
+    missing = defaultdict(list)
+    generations = {}
+
+    for pid in professional_ids:
+        generations[pid] = _generation(pid)
+        for day in days:
+            slots = _cache.get((pid, generations[pid], day) + params)
+            if slots is None:
+                missing[pid].append(day)
+            else:
+                result[pid][day] = slots
+
+    if missing:
+        first_day = min(d for ds in missing.values() for d in ds)
+        last_day = max(d for ds in missing.values() for d in ds)
+        range_start = datetime.combine(first_day, work_start)
+        range_end = datetime.combine(last_day, work_end)
+
+        rows = db.session.query(
+            Appointment.professional_id, Appointment.start_datetime, Appointment.end_datetime
+        ).filter(
+            Appointment.professional_id.in_(list(missing)),
+            Appointment.status.in_(ACTIVE_STATUSES),
+            Appointment.start_datetime < range_end,
+            Appointment.end_datetime > range_start
+        ).order_by(Appointment.professional_id, Appointment.start_datetime).all()
+
+        booked = defaultdict(list)
+        for pid, start, end in rows:
+            booked[pid].append((start, end))
+
+        for pid, pid_days in missing.items():
+            windows = day_windows(pid_days, work_start, work_end)
+            per_day = free_slots(merge_intervals(booked[pid]), windows, duration, step)
+            for day, slots in zip(pid_days, per_day):
+                result[pid][day] = slots
+                _cache.set((pid, generations[pid], day) + params, slots, ttl=ttl)
+
+    return result
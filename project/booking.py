@@ -0,0 +1,102 @@
+"""
+Reservas sin doble agenda con requests concurrentes.
+
+La verificación de solapamiento y el INSERT/UPDATE de la cita van en la misma
+transacción, abierta con booking_transaction():
+
+  - SQLite: la transacción empieza con BEGIN IMMEDIATE y toma el lock de
+    escritura antes de verificar, así que dos workers (o dos hilos) no pueden
+    pasar la verificación a la vez. El lock dura solo la verificación y la
+    escritura; las lecturas siguen en paralelo gracias a WAL.
+  - PostgreSQL: la verificación no toma locks; la restricción de exclusión
+    appointment_no_overlap (migración 5) rechaza la segunda escritura y la
+    ruta responde el mismo 400 "se solapa" mediante OverlapConflict. Solo
+    el paso final antes del commit bloquea la fila de change_counter
+    (project.changes), para numerar los cambios en orden de commit.
+
+Dentro del proceso, los hilos que reservan para el mismo profesional esperan
+en un lock (sin reintentos) en vez de competir por el lock de la base. Hay
+PROFESSIONAL_LOCK_STRIPES locks repartidos por id: las reservas de
+profesionales distintos solo se esperan entre sí si comparten lock.
+
+Al empezar, el índice de conflictos en memoria se pone al día con los cambios
+confirmados por otros procesos (ConflictEngine.sync), por lo que la
+verificación sigue sin recorrer las citas del profesional.
+"""
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy.exc import IntegrityError
+
+from project import db
+from project.conflicts import conflict_engine
+from project.database import BEGIN_IMMEDIATE
+
+OVERLAP_CONSTRAINT = 'appointment_no_overlap'
+# SQLSTATE exclusion_violation de PostgreSQL
+EXCLUSION_VIOLATION = '23P01'
+
+
+class OverlapConflict(Exception):
+    """La base rechazó una cita que se solapa con otra del mismo profesional."""
+
+    def __init__(self, professional_id=None, start=None, end=None, exclude_id=None):
+        super().__init__('La cita se solapa con otra existente')
+        self.professional_id = professional_id
+        self.start = start
+        self.end = end
+        self.exclude_id = exclude_id
+
+
+# Locks repartidos por id de profesional: memoria fija aunque haya miles de
+# profesionales; dos que comparten lock solo se esperan durante la reserva
+PROFESSIONAL_LOCK_STRIPES = 64
+_professional_locks = [threading.Lock() for _ in range(PROFESSIONAL_LOCK_STRIPES)]
+
+
+def _professional_lock(professional_id):
+    return _professional_locks[professional_id % PROFESSIONAL_LOCK_STRIPES]
+
+
+def is_overlap_violation(error):
+    orig = getattr(error, 'orig', None)
+    code = getattr(orig, 'pgcode', None) or getattr(orig, 'sqlstate', None)
+    return code == EXCLUSION_VIOLATION or OVERLAP_CONSTRAINT in str(orig)
+
+
+@contextmanager
+def booking_transaction(professional_id=None, start=None, end=None, exclude_id=None):
+    """
+    Transacción para verificar solapamientos y escribir citas.
+
+    Llamar antes de modificar la sesión: lo leído hasta ese momento se
+    descarta y se vuelve a cargar dentro de la transacción. Al salir sin
+    commit (p. ej. respondiendo un 400) se hace rollback y se libera el lock.
+
+    Args:
+        professional_id, start, end, exclude_id: Datos de la cita, para
+            informar la cita en conflicto si PostgreSQL rechaza la escritura
+
+    Raises:
+        OverlapConflict: Si la restricción de exclusión rechazó la escritura
+    """
+    session = db.session()
+    if session.in_transaction():
+        session.rollback()
+    lock = _professional_lock(professional_id) if professional_id is not None else None
+    if lock is not None:
+        lock.acquire()
+    try:
+        connection = session.connection(execution_options={BEGIN_IMMEDIATE: True})
+        conflict_engine.sync(connection)
+        yield
+    except IntegrityError as error:
+        session.rollback()
+        if is_overlap_violation(error):
+            raise OverlapConflict(professional_id, start, end, exclude_id) from error
+        raise
+    finally:
+        if session.in_transaction():
+            session.rollback()
+        if lock is not None:
+            lock.release()
@@ -0,0 +1,114 @@
+"""
+Secuencia de cambios de citas para la sincronización incremental
+(GET /api/appointments/changes?since=<token>).
+
+Cada transacción que crea, modifica o borra citas toma, justo antes del
+commit, el siguiente número del contador persistente `change_counter` y lo
+guarda en Appointment.change_seq de las citas que tocó; los borrados (y los
+cambios de cliente, para el cliente anterior) dejan un AppointmentTombstone
+con ese número. El UPDATE del contador bloquea la fila hasta el commit, así
+que los números se confirman en orden y un lector nunca salta un cambio que
+aún no era visible.
+
+El número se toma en before_commit, después del último flush: la verificación
+de solapamiento y las escrituras de la reserva corren sin el lock, y las
+transacciones de profesionales distintos solo se esperan durante ese paso
+final (un UPDATE del contador, uno de las citas y el commit).
+
+Las inserciones masivas con Core no pasan por el flush: deben pedir el número
+con next_change_seq() como último paso antes de escribir sus filas y
+registrarlo con conflicts.queue_changes().
+"""
+from sqlalchemy import event, insert, inspect, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from project import db
+from project.models import Appointment, AppointmentTombstone, ChangeCounter, get_peru_time
+
+COUNTER_NAME = 'appointments'
+# session.info: números asignados en la transacción en curso (ver ConflictEngine.sync)
+SESSION_SEQS_KEY = 'appointment_change_seqs'
+
+
+def next_change_seq(connection):
+    """Incrementa el contador dentro de la transacción actual y devuelve el nuevo valor."""
+    connection.execute(
+        update(ChangeCounter)
+        .where(ChangeCounter.name == COUNTER_NAME)
+        .values(value=ChangeCounter.value + 1)
+    )
+    return connection.execute(
+        select(ChangeCounter.value).where(ChangeCounter.name == COUNTER_NAME)
+    ).scalar_one()
+
+
+def remember_change_seq(session, seq):
+    """Registra un número de cambio usado por la transacción de `session`."""
+    session.info.setdefault(SESSION_SEQS_KEY, set()).add(seq)
+
+
+def current_change_seq():
+    return db.session.execute(
+        select(ChangeCounter.value).where(ChangeCounter.name == COUNTER_NAME)
+    ).scalar() or 0
+
+
+# session.info: citas cambiadas y rastros pendientes de numerar en el commit
+_PENDING_KEY = 'appointment_changes_to_number'
+
+
+@event.listens_for(db.session, 'before_flush')
+def _track_appointment_changes(session, flush_context, instances):
+    changed = [obj for obj in session.new if isinstance(obj, Appointment)]
+    changed += [obj for obj in session.dirty
+                if isinstance(obj, Appointment) and session.is_modified(obj)]
+    deleted = [obj for obj in session.deleted if isinstance(obj, Appointment)]
+    if not changed and not deleted:
+        return
+
+    objects, tombstones = session.info.setdefault(_PENDING_KEY, ([], []))
+    now = get_peru_time().replace(tzinfo=None)
+
+    for obj in changed:
+        obj.updated_at = now
+        objects.append(obj)
+        # El cliente anterior debe quitar la cita de su calendario
+        for old_client_id in inspect(obj).attrs.client_id.history.deleted:
+            if old_client_id and old_client_id != obj.client_id:
+                tombstones.append({'appointment_id': obj.id, 'professional_id': None,
+                                   'client_id': old_client_id})
+
+    for obj in deleted:
+        tombstones.append({'appointment_id': obj.id, 'professional_id': obj.professional_id,
+                           'client_id': obj.client_id})
+
+
+@event.listens_for(db.session, 'before_commit')
+def _assign_change_seq(session):
+    # Lo que quede sin escribir se escribe (y verifica) antes de tomar el contador
+    session.flush()
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending is None:
+        return
+
+    objects, tombstones = pending
+    connection = session.connection()
+    seq = next_change_seq(connection)
+    remember_change_seq(session, seq)
+    ids = {obj.id for obj in objects if obj.id is not None}
+    if ids:
+        connection.execute(
+            update(Appointment).where(Appointment.id.in_(ids)).values(change_seq=seq)
+        )
+        for obj in objects:
+            set_committed_value(obj, 'change_seq', seq)
+    if tombstones:
+        connection.execute(
+            insert(AppointmentTombstone),
+            [dict(tombstone, change_seq=seq) for tombstone in tombstones]
+        )
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_changes_to_number(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,91 @@
+"""
+Compresión gzip / brotli de las respuestas grandes (JSON, HTML, JS, CSS).
+
+Brotli se usa solo si el paquete `brotli` está instalado y el navegador lo
+acepta. Las respuestas en streaming (listados con stream=1) se comprimen con
+gzip a medida que se generan; el SSE de notificaciones nunca se comprime.
+"""
+import gzip
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli es opcional
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'text/html',
+    'text/css',
+    'text/javascript',
+    'application/javascript',
+}
+
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _gzip_stream(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(response, min_size=1024, level=6):
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        if encoding == 'br' and not request.accept_encodings['gzip']:
+            return response
+        response.response = _gzip_stream(response.response, level)
+        response.headers.pop('Content-Length', None)
+        encoding = 'gzip'
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        if encoding == 'br':
+            response.set_data(brotli.compress(data, quality=min(level, 11)))
+        else:
+            response.set_data(gzip.compress(data, compresslevel=level))
+
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # El cuerpo ya no es byte a byte el original: el ETag pasa a ser débil
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    @app.after_request
+    def _compress(response):
+        if not app.config['COMPRESS_RESPONSES']:
+            return response
+        return compress_response(
+            response,
+            min_size=app.config['COMPRESS_MIN_SIZE'],
+            level=app.config['COMPRESS_LEVEL']
+        )
@@ -16,6 +16,126 @@ class Config:
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # ✅ Perfiles del engine según la base de datos
+    # SQLite: PRAGMAs aplicados en cada conexión nueva (ver project.database).
+    # WAL permite leer mientras otro proceso escribe; busy_timeout hace que un
+    # escritor espere el lock en vez de fallar con "database is locked".
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        # Negativo = KiB (64 MB por conexión)
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64000)),
+    }
+    # PostgreSQL: pool por worker y tiempo máximo por sentencia
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 15000))
+    
+    if SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            'connect_args': {'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000},
+        }
+    elif SQLALCHEMY_DATABASE_URI.startswith('postgresql'):
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            'pool_size': DB_POOL_SIZE,
+            'max_overflow': DB_MAX_OVERFLOW,
+            'pool_timeout': DB_POOL_TIMEOUT,
+            'pool_recycle': DB_POOL_RECYCLE,
+            'pool_pre_ping': True,
+            'connect_args': {'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'},
+        }
+    else:
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+    
+    # Cachés en memoria (segundos). 0 desactiva la caché.
+    STATS_CACHE_TTL = int(os.environ.get('STATS_CACHE_TTL', 30))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+    # Opcional: compartir la caché de usuarios entre procesos (requiere el paquete redis)
+    USER_CACHE_REDIS_URL = os.environ.get('USER_CACHE_REDIS_URL')
+    
+    # Tamaño máximo de página en los listados paginados (?limit=)
+    PAGINATION_MAX_LIMIT = int(os.environ.get('PAGINATION_MAX_LIMIT', 500))
+    
+    # Máximo de cambios por respuesta de /api/appointments/changes (más = recarga completa)
+    SYNC_MAX_CHANGES = int(os.environ.get('SYNC_MAX_CHANGES', 500))
+    
+    # Máximo de citas por request en POST /api/appointments/bulk
+    BULK_MAX_APPOINTMENTS = int(os.environ.get('BULK_MAX_APPOINTMENTS', 1000))
+    
+    # Búsqueda de horarios libres
+    AVAILABILITY_CACHE_TTL = int(os.environ.get('AVAILABILITY_CACHE_TTL', 300))
+    AVAILABILITY_MAX_DAYS = int(os.environ.get('AVAILABILITY_MAX_DAYS', 31))
+    AVAILABILITY_MAX_PROFESSIONALS = int(os.environ.get('AVAILABILITY_MAX_PROFESSIONALS', 100))
+    
+    # Reconstrucción periódica del índice de conflictos en memoria (segundos)
+    CONFLICT_INDEX_TTL = int(os.environ.get('CONFLICT_INDEX_TTL', 300))
+    
+    # Outbox de notificaciones: hilo en el proceso web (OUTBOX_WORKER_THREAD=0
+    # si se corre aparte con `flask outbox-worker`), lote y espera para fusionar
+    OUTBOX_WORKER_THREAD = os.environ.get('OUTBOX_WORKER_THREAD', '1') == '1'
+    OUTBOX_POLL_SECONDS = float(os.environ.get('OUTBOX_POLL_SECONDS', 5))
+    OUTBOX_COALESCE_SECONDS = float(os.environ.get('OUTBOX_COALESCE_SECONDS', 0.5))
+    OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 500))
+    
+    # Cada cuántos segundos cada proceso web trae los cambios que confirmaron
+    # otros procesos (project.relay); 0 lo desactiva
+    RELAY_POLL_SECONDS = float(os.environ.get('RELAY_POLL_SECONDS', 1))
+    
+    # Retención de notificaciones (flask prune-notifications), en días.
+    # NOTIFICATION_RETENTION_UNREAD_DAYS=0 conserva las no leídas.
+    NOTIFICATION_RETENTION_READ_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_READ_DAYS', 30))
+    NOTIFICATION_RETENTION_UNREAD_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_UNREAD_DAYS', 180))
+    NOTIFICATION_PRUNE_BATCH_SIZE = int(os.environ.get('NOTIFICATION_PRUNE_BATCH_SIZE', 1000))
+    
+    # Scheduler de tareas periódicas: hilo en cada proceso web (SCHEDULER_THREAD=0
+    # si se corre aparte con `flask scheduler`); solo ejecuta el dueño de la lease
+    SCHEDULER_THREAD = os.environ.get('SCHEDULER_THREAD', '1') == '1'
+    SCHEDULER_LEASE_SECONDS = int(os.environ.get('SCHEDULER_LEASE_SECONDS', 30))
+    # Recordatorios de citas: anticipación (minutos), cada cuánto se buscan y lote
+    REMINDERS_ENABLED = os.environ.get('REMINDERS_ENABLED', '1') == '1'
+    REMINDER_LEAD_MINUTES = int(os.environ.get('REMINDER_LEAD_MINUTES', 60))
+    REMINDER_INTERVAL_SECONDS = int(os.environ.get('REMINDER_INTERVAL_SECONDS', 60))
+    REMINDER_BATCH_SIZE = int(os.environ.get('REMINDER_BATCH_SIZE', 1000))
+    # Completar automáticamente las citas programadas que ya terminaron
+    AUTO_COMPLETE_APPOINTMENTS = os.environ.get('AUTO_COMPLETE_APPOINTMENTS', '0') == '1'
+    AUTO_COMPLETE_INTERVAL_SECONDS = int(os.environ.get('AUTO_COMPLETE_INTERVAL_SECONDS', 60))
+    
+    # Duración máxima de cada conexión SSE de notificaciones (el navegador reconecta)
+    NOTIFICATIONS_STREAM_MAX_SECONDS = int(os.environ.get('NOTIFICATIONS_STREAM_MAX_SECONDS', 300))
+    # Streams SSE abiertos a la vez por proceso: cada uno ocupa un hilo de
+    # gunicorn (--threads), así que debe quedar bastante por debajo de ese número
+    NOTIFICATIONS_STREAM_MAX_CONNECTIONS = int(os.environ.get('NOTIFICATIONS_STREAM_MAX_CONNECTIONS', 8))
+    
+    # Contraseñas: costo de bcrypt (los hashes con otro costo se regeneran al
+    # iniciar sesión) y pool acotado de hilos que calculan los hashes
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    BCRYPT_POOL_SIZE = int(os.environ.get('BCRYPT_POOL_SIZE', 2))
+    BCRYPT_MAX_PENDING = int(os.environ.get('BCRYPT_MAX_PENDING', 16))
+    
+    # Rate limiting de login/registro: "intentos/segundos" (token bucket).
+    # LOGIN_RATE_PER_USERNAME cuenta solo los fallos, por IP y usuario
+    LOGIN_RATE_PER_IP = os.environ.get('LOGIN_RATE_PER_IP', '20/60')
+    LOGIN_RATE_PER_USERNAME = os.environ.get('LOGIN_RATE_PER_USERNAME', '5/60')
+    REGISTER_RATE_PER_IP = os.environ.get('REGISTER_RATE_PER_IP', '5/300')
+    # Proxies delante de la app (Render usa 1) para leer la IP real de X-Forwarded-For
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+    
+    # Compresión gzip/brotli de respuestas de al menos COMPRESS_MIN_SIZE bytes
+    COMPRESS_RESPONSES = os.environ.get('COMPRESS_RESPONSES', '1') == '1'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    
+    # Métricas de rendimiento en /metrics (admin o `Authorization: Bearer METRICS_TOKEN`)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Las sentencias SQL más lentas que esto se registran en el log
+    SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_SECONDS', 0.2))
+    
     # Google OAuth Configuration
     GOOGLE_OAUTH_CLIENT_ID = os.environ.get('GOOGLE_OAUTH_CLIENT_ID')
     GOOGLE_OAUTH_CLIENT_SECRET = os.environ.get('GOOGLE_OAUTH_CLIENT_SECRET')
@@ -0,0 +1,420 @@
+"""
+Motor de detección de conflictos de agenda.
+
+Mantiene en memoria, por profesional, un índice ordenado por inicio de las
+citas que ocupan la agenda (programadas y completadas). Las consultas usan
+búsqueda binaria acotada por la duración máxima de las citas del índice, así
+que "¿se solapa?", "listar conflictos" y "próximo hueco libre" cuestan
+O(log n + k) en lugar de una consulta SQL por verificación.
+
+Los índices se construyen al primer uso con una sola consulta y se actualizan
+incrementalmente al hacer commit de cambios en Appointment (eventos de sesión
+al final del módulo). Las escrituras de otros procesos se incorporan con
+ConflictEngine.sync(), que lee los cambios posteriores al último change_seq
+visto (ver project.changes); además cada índice se reconstruye tras
+CONFLICT_INDEX_TTL segundos. sync() también cambia las versiones de los ETag
+(project.versions) y descarta la disponibilidad cacheada (project.availability)
+de los calendarios que otro proceso modificó; el hilo de project.relay la
+llama aunque nadie esté agendando.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import event, select
+
+from project import db
+from project.availability import invalidate_availability
+from project.changes import COUNTER_NAME, SESSION_SEQS_KEY, remember_change_seq
+from project.models import Appointment, AppointmentTombstone, ChangeCounter, ACTIVE_STATUSES
+from project.versions import ALL_APPOINTMENTS, versions
+
+
+class IntervalIndex:
+    """
+    Intervalos [start, end) de un profesional ordenados por (start, end, id).
+
+    Se guardan en bloques ordenados de tamaño acotado (como una SortedList):
+    insertar o borrar cuesta O(tamaño de bloque) y cada bloque mantiene un
+    resumen (fin máximo y mayor hueco interno) que permite a next_free_slot
+    saltar bloques completos sin huecos suficientes.
+    """
+
+    BLOCK_SIZE = 512
+
+    def __init__(self, rows=()):
+        items = sorted((start, end, id) for id, start, end in rows)
+        self._blocks = [items[i:i + self.BLOCK_SIZE] for i in range(0, len(items), self.BLOCK_SIZE)] or [[]]
+        self._firsts = [block[0] if block else None for block in self._blocks]
+        self._summaries = [self._summarize(block) for block in self._blocks]
+        self._by_id = {id: (start, end) for start, end, id in items}
+        # Duración máxima de los intervalos: permite acotar la búsqueda
+        # binaria aunque existan citas solapadas entre sí. Se cuentan las
+        # duraciones (pocas distintas) para recalcularla al borrar la mayor
+        self._lengths = Counter(end - start for start, end, _ in items)
+        self._max_length = max(self._lengths, default=timedelta(0))
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, id):
+        return id in self._by_id
+
+    @staticmethod
+    def _summarize(block):
+        """(fin máximo, mayor hueco entre intervalos consecutivos del bloque)."""
+        if not block:
+            return None, None
+        max_end = block[0][1]
+        max_gap = None
+        for start, end, _ in block[1:]:
+            gap = start - max_end
+            if max_gap is None or gap > max_gap:
+                max_gap = gap
+            if end > max_end:
+                max_end = end
+        return max_end, max_gap
+
+    def _refresh(self, b):
+        block = self._blocks[b]
+        self._firsts[b] = block[0] if block else None
+        self._summaries[b] = self._summarize(block)
+
+    def _locate(self, key):
+        """(bloque, posición) del primer item >= key."""
+        if len(self._blocks) == 1:
+            return 0, bisect_left(self._blocks[0], key)
+        b = max(bisect_right(self._firsts, key) - 1, 0)
+        return b, bisect_left(self._blocks[b], key)
+
+    def _iter_from(self, key):
+        b, i = self._locate(key)
+        for block in self._blocks[b:]:
+            yield from block[i:] if i else block
+            i = 0
+
+    def add(self, id, start, end):
+        self.remove(id)
+        item = (start, end, id)
+        b, i = self._locate(item)
+        block = self._blocks[b]
+        block.insert(i, item)
+        if len(block) > 2 * self.BLOCK_SIZE:
+            self._blocks[b:b + 1] = [block[:self.BLOCK_SIZE], block[self.BLOCK_SIZE:]]
+            self._firsts[b:b + 1] = [None, None]
+            self._summaries[b:b + 1] = [None, None]
+            self._refresh(b + 1)
+        self._refresh(b)
+        self._by_id[id] = (start, end)
+        self._lengths[end - start] += 1
+        self._max_length = max(self._max_length, end - start)
+
+    def remove(self, id):
+        interval = self._by_id.pop(id, None)
+        if interval is None:
+            return
+        b, i = self._locate((interval[0], interval[1], id))
+        del self._blocks[b][i]
+        if not self._blocks[b] and len(self._blocks) > 1:
+            del self._blocks[b], self._firsts[b], self._summaries[b]
+        else:
+            self._refresh(b)
+        length = interval[1] - interval[0]
+        self._lengths[length] -= 1
+        if not self._lengths[length]:
+            del self._lengths[length]
+            if length == self._max_length:
+                self._max_length = max(self._lengths, default=timedelta(0))
+
+    def _candidates(self, start, end):
+        """Intervalos que podrían solaparse con [start, end), en orden de inicio."""
+        for item in self._iter_from((start - self._max_length,)):
+            if item[0] >= end:
+                break
+            yield item
+
+    def conflicts(self, start, end, exclude_id=None):
+        return [
+            id for s, e, id in self._candidates(start, end)
+            if e > start and id != exclude_id
+        ]
+
+    def first_conflict(self, start, end, exclude_id=None):
+        for s, e, id in self._candidates(start, end):
+            if e > start and id != exclude_id:
+                return id
+        return None
+
+    def next_free_slot(self, duration, after, before=None):
+        """
+        Primer inicio >= `after` con `duration` libre, o None si no cabe
+        antes de `before`.
+        """
+        cursor = after
+        b, i = self._locate((after - self._max_length,))
+        while b < len(self._blocks):
+            block = self._blocks[b]
+            max_end, max_gap = self._summaries[b]
+            if i == 0 and block:
+                if block[0][0] >= cursor + duration:
+                    break
+                if max_gap is None or max_gap < duration:
+                    # Ningún hueco interno alcanza: saltar el bloque completo
+                    cursor = max(cursor, max_end)
+                    b += 1
+                    continue
+            found = False
+            for s, e, _ in block[i:]:
+                if s >= cursor + duration:
+                    found = True
+                    break
+                cursor = max(cursor, e)
+            if found:
+                break
+            if before is not None and cursor + duration > before:
+                return None
+            b, i = b + 1, 0
+        if before is not None and cursor + duration > before:
+            return None
+        return cursor
+
+
+class ConflictEngine:
+    """Índices por profesional con LRU; seguro entre hilos."""
+
+    # Con más cambios pendientes que esto, sync() descarta los índices
+    MAX_SYNC_ROWS = 5000
+
+    def __init__(self, max_professionals=256):
+        self.max_professionals = max_professionals
+        self._indexes = OrderedDict()
+        self._lock = threading.RLock()
+        # Último change_seq incorporado a los índices (None: aún no sincronizado)
+        self._synced_seq = None
+        # Números posteriores confirmados por este proceso y ya aplicados
+        self._own_seqs = set()
+
+    def _load(self, professional_id):
+        rows = db.session.query(
+            Appointment.id, Appointment.start_datetime, Appointment.end_datetime
+        ).filter(
+            Appointment.professional_id == professional_id,
+            Appointment.status.in_(ACTIVE_STATUSES)
+        ).all()
+        return IntervalIndex(rows)
+
+    def index_for(self, professional_id):
+        ttl = current_app.config['CONFLICT_INDEX_TTL']
+        with self._lock:
+            index = self._indexes.get(professional_id)
+            if index is not None and time.monotonic() - index.built_at < ttl:
+                self._indexes.move_to_end(professional_id)
+                return index
+
+        index = self._load(professional_id)
+        with self._lock:
+            self._indexes[professional_id] = index
+            self._indexes.move_to_end(professional_id)
+            while len(self._indexes) > self.max_professionals:
+                self._indexes.popitem(last=False)
+        return index
+
+    def overlaps(self, professional_id, start, end, exclude_id=None):
+        return self.first_conflict(professional_id, start, end, exclude_id) is not None
+
+    def first_conflict(self, professional_id, start, end, exclude_id=None):
+        index = self.index_for(professional_id)
+        with self._lock:
+            return index.first_conflict(start, end, exclude_id)
+
+    def check_many(self, professional_id, slots):
+        """
+        Verifica varios candidatos a la vez contra las citas existentes.
+
+        Args:
+            slots: Iterable de (start, end) o (start, end, exclude_id)
+
+        Returns:
+            Lista con los ids en conflicto de cada candidato, en el mismo orden
+        """
+        index = self.index_for(professional_id)
+        with self._lock:
+            return [index.conflicts(*slot) for slot in slots]
+
+    def next_free_slot(self, professional_id, duration, after, before=None):
+        index = self.index_for(professional_id)
+        with self._lock:
+            return index.next_free_slot(duration, after, before)
+
+    def apply(self, changes):
+        """
+        Aplica cambios ya confirmados a los índices cargados.
+
+        Args:
+            changes: Lista de (id, professional_id, start, end, active)
+        """
+        with self._lock:
+            for id, professional_id, start, end, active in changes:
+                # La cita pudo cambiar de profesional: quitarla de todos
+                for index in self._indexes.values():
+                    index.remove(id)
+                index = self._indexes.get(professional_id)
+                if active and index is not None:
+                    index.add(id, start, end)
+
+    def sync(self, connection):
+        """
+        Incorpora a los índices los cambios de citas confirmados desde la
+        última sincronización, incluidos los de otros procesos.
+
+        Leer el contador y los cambios en la misma transacción que la
+        verificación de solapamiento la hace exacta (ver project.booking).
+
+        Los cambios ajenos (no registrados con note_committed) cambian además
+        las versiones de los calendarios afectados y descartan su
+        disponibilidad cacheada; si no se pueden leer todos, cambia la época
+        (se invalidan todos los ETag del proceso) y se vacía esa caché.
+        """
+        current = connection.execute(
+            select(ChangeCounter.value).where(ChangeCounter.name == COUNTER_NAME)
+        ).scalar() or 0
+        with self._lock:
+            since = self._synced_seq
+            if since is not None and current <= since:
+                return
+            # Si todos los cambios nuevos son de este proceso, no hay nada que leer
+            pending = range(since + 1, current + 1) if since is not None else ()
+            if pending and len(pending) <= len(self._own_seqs) and all(seq in self._own_seqs for seq in pending):
+                self._mark_synced(current)
+                return
+            own = set(self._own_seqs)
+
+        changes = []
+        scopes = set()
+        professionals = set()
+        if since is not None:
+            rows = connection.execute(
+                select(Appointment.change_seq, Appointment.id, Appointment.professional_id,
+                       Appointment.client_id, Appointment.start_datetime, Appointment.end_datetime,
+                       Appointment.status)
+                .where(Appointment.change_seq > since)
+                .limit(self.MAX_SYNC_ROWS + 1)
+            ).all()
+            # También los de cambio de cliente (sin profesional): solo para versiones
+            tombstones = connection.execute(
+                select(AppointmentTombstone.change_seq, AppointmentTombstone.appointment_id,
+                       AppointmentTombstone.professional_id, AppointmentTombstone.client_id)
+                .where(AppointmentTombstone.change_seq > since)
+                .limit(self.MAX_SYNC_ROWS + 1)
+            ).all()
+            if len(rows) > self.MAX_SYNC_ROWS or len(tombstones) > self.MAX_SYNC_ROWS:
+                since = None
+            else:
+                # En orden de cambio: un id reutilizado después de un borrado queda activo
+                changes = sorted(
+                    [(r.change_seq, (r.id, r.professional_id, r.start_datetime, r.end_datetime,
+                                     r.status in ACTIVE_STATUSES)) for r in rows]
+                    + [(t.change_seq, (t.appointment_id, t.professional_id, None, None, False))
+                       for t in tombstones if t.professional_id is not None],
+                    key=lambda change: change[0]
+                )
+                for change in list(rows) + list(tombstones):
+                    if change.change_seq not in own:
+                        if change.professional_id:
+                            scopes.add(('profesional', change.professional_id))
+                            professionals.add(change.professional_id)
+                        if change.client_id:
+                            scopes.add(('cliente', change.client_id))
+
+        with self._lock:
+            if self._synced_seq is not None and self._synced_seq >= current:
+                # Otra sincronización concurrente ya aplicó cambios más nuevos
+                return
+            if since is None:
+                # Primera sincronización o demasiados cambios: recargar al usarlos
+                self._indexes.clear()
+            else:
+                self.apply([change for _, change in changes])
+            self._mark_synced(current)
+
+        if since is None:
+            versions.renew_epoch()
+            invalidate_availability()
+            return
+        if scopes:
+            versions.bump(ALL_APPOINTMENTS, *scopes)
+        for professional_id in professionals:
+            invalidate_availability(professional_id)
+
+    def _mark_synced(self, seq):
+        self._synced_seq = max(self._synced_seq or 0, seq)
+        self._own_seqs = {own for own in self._own_seqs if own > self._synced_seq}
+
+    def note_committed(self, seqs):
+        """Registra los change_seq de una transacción propia ya aplicada a los índices."""
+        with self._lock:
+            if self._synced_seq is not None:
+                self._own_seqs.update(seq for seq in seqs if seq > self._synced_seq)
+
+    def invalidate(self, professional_id=None):
+        with self._lock:
+            if professional_id is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(professional_id, None)
+
+
+conflict_engine = ConflictEngine()
+
+
+# ---------------------------------------------------------------------------
+# Mantenimiento incremental al hacer commit
+# ---------------------------------------------------------------------------
+
+_PENDING_KEY = 'pending_appointment_changes'
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_appointment_changes(session, flush_context):
+    pending = session.info.setdefault(_PENDING_KEY, [])
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Appointment):
+            pending.append((obj.id, obj.professional_id, obj.start_datetime,
+                            obj.end_datetime, obj.status in ACTIVE_STATUSES))
+    for obj in session.deleted:
+        if isinstance(obj, Appointment):
+            pending.append((obj.id, obj.professional_id, None, None, False))
+
+
+def queue_changes(session, changes, change_seq=None):
+    """
+    Registra cambios hechos sin pasar por el flush del ORM (p. ej. inserts
+    masivos) para aplicarlos al índice cuando la sesión haga commit.
+
+    Args:
+        changes: Lista de (id, professional_id, start, end, active)
+        change_seq: Número de next_change_seq() que llevan las filas
+    """
+    session.info.setdefault(_PENDING_KEY, []).extend(changes)
+    if change_seq is not None:
+        remember_change_seq(session, change_seq)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_appointment_changes(session):
+    changes = session.info.pop(_PENDING_KEY, None)
+    seqs = session.info.pop(SESSION_SEQS_KEY, None)
+    if changes:
+        conflict_engine.apply(changes)
+    if seqs:
+        conflict_engine.note_committed(seqs)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_appointment_changes(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(SESSION_SEQS_KEY, None)
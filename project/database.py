@@ -0,0 +1,48 @@
+"""
+Ajustes de conexión que no caben en SQLALCHEMY_ENGINE_OPTIONS.
+
+En SQLite aplica los PRAGMAs de Config.SQLITE_PRAGMAS cada vez que el pool
+abre una conexión, y abre con BEGIN IMMEDIATE las transacciones que lo piden
+con la opción de ejecución BEGIN_IMMEDIATE (ver project.booking). El resto
+conserva el BEGIN implícito de sqlite3 antes del primer INSERT/UPDATE/DELETE:
+con un BEGIN explícito, una transacción que lee y después escribe fallaría
+con "database is locked" si otro proceso escribió entre medio.
+
+Los ajustes de PostgreSQL (pool, statement_timeout) ya van en las opciones
+del engine.
+"""
+from sqlalchemy import event
+
+from project import db
+
+# Opción de ejecución: la transacción toma el lock de escritura al empezar
+BEGIN_IMMEDIATE = 'begin_immediate'
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+def init_app(app):
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    with app.app_context():
+        # Crear el engine no abre conexiones: create_app sigue sin tocar la base
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+
+    if pragmas:
+        @event.listens_for(engine, 'connect')
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            apply_sqlite_pragmas(dbapi_connection, pragmas)
+
+    @event.listens_for(engine, 'begin')
+    def _begin_immediate(conn):
+        # sqlite3 no emite su propio BEGIN si ya hay una transacción abierta
+        if conn.get_execution_options().get(BEGIN_IMMEDIATE):
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
@@ -0,0 +1,96 @@
+"""
+Caché de identidad para el user_loader de Flask-Login.
+
+Guarda solo los campos mínimos del usuario (id, username, role, is_active)
+para no consultar la tabla user en cada request autenticado. Por defecto usa
+una caché LRU en memoria; si USER_CACHE_REDIS_URL está configurado se usa
+Redis para compartir la caché (y sus invalidaciones) entre procesos.
+"""
+import json
+
+from flask_login import UserMixin
+
+from project import db
+from project.cache import TTLCache
+from project.models import RoleMixin, User
+
+
+class CachedUser(RoleMixin, UserMixin):
+    """Usuario autenticado reconstruido desde la caché, sin objeto ORM."""
+
+    def __init__(self, id, username, role, is_active):
+        self.id = id
+        self.username = username
+        self.role = role
+        self._is_active = is_active
+
+    @property
+    def is_active(self):
+        return self._is_active
+
+    def to_cache(self):
+        return {'id': self.id, 'username': self.username, 'role': self.role, 'is_active': self._is_active}
+
+
+class RedisStore:
+    """Misma interfaz que TTLCache, respaldada por Redis (dependencia opcional)."""
+
+    def __init__(self, url, ttl, prefix='agendapro:user:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key, default=None):
+        raw = self.client.get(f'{self.prefix}{key}')
+        return json.loads(raw) if raw is not None else default
+
+    def set(self, key, value, ttl=None):
+        self.client.set(f'{self.prefix}{key}', json.dumps(value), ex=ttl or self.ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(f'{self.prefix}{key}' for key in keys))
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.prefix}*'):
+            self.client.delete(key)
+
+
+_store = TTLCache(ttl=60, maxsize=10000)
+
+
+def init_app(app):
+    """Configura la caché según USER_CACHE_TTL y USER_CACHE_REDIS_URL."""
+    global _store
+    ttl = app.config['USER_CACHE_TTL']
+    if app.config.get('USER_CACHE_REDIS_URL'):
+        _store = RedisStore(app.config['USER_CACHE_REDIS_URL'], ttl)
+    else:
+        _store = TTLCache(ttl=ttl, maxsize=app.config['USER_CACHE_SIZE'])
+
+
+def load_identity(user_id):
+    """
+    Retorna el CachedUser de `user_id`, o None si no existe o está desactivado
+    (así Flask-Login cierra la sesión de los usuarios desactivados).
+    """
+    data = _store.get(user_id)
+    if data is None:
+        row = db.session.query(
+            User.id, User.username, User.role, User.is_active
+        ).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        data = CachedUser(row.id, row.username, row.role, bool(row.is_active)).to_cache()
+        _store.set(user_id, data)
+
+    if not data['is_active']:
+        return None
+    return CachedUser(**data)
+
+
+def invalidate_identity(user_id):
+    """Llamar después de modificar el rol o el estado de un usuario."""
+    _store.delete(user_id)
@@ -0,0 +1,141 @@
+"""
+Tareas periódicas sobre las citas, ejecutadas por el scheduler
+(project.scheduler) en el proceso líder.
+
+  - send_reminders(): aviso "Recordatorio" al cliente de cada cita programada
+    que empieza dentro de los próximos REMINDER_LEAD_MINUTES (al profesional
+    si la cita no tiene cliente). Cada lote es una transacción con un SELECT,
+    un UPDATE que marca las citas (reminder_sent_at) y un INSERT múltiple de
+    notificaciones: ninguna fila pasa por el ORM.
+  - auto_complete(): marca como completadas, con un solo UPDATE, las citas
+    programadas que ya terminaron (AUTO_COMPLETE_APPOINTMENTS=1). No genera
+    notificaciones; los calendarios se enteran por la sincronización
+    incremental, como con cualquier otro cambio.
+
+queue_publish() y bump_appointments() solo llegan al proceso que ejecuta la
+tarea; los demás procesos web ven las notificaciones y los cambios de citas
+con su hilo de project.relay, a lo sumo RELAY_POLL_SECONDS después.
+
+Mover una cita limpia reminder_sent_at para que se avise con la nueva fecha.
+"""
+from datetime import timedelta
+
+from sqlalchemy import event, insert, inspect, select, update
+
+from project import db
+from project.changes import next_change_seq, remember_change_seq
+from project.metrics import timed
+from project.models import Appointment, Notification, get_peru_time
+from project.notifications import queue_publish, serialize_notification
+from project.versions import bump_appointments
+
+REMINDER_MESSAGE = 'Recordatorio: {patient_name} el {start:%d/%m/%Y %H:%M}'
+
+
+@timed('send_reminders')
+def send_reminders(lead_minutes=60, batch_size=1000):
+    """
+    Envía los recordatorios pendientes, en lotes de `batch_size` citas.
+
+    Returns:
+        Cantidad de citas avisadas
+    """
+    now = get_peru_time().replace(tzinfo=None)
+    horizon = now + timedelta(minutes=lead_minutes)
+    total = 0
+    while True:
+        rows = db.session.execute(
+            select(Appointment.id, Appointment.patient_name, Appointment.start_datetime,
+                   Appointment.professional_id, Appointment.client_id)
+            .where(Appointment.status == 'programada',
+                   Appointment.start_datetime > now,
+                   Appointment.start_datetime <= horizon,
+                   Appointment.reminder_sent_at.is_(None))
+            .order_by(Appointment.start_datetime, Appointment.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        ids = [row.id for row in rows]
+        marked = db.session.execute(
+            update(Appointment)
+            .where(Appointment.id.in_(ids), Appointment.reminder_sent_at.is_(None))
+            .values(reminder_sent_at=now),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        if marked != len(ids):
+            # Otro proceso avisó parte del lote (p. ej. un líder anterior)
+            db.session.rollback()
+            break
+
+        # Sin sort_by_parameter_order: en SQLite obligaría a un INSERT por
+        # fila, y el RETURNING ya trae el usuario de cada notificación
+        notifications = db.session.execute(
+            insert(Notification).returning(
+                Notification.id, Notification.user_id, Notification.message,
+                Notification.type, Notification.created_at
+            ),
+            [
+                {
+                    'user_id': row.client_id or row.professional_id,
+                    'message': REMINDER_MESSAGE.format(patient_name=row.patient_name,
+                                                       start=row.start_datetime)[:200],
+                    'type': 'info',
+                    'is_read': False,
+                    'created_at': now
+                }
+                for row in rows
+            ]
+        ).all()
+        queue_publish(db.session, [(n.user_id, serialize_notification(n)) for n in notifications])
+        db.session.commit()
+
+        total += len(ids)
+        if len(ids) < batch_size:
+            break
+    return total
+
+
+@timed('auto_complete')
+def auto_complete():
+    """
+    Completa las citas programadas cuya hora de fin ya pasó.
+
+    Returns:
+        Cantidad de citas completadas
+    """
+    now = get_peru_time().replace(tzinfo=None)
+    due = (Appointment.status == 'programada', Appointment.end_datetime <= now)
+    if db.session.execute(select(Appointment.id).where(*due).limit(1)).first() is None:
+        db.session.rollback()
+        return 0
+
+    # El UPDATE Core no pasa por el flush: número de cambio explícito, tomado
+    # justo antes de la única escritura para bloquear el contador lo mínimo.
+    # RETURNING trae los calendarios afectados sin otra consulta
+    change_seq = next_change_seq(db.session.connection())
+    affected = db.session.execute(
+        update(Appointment).where(*due)
+        .values(status='completada', change_seq=change_seq, updated_at=now)
+        .returning(Appointment.professional_id, Appointment.client_id),
+        execution_options={'synchronize_session': False}
+    ).all()
+    remember_change_seq(db.session, change_seq)
+    db.session.commit()
+
+    # Completar no libera horarios: el índice de conflictos y la
+    # disponibilidad no cambian, solo las versiones de los calendarios
+    clients = {}
+    for professional_id, client_id in affected:
+        clients.setdefault(professional_id, set()).add(client_id)
+    for professional_id, client_ids in clients.items():
+        bump_appointments(professional_id, *client_ids)
+    return len(affected)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _reset_moved_reminders(session, flush_context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, Appointment) and inspect(obj).attrs.start_datetime.history.has_changes():
+            obj.reminder_sent_at = None
@@ -0,0 +1,230 @@
+"""
+Instrumentación de rendimiento y endpoint /metrics (formato Prometheus).
+
+Registra por endpoint la latencia de cada request, cuántas sentencias SQL
+ejecutó y cuántas filas devolvieron o modificaron, además de la duración de
+cada sentencia por tipo y un log de consultas lentas. timed() mide funciones
+puntuales (carga de usuario, verificación de solapamiento).
+
+Todo vive en memoria del proceso: cada observación es un perf_counter y un
+incremento bajo lock, así que puede quedar activo en producción.
+
+/metrics requiere un admin logueado o el header
+`Authorization: Bearer <METRICS_TOKEN>` (para el scraper de Prometheus).
+"""
+import functools
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import Blueprint, Response, current_app, g, has_request_context, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Histograma acumulativo por combinación de labels."""
+
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # labels -> [conteo por bucket (+Inf al final), suma, total]
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            labels = _format_labels(self.labels, label_values)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{{{labels + "," if labels else ""}{le}}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = defaultdict(float)
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f'{self.name}{{{_format_labels(self.labels, label_values)}}} {value}')
+        return lines
+
+
+def _format_labels(names, values):
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+
+
+request_duration = Histogram(
+    'agendapro_http_request_duration_seconds', 'Latencia de los requests por endpoint.',
+    ('endpoint', 'method', 'status')
+)
+request_statements = Histogram(
+    'agendapro_http_request_sql_statements', 'Sentencias SQL ejecutadas por request.',
+    ('endpoint',), buckets=COUNT_BUCKETS
+)
+sql_duration = Histogram(
+    'agendapro_sql_statement_duration_seconds', 'Duración de las sentencias SQL por tipo.',
+    ('statement',)
+)
+sql_rows = Counter(
+    'agendapro_sql_rows_total',
+    'Filas devueltas/modificadas según cursor.rowcount (SQLite solo informa escrituras).',
+    ('endpoint',)
+)
+slow_queries = Counter(
+    'agendapro_sql_slow_queries_total', 'Sentencias más lentas que SLOW_QUERY_SECONDS.', ('endpoint',)
+)
+function_duration = Histogram(
+    'agendapro_function_duration_seconds', 'Duración de funciones instrumentadas con timed().',
+    ('function',)
+)
+
+METRICS = [request_duration, request_statements, sql_duration, sql_rows, slow_queries, function_duration]
+
+_config = {'enabled': True, 'slow_query_seconds': 0.2}
+
+
+def _endpoint():
+    if not has_request_context():
+        return 'background'
+    return request.endpoint or 'not_found'
+
+
+def timed(name):
+    """Decorador que registra la duración de la función en function_duration."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _config['enabled']:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                function_duration.observe(time.perf_counter() - start, name)
+        return wrapper
+    return decorator
+
+
+# ---------------------------------------------------------------------------
+# Hooks de SQLAlchemy (todas las engines)
+# ---------------------------------------------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _config['enabled']:
+        conn.info.setdefault('metrics_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not _config['enabled'] or not conn.info.get('metrics_start'):
+        return
+    elapsed = time.perf_counter() - conn.info['metrics_start'].pop()
+    kind = statement.lstrip().split(' ', 1)[0].upper()
+    if kind not in ('SELECT', 'INSERT', 'UPDATE', 'DELETE'):
+        kind = 'OTHER'
+    sql_duration.observe(elapsed, kind)
+
+    endpoint = _endpoint()
+    if has_request_context():
+        g._metrics_statements = g.get('_metrics_statements', 0) + 1
+    if cursor.rowcount is not None and cursor.rowcount >= 0:
+        sql_rows.inc(cursor.rowcount, endpoint)
+
+    if elapsed >= _config['slow_query_seconds']:
+        slow_queries.inc(1, endpoint)
+        try:
+            logger = current_app.logger
+        except RuntimeError:
+            return
+        logger.warning('Consulta lenta (%.3fs) en %s: %s', elapsed, endpoint, ' '.join(statement.split())[:500])
+
+
+# ---------------------------------------------------------------------------
+# Hooks de Flask
+# ---------------------------------------------------------------------------
+
+def _start_request():
+    g._metrics_start = time.perf_counter()
+    g._metrics_statements = 0
+
+
+def _finish_request(response):
+    start = g.get('_metrics_start')
+    if start is not None:
+        endpoint = _endpoint()
+        request_duration.observe(time.perf_counter() - start, endpoint, request.method, response.status_code)
+        request_statements.observe(g.get('_metrics_statements', 0), endpoint)
+    return response
+
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    token = current_app.config.get('METRICS_TOKEN')
+    header = request.headers.get('Authorization', '')
+    # Como bytes: con un str no ASCII compare_digest lanza TypeError
+    authorized = bool(token) and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
+    if not authorized and not (current_user.is_authenticated and current_user.is_admin()):
+        return Response('No autorizado\n', status=403, mimetype='text/plain')
+
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    _config['enabled'] = app.config['METRICS_ENABLED']
+    _config['slow_query_seconds'] = app.config['SLOW_QUERY_SECONDS']
+    if not _config['enabled']:
+        return
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.register_blueprint(metrics_bp)
@@ -0,0 +1,259 @@
+"""
+Migraciones versionadas del esquema.
+
+Cada migración tiene un número de versión y se registra en la tabla
+`schema_migrations` al aplicarse. `upgrade()` aplica en orden solo las
+pendientes, por lo que sirve tanto para una base nueva como para evolucionar
+una base SQLite/PostgreSQL existente.
+
+Las migraciones usan helpers idempotentes (crear índice si falta, agregar
+columna si falta): la versión 1 crea el esquema completo de los modelos, así
+que en una base nueva las siguientes no tienen nada que hacer.
+"""
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.schema import CreateIndex
+
+from project import db
+from project import models
+
+_meta = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations', _meta,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Registra una función como la migración número `version`."""
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+# ---------------------------------------------------------------------------
+# Helpers idempotentes
+# ---------------------------------------------------------------------------
+
+def model_index(model, name):
+    """Busca un índice declarado en __table_args__ de un modelo."""
+    for index in model.__table__.indexes:
+        if index.name == name:
+            return index
+    raise KeyError(f'El modelo {model.__name__} no declara el índice {name}')
+
+
+def create_index_if_missing(conn, index):
+    # IF NOT EXISTS en vez de checkfirst: la reflexión de SQLite no ve los índices de expresión
+    conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def create_table_if_missing(conn, model):
+    model.__table__.create(bind=conn, checkfirst=True)
+
+
+def drop_index_if_exists(conn, name):
+    conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+
+
+def add_column_if_missing(conn, table_name, column_name, column_ddl):
+    """
+    Agrega una columna si la tabla aún no la tiene.
+
+    Args:
+        column_ddl: Definición SQL de la columna, p. ej. 'DATETIME NULL'
+    """
+    columns = {c['name'] for c in inspect(conn).get_columns(table_name)}
+    if column_name not in columns:
+        conn.execute(text(f'ALTER TABLE "{table_name}" ADD COLUMN {column_name} {column_ddl}'))
+
+
+# ---------------------------------------------------------------------------
+# Migraciones
+# ---------------------------------------------------------------------------
+
+@migration(1, 'Esquema base')
+def _base_schema(conn):
+    db.metadata.create_all(bind=conn)
+
+
+@migration(2, 'Índices compuestos para citas y notificaciones')
+def _hot_query_indexes(conn):
+    # Reemplazados por los índices que incluyen el estado
+    for name in ('ix_appointment_professional_start_end',
+                 'ix_appointment_client_start_end',
+                 'ix_appointment_start_end'):
+        drop_index_if_exists(conn, name)
+
+    for name in ('ix_appointment_professional_status_end',
+                 'ix_appointment_client_status_end',
+                 'ix_appointment_status_end',
+                 'ix_appointment_status_cancelled'):
+        create_index_if_missing(conn, model_index(models.Appointment, name))
+
+    create_index_if_missing(conn, model_index(models.Notification, 'ix_notification_user_read_created'))
+
+
+@migration(3, 'Outbox de notificaciones')
+def _notification_outbox(conn):
+    create_table_if_missing(conn, models.OutboxEvent)
+
+
+@migration(4, 'Secuencia de cambios de citas y tombstones')
+def _appointment_changes(conn):
+    add_column_if_missing(conn, 'appointment', 'change_seq', 'INTEGER NOT NULL DEFAULT 0')
+    add_column_if_missing(conn, 'appointment', 'updated_at', 'TIMESTAMP NULL')
+    for name in ('ix_appointment_professional_seq',
+                 'ix_appointment_client_seq',
+                 'ix_appointment_seq'):
+        create_index_if_missing(conn, model_index(models.Appointment, name))
+
+    create_table_if_missing(conn, models.AppointmentTombstone)
+    create_table_if_missing(conn, models.ChangeCounter)
+    counter = models.ChangeCounter.__table__
+    exists = conn.execute(select(counter.c.name).where(counter.c.name == 'appointments')).first()
+    if exists is None:
+        conn.execute(counter.insert().values(name='appointments', value=0))
+
+
+@migration(5, 'Restricción de exclusión contra citas solapadas (PostgreSQL)')
+def _appointment_no_overlap(conn):
+    # En SQLite la atomicidad la da BEGIN IMMEDIATE (project.booking)
+    if conn.dialect.name != 'postgresql':
+        return
+    from project.booking import OVERLAP_CONSTRAINT
+
+    conn.execute(text('CREATE EXTENSION IF NOT EXISTS btree_gist'))
+    exists = conn.execute(
+        text('SELECT 1 FROM pg_constraint WHERE conname = :name'), {'name': OVERLAP_CONSTRAINT}
+    ).first()
+    if exists is None:
+        # Falla si la base ya tiene citas activas solapadas: hay que resolverlas antes
+        conn.execute(text(
+            f'ALTER TABLE appointment ADD CONSTRAINT {OVERLAP_CONSTRAINT} EXCLUDE USING gist ('
+            "professional_id WITH =, tsrange(start_datetime, end_datetime, '[)') WITH &&"
+            ") WHERE (status IN ('programada', 'completada'))"
+        ))
+
+
+@migration(6, 'Índices de búsqueda de usuarios')
+def _user_search_indexes(conn):
+    for name in ('ix_user_username_lower', 'ix_user_email_lower'):
+        create_index_if_missing(conn, model_index(models.User, name))
+
+    # En PostgreSQL, trigramas para LIKE por prefijo y por subcadena (project.user_search)
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        for column in ('username', 'email'):
+            conn.execute(text(
+                f'CREATE INDEX IF NOT EXISTS ix_user_{column}_trgm '
+                f'ON "user" USING gin (lower({column}) gin_trgm_ops)'
+            ))
+
+
+@migration(7, 'Búsqueda de texto completo en citas')
+def _appointment_search(conn):
+    from project.search import FTS_TABLE, SEARCH_VECTOR
+
+    if conn.dialect.name == 'postgresql':
+        add_column_if_missing(
+            conn, 'appointment', SEARCH_VECTOR,
+            "tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', coalesce(patient_name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(notes, '')), 'B')) STORED"
+        )
+        conn.execute(text(
+            f'CREATE INDEX IF NOT EXISTS ix_appointment_{SEARCH_VECTOR} '
+            f'ON appointment USING gin ({SEARCH_VECTOR})'
+        ))
+        return
+    if conn.dialect.name != 'sqlite':
+        return
+
+    try:
+        conn.execute(text(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            "patient_name, notes, content='appointment', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        ))
+    except OperationalError as e:
+        # SQLite sin FTS5: la búsqueda usa LIKE (ver project.search)
+        print(f'⚠️ Búsqueda sin índice de texto completo: {e}')
+        return
+
+    # Triggers del contenido externo: el índice sigue a la tabla appointment
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON appointment BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, patient_name, notes) VALUES (new.id, new.patient_name, new.notes);
+        END
+    """))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON appointment BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, patient_name, notes)
+            VALUES ('delete', old.id, old.patient_name, old.notes);
+        END
+    """))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF patient_name, notes ON appointment BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, patient_name, notes)
+            VALUES ('delete', old.id, old.patient_name, old.notes);
+            INSERT INTO {FTS_TABLE}(rowid, patient_name, notes) VALUES (new.id, new.patient_name, new.notes);
+        END
+    """))
+    # Indexar las citas existentes
+    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+@migration(8, 'Recordatorios de citas y lease del scheduler')
+def _appointment_reminders(conn):
+    add_column_if_missing(conn, 'appointment', 'reminder_sent_at', 'TIMESTAMP NULL')
+    create_index_if_missing(conn, model_index(models.Appointment, 'ix_appointment_status_start'))
+    create_table_if_missing(conn, models.SchedulerLease)
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def applied_versions(engine):
+    with engine.begin() as conn:
+        _meta.create_all(bind=conn)
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def pending_migrations(engine):
+    applied = applied_versions(engine)
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+
+def upgrade(engine, verbose=True):
+    """
+    Aplica las migraciones pendientes, cada una en su propia transacción.
+
+    Returns:
+        Lista de versiones aplicadas
+    """
+    done = []
+    for version, description, fn in pending_migrations(engine):
+        try:
+            with engine.begin() as conn:
+                fn(conn)
+                conn.execute(schema_migrations.insert().values(
+                    version=version,
+                    description=description,
+                    applied_at=models.get_peru_time().replace(tzinfo=None)
+                ))
+        except IntegrityError:
+            # Otro worker aplicó la misma versión al mismo tiempo
+            continue
+        done.append(version)
+        if verbose:
+            print(f"✅ Migración {version} aplicada: {description}")
+    return done
@@ -1,16 +1,47 @@
-from project import db, bcrypt
+from project import db, security
 from flask_login import UserMixin
 from datetime import datetime, timezone, timedelta
 
 # ✅ CONFIGURACIÓN: Zona horaria de Perú (UTC-5)
 PERU_TZ = timezone(timedelta(hours=-5))
 
+# Estados que ocupan la agenda del profesional (todos menos 'cancelada').
+# Se filtra con IN en lugar de != para que los índices por estado sirvan.
+ACTIVE_STATUSES = ('programada', 'completada')
+
 def get_peru_time():
     """Obtiene la hora actual en zona horaria de Perú (UTC-5)"""
     return datetime.now(PERU_TZ)
 
 
-class User(UserMixin, db.Model):
+PERU_UTC_OFFSET = '-05:00'
+
+
+def to_peru_iso(dt):
+    """
+    ISO 8601 con la zona de Perú. Los datetime naive de la base están en
+    hora de Perú: agregar el sufijo equivale a .replace(tzinfo=PERU_TZ)
+    pero sin crear un datetime nuevo.
+    """
+    if dt is None:
+        return None
+    return dt.isoformat() + PERU_UTC_OFFSET if dt.tzinfo is None else dt.isoformat()
+
+
+class RoleMixin:
+    """Permisos por rol; compartido por User y la identidad cacheada (project.identity)."""
+    
+    def is_admin(self):
+        return self.role == 'admin'
+    
+    def is_professional(self):
+        return self.role in ['admin', 'profesional']
+    
+    def is_client(self):
+        return self.role == 'cliente'
+
+
+class User(RoleMixin, UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=True)
@@ -31,24 +62,40 @@ class User(UserMixin, db.Model):
                                             lazy=True)
     
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = security.hash_password(password)
     
     def check_password(self, password):
         if not self.password_hash:
             return False
-        return bcrypt.check_password_hash(self.password_hash, password)
-    
-    def is_admin(self):
-        return self.role == 'admin'
-    
-    def is_professional(self):
-        return self.role in ['admin', 'profesional']
+        return security.verify_password(self.password_hash, password)
     
-    def is_client(self):
-        return self.role == 'cliente'
+    def password_needs_rehash(self):
+        return bool(self.password_hash) and security.needs_rehash(self.password_hash)
+
+
+# ✅ Búsqueda por prefijo de usuario/email sin distinguir mayúsculas (project.user_search)
+db.Index('ix_user_username_lower', db.func.lower(User.username))
+db.Index('ix_user_email_lower', db.func.lower(User.email))
 
 
 class Appointment(db.Model):
+    # ✅ Índices compuestos para las consultas más frecuentes
+    # (calendario por rango, solapamiento, estadísticas e historial).
+    # end_datetime va antes que start_datetime: el filtro "end > inicio de la
+    # ventana" recorre solo las citas recientes/futuras, no todo el historial.
+    __table_args__ = (
+        db.Index('ix_appointment_professional_status_end', 'professional_id', 'status', 'end_datetime', 'start_datetime'),
+        db.Index('ix_appointment_client_status_end', 'client_id', 'status', 'end_datetime', 'start_datetime'),
+        db.Index('ix_appointment_status_end', 'status', 'end_datetime', 'start_datetime'),
+        db.Index('ix_appointment_status_cancelled', 'status', 'cancelled_at'),
+        # Sincronización incremental (GET /api/appointments/changes)
+        db.Index('ix_appointment_professional_seq', 'professional_id', 'change_seq'),
+        db.Index('ix_appointment_client_seq', 'client_id', 'change_seq'),
+        db.Index('ix_appointment_seq', 'change_seq'),
+        # Recordatorios (project.jobs): citas programadas que empiezan pronto
+        db.Index('ix_appointment_status_start', 'status', 'start_datetime'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     patient_name = db.Column(db.String(100), nullable=False)
     start_datetime = db.Column(db.DateTime, nullable=False)
@@ -68,6 +115,13 @@ class Appointment(db.Model):
     professional_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     client_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     
+    # ✅ NUEVO: Número de cambio (project.changes) y fecha de la última modificación
+    change_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=True)
+    
+    # ✅ NUEVO: Cuándo se envió el recordatorio (project.jobs); se limpia al mover la cita
+    reminder_sent_at = db.Column(db.DateTime, nullable=True)
+    
     def to_dict(self, include_timezone_offset=False):
         """
         Convierte el appointment a diccionario para JSON.
@@ -75,15 +129,12 @@ class Appointment(db.Model):
         Args:
             include_timezone_offset: Si True, incluye la zona horaria en el ISO string
         """
-        # ✅ FIX: Convertir datetime naive a aware con timezone de Perú
-        start_aware = self.start_datetime.replace(tzinfo=PERU_TZ) if self.start_datetime.tzinfo is None else self.start_datetime
-        end_aware = self.end_datetime.replace(tzinfo=PERU_TZ) if self.end_datetime.tzinfo is None else self.end_datetime
-        
+        # ✅ FIX: Fechas con la timezone de Perú (mismo formato que project.serializers)
         return {
             'id': self.id,
             'patient_name': self.patient_name,
-            'start_datetime': start_aware.isoformat(),
-            'end_datetime': end_aware.isoformat(),
+            'start_datetime': to_peru_iso(self.start_datetime),
+            'end_datetime': to_peru_iso(self.end_datetime),
             'status': self.status,
             'notes': self.notes,
             'professional_id': self.professional_id,
@@ -141,21 +192,18 @@ class Appointment(db.Model):
         """
         Verifica si esta cita se solapa con un rango de fechas dado.
         ✅ MEJORADO: Solo verifica citas NO canceladas
+        ✅ Delegado al índice en memoria de project.conflicts
         """
-        query = Appointment.query.filter(
-            Appointment.professional_id == self.professional_id,
-            Appointment.status != 'cancelada',  # ✅ Ignorar canceladas
-            Appointment.start_datetime < end,
-            Appointment.end_datetime > start
-        )
-        
-        if exclude_id:
-            query = query.filter(Appointment.id != exclude_id)
+        from project.conflicts import conflict_engine
         
-        return query.first() is not None
+        return conflict_engine.overlaps(self.professional_id, start, end, exclude_id=exclude_id)
 
 
 class Notification(db.Model):
+    __table_args__ = (
+        db.Index('ix_notification_user_read_created', 'user_id', 'is_read', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     message = db.Column(db.String(200), nullable=False)
@@ -164,3 +212,53 @@ class Notification(db.Model):
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(PERU_TZ))
     
     user = db.relationship('User', backref=db.backref('notifications', lazy=True))
+
+
+class OutboxEvent(db.Model):
+    """
+    Evento pendiente de notificar (outbox transaccional).
+
+    Las rutas lo escriben en la misma transacción que el cambio de la cita;
+    project.outbox lo convierte en Notification en segundo plano.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    appointment_id = db.Column(db.Integer, nullable=True)
+    kind = db.Column(db.String(20), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(PERU_TZ))
+
+
+class AppointmentTombstone(db.Model):
+    """
+    Rastro de una cita borrada, o que dejó de pertenecer a un cliente, para
+    que la sincronización incremental pueda avisar que debe quitarse.
+    """
+    __table_args__ = (
+        db.Index('ix_tombstone_professional_seq', 'professional_id', 'change_seq'),
+        db.Index('ix_tombstone_client_seq', 'client_id', 'change_seq'),
+        db.Index('ix_tombstone_seq', 'change_seq'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    appointment_id = db.Column(db.Integer, nullable=False)
+    professional_id = db.Column(db.Integer, nullable=True)
+    client_id = db.Column(db.Integer, nullable=True)
+    change_seq = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(PERU_TZ))
+
+
+class ChangeCounter(db.Model):
+    """Contadores monotónicos persistentes (una fila por nombre)."""
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SchedulerLease(db.Model):
+    """
+    Lease del líder del scheduler (project.scheduler): entre todos los
+    procesos, solo el dueño de una lease vigente ejecuta las tareas.
+    """
+    name = db.Column(db.String(50), primary_key=True)
+    owner = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,312 @@
+"""
+Bus de notificaciones en memoria para el stream SSE (/api/notifications/stream)
+y notificaciones efímeras.
+
+Toda Notification que se inserta se publica automáticamente al usuario
+destinatario cuando la transacción hace commit (ver los eventos de sesión al
+final del módulo), así que las rutas no necesitan llamar al bus.
+
+El bus vive en el proceso. Las notificaciones que insertan otros procesos
+(`flask outbox-worker`, el scheduler) llegan al bus con NotificationTail, que
+project.relay consulta cada RELAY_POLL_SECONDS. Los clientes que no usan el
+stream mantienen el polling con ETag, que responde 304 sin consultar la base.
+
+Cada stream ocupa un hilo del worker mientras está abierto, así que se
+admiten a la vez como máximo NOTIFICATIONS_STREAM_MAX_CONNECTIONS por proceso
+(ver stream_slots); pasado ese cupo el navegador usa el polling y los hilos
+restantes siguen atendiendo el resto de los requests.
+
+Los avisos sin valor histórico (p. ej. la bienvenida al iniciar sesión) son
+efímeros: viven en la sesión del navegador y nunca se escriben en la tabla
+notification (ver push_ephemeral).
+"""
+import json
+import queue
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+from flask import session
+from sqlalchemy import event, func, select
+
+from project import db
+from project.models import PERU_TZ
+
+
+class NotificationBus:
+    """Pub/sub por usuario, seguro entre hilos."""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._versions = defaultdict(int)
+        # Cambia en cada arranque para que un ETag viejo nunca coincida
+        self._epoch = uuid.uuid4().hex[:8]
+
+    def subscribe(self, user_id):
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[user_id].add(q)
+        return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(q)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, event_name, data):
+        with self._lock:
+            self._versions[user_id] += 1
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for q in subscribers:
+            try:
+                q.put_nowait((event_name, data))
+            except queue.Full:
+                # Cliente lento: se pierde el evento, pero el siguiente
+                # loadNotifications() del navegador se resincroniza
+                pass
+
+    def renew_epoch(self):
+        """Invalida todos los ETag emitidos hasta ahora."""
+        with self._lock:
+            self._epoch = uuid.uuid4().hex[:8]
+
+    def version(self, user_id):
+        """Versión de las notificaciones de un usuario, usada como ETag."""
+        with self._lock:
+            return f'{self._epoch}-{self._versions[user_id]}'
+
+
+bus = NotificationBus()
+
+
+class StreamSlots:
+    """Cupo de streams SSE abiertos a la vez en el proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._open = 0
+
+    def acquire(self, limit):
+        """Reserva un lugar; False si ya hay `limit` streams abiertos."""
+        with self._lock:
+            if self._open >= limit:
+                return False
+            self._open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._open -= 1
+
+    @property
+    def open(self):
+        return self._open
+
+
+stream_slots = StreamSlots()
+
+
+class NotificationTail:
+    """
+    Sigue la tabla notification por id y publica en el bus las filas que
+    insertaron otros procesos; las publicadas por este proceso al hacer
+    commit se registran con note_published y se saltean.
+
+    En PostgreSQL los ids salen de una secuencia y no se confirman en orden:
+    un id menor puede aparecer después que uno mayor. Los huecos se vuelven a
+    consultar durante GAP_SECONDS antes de darlos por descartados (rollback).
+    """
+
+    GAP_SECONDS = 10
+    MAX_ROWS = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Todos los ids <= floor ya se publicaron o se descartaron
+        self._floor = None
+        # Ids > floor ya publicados
+        self._seen = set()
+        # Id faltante -> momento (monotonic) en que se detectó el hueco
+        self._gaps = {}
+
+    def note_published(self, ids):
+        with self._lock:
+            if self._floor is not None:
+                self._seen.update(id for id in ids if id > self._floor)
+
+    def poll(self, connection, now):
+        """
+        Publica las notificaciones nuevas de otros procesos.
+
+        Args:
+            now: time.monotonic() actual, para vencer los huecos
+
+        Returns:
+            Cantidad de notificaciones publicadas
+        """
+        from project.models import Notification
+
+        if self._floor is None:
+            floor = connection.execute(select(func.max(Notification.id))).scalar() or 0
+            with self._lock:
+                self._floor = floor
+            # Lo confirmado antes de empezar a seguir la tabla no se publicará:
+            # los ETag ya emitidos dejan de valer
+            bus.renew_epoch()
+            return 0
+
+        rows = connection.execute(
+            select(Notification.id, Notification.user_id, Notification.message,
+                   Notification.type, Notification.created_at)
+            .where(Notification.id > self._floor)
+            .order_by(Notification.id)
+            .limit(self.MAX_ROWS)
+        ).all()
+
+        with self._lock:
+            new = [row for row in rows if row.id not in self._seen]
+            self._seen.update(row.id for row in new)
+            present = {row.id for row in rows} | self._seen
+            top = rows[-1].id if rows else self._floor
+            floor = self._floor
+            for id in range(floor + 1, top + 1):
+                if id not in present:
+                    self._gaps.setdefault(id, now)
+            # Avanzar hasta el primer hueco que todavía puede confirmarse
+            while floor < top:
+                next_id = floor + 1
+                if next_id not in present and now - self._gaps[next_id] < self.GAP_SECONDS:
+                    break
+                self._gaps.pop(next_id, None)
+                floor = next_id
+            self._floor = floor
+            self._seen = {id for id in self._seen if id > floor}
+
+        for row in new:
+            bus.publish(row.user_id, 'notification', serialize_notification(row))
+        return len(new)
+
+
+notification_tail = NotificationTail()
+
+
+def serialize_notification(notification):
+    return {
+        'id': notification.id,
+        'message': notification.message,
+        'type': notification.type,
+        'created_at': notification.created_at.strftime('%Y-%m-%d %H:%M')
+    }
+
+
+# ---------------------------------------------------------------------------
+# Notificaciones efímeras (en la sesión, sin fila en la base)
+# ---------------------------------------------------------------------------
+
+_EPHEMERAL_SESSION_KEY = 'ephemeral_notifications'
+EPHEMERAL_MAX_ITEMS = 5
+
+
+def push_ephemeral(user_id, message, type='info'):
+    """
+    Agrega una notificación efímera a la sesión actual y la publica en el bus.
+
+    Los ids empiezan con "e" para distinguirlos de los de la base.
+    """
+    data = {
+        'id': 'e' + uuid.uuid4().hex[:12],
+        'message': message,
+        'type': type,
+        'created_at': datetime.now(PERU_TZ).strftime('%Y-%m-%d %H:%M')
+    }
+    items = session.get(_EPHEMERAL_SESSION_KEY, [])
+    session[_EPHEMERAL_SESSION_KEY] = [data] + items[:EPHEMERAL_MAX_ITEMS - 1]
+    bus.publish(user_id, 'notification', data)
+    return data
+
+
+def ephemeral_notifications():
+    return list(session.get(_EPHEMERAL_SESSION_KEY, []))
+
+
+def dismiss_ephemeral(key):
+    """Quita una notificación efímera de la sesión; False si no existía."""
+    items = session.get(_EPHEMERAL_SESSION_KEY, [])
+    remaining = [item for item in items if item['id'] != key]
+    if len(remaining) == len(items):
+        return False
+    session[_EPHEMERAL_SESSION_KEY] = remaining
+    return True
+
+
+def format_sse(event_name, data):
+    return f'event: {event_name}\ndata: {json.dumps(data)}\n\n'
+
+
+def stream_events(user_id, heartbeat=15, max_seconds=300):
+    """
+    Generador SSE para un usuario. Envía un comentario cada `heartbeat`
+    segundos para detectar conexiones caídas y termina a los `max_seconds`
+    para que el navegador reconecte (y vuelva a pasar por login_required).
+    """
+    q = bus.subscribe(user_id)
+    try:
+        yield 'retry: 3000\n\n'
+        remaining = max_seconds
+        while remaining > 0:
+            try:
+                event_name, data = q.get(timeout=min(heartbeat, remaining))
+            except queue.Empty:
+                remaining -= heartbeat
+                yield ': ping\n\n'
+                continue
+            yield format_sse(event_name, data)
+    finally:
+        bus.unsubscribe(user_id, q)
+
+
+# ---------------------------------------------------------------------------
+# Publicación automática al hacer commit
+# ---------------------------------------------------------------------------
+
+_PENDING_KEY = 'pending_notifications'
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_new_notifications(session, flush_context):
+    from project.models import Notification
+
+    pending = session.info.setdefault(_PENDING_KEY, [])
+    for obj in session.new:
+        if isinstance(obj, Notification):
+            pending.append((obj.user_id, serialize_notification(obj)))
+
+
+def queue_publish(session, notifications):
+    """
+    Publica notificaciones insertadas sin pasar por el flush del ORM
+    (p. ej. inserts masivos) cuando la sesión haga commit.
+
+    Args:
+        notifications: Lista de (user_id, dict serializado)
+    """
+    session.info.setdefault(_PENDING_KEY, []).extend(notifications)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_pending_notifications(session):
+    pending = session.info.pop(_PENDING_KEY, [])
+    for user_id, data in pending:
+        bus.publish(user_id, 'notification', data)
+    notification_tail.note_published(data['id'] for _, data in pending)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_pending_notifications(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,200 @@
+"""
+Outbox transaccional de notificaciones.
+
+Las rutas que modifican citas no crean Notification: llaman a enqueue(), que
+agrega un OutboxEvent compacto en la misma transacción del cambio. Un worker
+en segundo plano lee los eventos en lotes, fusiona los que afectan a la
+misma cita y usuario (p. ej. varias ediciones seguidas producen un solo
+aviso), inserta las notificaciones y borra los eventos en una transacción.
+
+El worker corre como hilo del proceso web (se despierta al hacer commit de
+eventos nuevos y revisa cada OUTBOX_POLL_SECONDS por si quedaron pendientes)
+o como proceso aparte con `flask outbox-worker` y OUTBOX_WORKER_THREAD=0. En
+ese caso las notificaciones llegan al bus de los procesos web por
+project.relay, con hasta RELAY_POLL_SECONDS de demora.
+"""
+import threading
+import time
+
+from sqlalchemy import delete, event
+
+from project import db
+from project.models import Notification, OutboxEvent
+
+# Si una cita acumula varios eventos para el mismo usuario, se notifica el de
+# mayor prioridad con los datos más recientes
+KIND_PRIORITY = {
+    'updated': 0,
+    'assigned': 1,
+    'created': 2,
+    'bulk_created': 2,
+    'completed': 3,
+    'cancelled': 4,
+    'deleted': 5,
+}
+
+MESSAGES = {
+    'created': ('Nueva cita: {patient_name} el {start}', 'info'),
+    'bulk_created': ('{count} nuevas citas desde el {start}', 'info'),
+    'assigned': ('Cita asignada: {patient_name} el {start}', 'info'),
+    'updated': ('Cita actualizada: {patient_name} el {start}', 'warning'),
+    'completed': ('Cita completada: {patient_name}', 'success'),
+    'cancelled': ('Cita cancelada: {patient_name}. Motivo: {reason}', 'danger'),
+    'deleted': ('Cita eliminada: {patient_name}', 'danger'),
+}
+
+
+def enqueue(user_id, kind, appointment=None, appointment_id=None, **payload):
+    """
+    Registra en la sesión actual un evento a notificar a `user_id`.
+
+    Con `appointment` se toman su id, paciente y fecha de inicio; el resto de
+    datos del mensaje van en `payload`.
+    """
+    if not user_id:
+        return
+    if appointment is not None:
+        appointment_id = appointment.id
+        payload.setdefault('patient_name', appointment.patient_name)
+        payload.setdefault('start', appointment.start_datetime.strftime('%d/%m/%Y %H:%M'))
+    db.session.add(OutboxEvent(
+        user_id=user_id,
+        appointment_id=appointment_id,
+        kind=kind,
+        payload=payload
+    ))
+
+
+def coalesce(events):
+    """
+    Fusiona eventos ordenados por id.
+
+    Returns:
+        Lista de (user_id, kind, payload, created_at), uno por usuario y cita
+    """
+    merged = {}
+    for e in events:
+        key = (e.user_id, e.appointment_id) if e.appointment_id else (e.user_id, None, e.id)
+        current = merged.get(key)
+        if current is None:
+            merged[key] = [e.user_id, e.kind, dict(e.payload), e.created_at]
+            continue
+        current[2].update(e.payload)
+        current[3] = e.created_at
+        if KIND_PRIORITY[e.kind] >= KIND_PRIORITY[current[1]]:
+            current[1] = e.kind
+    return [tuple(item) for item in merged.values()]
+
+
+def render(kind, payload):
+    template, type = MESSAGES[kind]
+    return template.format(**payload)[:200], type
+
+
+def drain(batch_size=500):
+    """
+    Procesa un lote de eventos.
+
+    Returns:
+        Cantidad de eventos procesados (0 si no había o si otro worker los tomó)
+    """
+    events = OutboxEvent.query.order_by(OutboxEvent.id).limit(batch_size).all()
+    if not events:
+        return 0
+
+    ids = [e.id for e in events]
+    deleted = db.session.execute(
+        delete(OutboxEvent).where(OutboxEvent.id.in_(ids)),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    if deleted != len(ids):
+        # Otro worker procesó parte del lote
+        db.session.rollback()
+        return 0
+
+    notifications = []
+    for user_id, kind, payload, created_at in coalesce(events):
+        message, type = render(kind, payload)
+        notifications.append(Notification(user_id=user_id, message=message, type=type, created_at=created_at))
+    db.session.add_all(notifications)
+    db.session.commit()
+    return len(ids)
+
+
+class OutboxWorker:
+    """Hilo que drena el outbox; se inicia con el primer evento o request."""
+
+    def __init__(self):
+        self.app = None
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        app.before_request(self.ensure_started)
+
+    def ensure_started(self):
+        if self._thread is not None or self.app is None or not self.app.config['OUTBOX_WORKER_THREAD']:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name='outbox-worker', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+        self.ensure_started()
+
+    def drain_all(self):
+        batch_size = self.app.config['OUTBOX_BATCH_SIZE']
+        total = 0
+        with self.app.app_context():
+            try:
+                while True:
+                    processed = drain(batch_size)
+                    total += processed
+                    if processed < batch_size:
+                        break
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception('Error procesando el outbox de notificaciones')
+        return total
+
+    def run(self, once=False):
+        config = self.app.config
+        while True:
+            self.drain_all()
+            if once:
+                return
+            if self._wake.wait(config['OUTBOX_POLL_SECONDS']):
+                # Esperar un poco para fusionar ráfagas de ediciones
+                time.sleep(config['OUTBOX_COALESCE_SECONDS'])
+            self._wake.clear()
+
+
+worker = OutboxWorker()
+
+
+# ---------------------------------------------------------------------------
+# Despertar al worker al hacer commit de eventos nuevos
+# ---------------------------------------------------------------------------
+
+_PENDING_KEY = 'pending_outbox_events'
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_outbox_events(session, flush_context):
+    if any(isinstance(obj, OutboxEvent) for obj in session.new):
+        session.info[_PENDING_KEY] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _wake_outbox_worker(session):
+    if session.info.pop(_PENDING_KEY, False):
+        worker.wake()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_outbox_events(session):
+    session.info.pop(_PENDING_KEY, None)
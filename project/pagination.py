@@ -0,0 +1,170 @@
+"""
+Paginación por cursor (keyset) y respuestas JSON en streaming.
+
+Los listados responden siempre un array JSON. Con `limit` se pagina: el
+cursor de la página siguiente va en el header X-Next-Cursor (ausente en la
+última página) y se pasa de vuelta como `cursor`. Con `stream=1` las filas
+se leen con yield_per y se envían a medida que se serializan, así que la
+memoria por request no depende del tamaño del historial.
+"""
+import base64
+import json
+from datetime import datetime
+from itertools import islice
+
+from flask import Response, stream_with_context
+from sqlalchemy import and_, or_
+
+from project.serializers import dumps, json_response
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def encode_cursor(values):
+    payload = [{'dt': v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return [datetime.fromisoformat(v['dt']) if isinstance(v, dict) else v for v in payload]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('Cursor inválido')
+
+
+def parse_page_args(args, max_limit):
+    """
+    Lee limit/cursor/stream de los query params.
+
+    Returns:
+        (limit o None, valores del cursor o None, stream)
+    """
+    limit = args.get('limit', type=int)
+    if limit is not None and not 1 <= limit <= max_limit:
+        raise ValueError(f'limit debe estar entre 1 y {max_limit}')
+    cursor = decode_cursor(args['cursor']) if args.get('cursor') else None
+    stream = args.get('stream') in ('1', 'true')
+    return limit, cursor, stream
+
+
+def keyset_condition(order, values):
+    """
+    Condición "después de `values`" para un orden lexicográfico.
+
+    Args:
+        order: Lista de (columna, 'asc' | 'desc'); la última debe ser única
+        values: Valores de esas columnas en la última fila entregada
+    """
+    clauses = []
+    for i, (column, direction) in enumerate(order):
+        equal_prefix = [col == val for (col, _), val in zip(order[:i], values[:i])]
+        after = column > values[i] if direction == 'asc' else column < values[i]
+        clauses.append(and_(*equal_prefix, after))
+    return or_(*clauses)
+
+
+def order_clauses(order):
+    return [column.asc() if direction == 'asc' else column.desc() for column, direction in order]
+
+
+def serialize_rows(rows, serialize, prepare=None):
+    """Serializa una lista de filas, llamando antes a `prepare` con todas."""
+    if prepare is not None and rows:
+        prepare(rows)
+    return [serialize(row) for row in rows]
+
+
+def stream_json_array(query, serialize, yield_per=500, prepare=None):
+    """
+    Genera un array JSON fila por fila usando un cursor del servidor;
+    `prepare` recibe cada tanda de `yield_per` filas.
+    """
+    yield b'['
+    first = True
+    rows = iter(query.yield_per(yield_per))
+    while True:
+        partition = list(islice(rows, yield_per))
+        if not partition:
+            break
+        for item in serialize_rows(partition, serialize, prepare):
+            yield (b'' if first else b',') + dumps(item)
+            first = False
+    yield b']'
+
+
+def default_sort_key(order):
+    """Valores de `order` en una fila: atributos homónimos de las columnas."""
+    def sort_key(row):
+        return [getattr(row, column.key) for column, _ in order]
+    return sort_key
+
+
+def paginated_response(query, order, serialize, args, max_limit, sort_key=None, prepare=None):
+    """
+    Respuesta de un listado: completa, paginada (limit/cursor) o en streaming.
+
+    Args:
+        query: Query ya filtrada, sin order_by
+        order: Lista de (columna, dirección) que define el orden y el cursor
+        serialize: Función fila -> dict
+        sort_key: Función fila -> valores de `order` (por defecto, atributos
+                  homónimos de la fila)
+        prepare: Función lista de filas -> None, llamada antes de
+                 serializar la página (o cada tanda del streaming), p. ej.
+                 para cargar con una consulta datos de solo esas filas
+
+    Raises:
+        ValueError: Si los parámetros de paginación son inválidos
+    """
+    limit, cursor, stream = parse_page_args(args, max_limit)
+
+    if sort_key is None:
+        sort_key = default_sort_key(order)
+
+    if cursor is not None:
+        if len(cursor) != len(order):
+            raise ValueError('Cursor inválido')
+        query = query.filter(keyset_condition(order, cursor))
+    query = query.order_by(*order_clauses(order))
+
+    if stream:
+        if limit is not None:
+            query = query.limit(limit)
+        return Response(
+            stream_with_context(stream_json_array(query, serialize, prepare=prepare)),
+            mimetype='application/json'
+        )
+
+    if limit is None:
+        return json_response(serialize_rows(query.all(), serialize, prepare))
+
+    rows, next_cursor = fetch_page(query, limit, sort_key)
+    response = json_response(serialize_rows(rows, serialize, prepare))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
+
+
+def fetch_page(query, limit, sort_key):
+    """
+    Una página de una query ya ordenada (y filtrada por el cursor).
+
+    Returns:
+        (filas, cursor de la página siguiente o None)
+    """
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(sort_key(rows[limit - 1]))
+    return rows, None
+
+
+def first_page(query, order, limit, sort_key=None):
+    """
+    Primera página de un listado fuera de paginated_response (p. ej. dentro
+    de otra respuesta). El cursor devuelto sirve para pedir la siguiente al
+    endpoint del listado, que usa el mismo `order`.
+    """
+    query = query.order_by(*order_clauses(order))
+    return fetch_page(query, limit, sort_key or default_sort_key(order))
@@ -0,0 +1,86 @@
+from sqlalchemy.orm import aliased, joinedload
+from project import db
+from project.models import Appointment, User
+
+
+def appointments_with_names():
+    """
+    Query base de citas que trae los nombres del profesional y del cliente
+    en el mismo SELECT (JOIN), evitando una consulta extra por cada fila.
+    """
+    return Appointment.query.options(
+        joinedload(Appointment.professional).load_only(User.id, User.username),
+        joinedload(Appointment.client).load_only(User.id, User.username)
+    )
+
+
+def appointment_rows():
+    """
+    Query de citas como filas de columnas (sin objetos ORM) con los nombres
+    del profesional y del cliente. Las columnas conservan el nombre del
+    atributo, así que sirve con paginated_response y project.serializers.
+    """
+    professional = aliased(User)
+    client = aliased(User)
+    return db.session.query(
+        Appointment.id,
+        Appointment.patient_name,
+        Appointment.start_datetime,
+        Appointment.end_datetime,
+        Appointment.status,
+        Appointment.notes,
+        Appointment.client_id,
+        Appointment.cancelled_at,
+        Appointment.cancellation_reason,
+        professional.username.label('professional_name'),
+        client.username.label('client_name')
+    ).join(
+        professional, Appointment.professional_id == professional.id
+    ).outerjoin(
+        client, Appointment.client_id == client.id
+    )
+
+
+def count_appointments_by_professional(user_ids=None):
+    """
+    Cuenta las citas de cada profesional con un único GROUP BY.
+
+    Args:
+        user_ids: Lista opcional de ids para limitar el conteo
+
+    Returns:
+        dict {professional_id: cantidad}; los usuarios sin citas no aparecen
+    """
+    query = db.session.query(
+        Appointment.professional_id,
+        db.func.count(Appointment.id)
+    ).group_by(Appointment.professional_id)
+
+    if user_ids is not None:
+        query = query.filter(Appointment.professional_id.in_(user_ids))
+
+    return dict(query.all())
+
+
+def count_appointments_by_status(professional_id=None, client_id=None):
+    """
+    Cuenta las citas por estado con un único GROUP BY.
+
+    Args:
+        professional_id: Limita a las citas de un profesional
+        client_id: Limita a las citas de un cliente
+
+    Returns:
+        dict {status: cantidad}; los estados sin citas no aparecen
+    """
+    query = db.session.query(
+        Appointment.status,
+        db.func.count(Appointment.id)
+    ).group_by(Appointment.status)
+
+    if professional_id is not None:
+        query = query.filter(Appointment.professional_id == professional_id)
+    if client_id is not None:
+        query = query.filter(Appointment.client_id == client_id)
+
+    return dict(query.all())
@@ -0,0 +1,65 @@
+"""
+Cambios confirmados por otros procesos.
+
+El bus de notificaciones y las versiones de los ETag viven en la memoria de
+cada proceso web. Lo que escriben otros procesos (`flask outbox-worker` con
+OUTBOX_WORKER_THREAD=0, el scheduler) no pasa por ellos, y sin este módulo
+el polling respondería 304 para siempre y el stream SSE no recibiría nada.
+
+Cada proceso web corre un hilo que cada RELAY_POLL_SECONDS consulta la base:
+  - notificaciones nuevas (NotificationTail): se publican en el bus local,
+    lo que las envía por SSE y cambia la versión del ETag del usuario.
+  - cambios de citas (ConflictEngine.sync): se aplican al índice de
+    conflictos y cambian las versiones de los calendarios afectados.
+
+Sin cambios cuesta dos consultas por clave primaria por vuelta, no por request.
+RELAY_POLL_SECONDS=0 lo desactiva (un solo proceso escribe todo).
+"""
+import threading
+import time
+
+from project import db
+from project.conflicts import conflict_engine
+from project.notifications import notification_tail
+
+
+class Relay:
+    """Hilo que trae al proceso los cambios de los demás; se inicia con el primer request."""
+
+    def __init__(self):
+        self.app = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        app.before_request(self.ensure_started)
+
+    def ensure_started(self):
+        if self._thread is not None or self.app is None or not self.app.config['RELAY_POLL_SECONDS']:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name='relay', daemon=True)
+                self._thread.start()
+
+    def poll(self):
+        """Una vuelta: publica lo que otros procesos confirmaron desde la anterior."""
+        with self.app.app_context():
+            try:
+                connection = db.session.connection()
+                conflict_engine.sync(connection)
+                notification_tail.poll(connection, time.monotonic())
+            except Exception:
+                self.app.logger.exception('Error leyendo los cambios de otros procesos')
+            finally:
+                # Solo lectura: terminar la transacción para ver lo próximo
+                db.session.rollback()
+
+    def run(self):
+        while True:
+            self.poll()
+            time.sleep(self.app.config['RELAY_POLL_SECONDS'])
+
+
+relay = Relay()
@@ -0,0 +1,46 @@
+"""
+Retención de notificaciones.
+
+Borra en lotes las notificaciones leídas antiguas y las no leídas muy
+antiguas, para que la tabla crezca con los eventos relevantes y no con el
+tiempo. Cada lote es una transacción corta (SELECT de ids + DELETE por id),
+así que no bloquea la base durante mucho tiempo aunque haya millones de filas.
+
+Se ejecuta con `flask prune-notifications`.
+"""
+from datetime import datetime, timedelta
+
+from project import db
+from project.models import Notification, PERU_TZ
+
+
+def prune_notifications(read_days=30, unread_days=180, batch_size=1000):
+    """
+    Args:
+        read_days: Antigüedad mínima de las notificaciones leídas a borrar
+        unread_days: Antigüedad mínima de las no leídas a borrar (0 = nunca)
+        batch_size: Filas por transacción
+
+    Returns:
+        Cantidad de notificaciones borradas
+    """
+    now = datetime.now(PERU_TZ)
+    conditions = [db.and_(Notification.is_read.is_(True),
+                          Notification.created_at < now - timedelta(days=read_days))]
+    if unread_days:
+        conditions.append(Notification.created_at < now - timedelta(days=unread_days))
+
+    total = 0
+    for condition in conditions:
+        while True:
+            ids = db.session.scalars(
+                db.select(Notification.id).where(condition).limit(batch_size)
+            ).all()
+            if not ids:
+                break
+            db.session.execute(db.delete(Notification).where(Notification.id.in_(ids)))
+            db.session.commit()
+            total += len(ids)
+            if len(ids) < batch_size:
+                break
+    return total
@@ -0,0 +1,206 @@
+"""
+Scheduler de tareas periódicas (recordatorios, autocompletado de citas).
+
+Las tareas se guardan en un heap ordenado por la hora de su próxima
+ejecución: el hilo duerme hasta la más próxima, ejecuta las vencidas y las
+vuelve a programar, sin recorrer todas en cada vuelta.
+
+Con varios workers de gunicorn cada proceso tiene su hilo, pero solo ejecuta
+tareas el líder: el dueño de la lease vigente de la tabla scheduler_lease. El
+líder la renueva cada tercio de SCHEDULER_LEASE_SECONDS; si el proceso muere,
+otro la toma cuando vence. Las tareas toleran que dos procesos se crean
+líderes un instante (p. ej. tras una pausa larga): marcan sus filas con
+UPDATE condicionales.
+
+El hilo arranca con el primer request (create_app no toca la base) o se corre
+como proceso aparte con `flask scheduler` y SCHEDULER_THREAD=0. Lo que el
+líder escribe llega a los demás procesos por project.relay.
+"""
+import atexit
+import heapq
+import itertools
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from project import db, jobs
+from project.models import SchedulerLease, get_peru_time
+
+LEASE_NAME = 'scheduler'
+
+
+class Lease:
+    """Lease con vencimiento guardada en la base (una fila por nombre)."""
+
+    def __init__(self, name, seconds):
+        self.name = name
+        self.seconds = seconds
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._renewed_at = None
+
+    def hold(self):
+        """
+        Si este proceso es el líder. Renueva la lease en la base cuando pasó
+        un tercio de su duración; mientras tanto no consulta nada.
+        """
+        if self._renewed_at is not None and time.monotonic() - self._renewed_at < self.seconds / 3:
+            return True
+        self._renewed_at = None
+        if self._acquire():
+            self._renewed_at = time.monotonic()
+            return True
+        return False
+
+    def _acquire(self):
+        now = get_peru_time().replace(tzinfo=None)
+        expires_at = now + timedelta(seconds=self.seconds)
+        try:
+            # Renovar la propia o tomar una vencida, en un solo UPDATE atómico
+            taken = db.session.execute(
+                update(SchedulerLease)
+                .where(SchedulerLease.name == self.name,
+                       or_(SchedulerLease.owner == self.owner, SchedulerLease.expires_at < now))
+                .values(owner=self.owner, expires_at=expires_at),
+                execution_options={'synchronize_session': False}
+            ).rowcount
+            if not taken:
+                exists = db.session.execute(
+                    select(SchedulerLease.name).where(SchedulerLease.name == self.name)
+                ).first()
+                if exists is not None:
+                    db.session.rollback()
+                    return False
+                db.session.execute(
+                    insert(SchedulerLease).values(name=self.name, owner=self.owner, expires_at=expires_at)
+                )
+            db.session.commit()
+            return True
+        except IntegrityError:
+            # Otro proceso creó la lease al mismo tiempo
+            db.session.rollback()
+            return False
+
+    def release(self):
+        """Vence la lease si es propia, para que otro proceso la tome enseguida."""
+        if self._renewed_at is None:
+            return
+        self._renewed_at = None
+        db.session.execute(
+            update(SchedulerLease)
+            .where(SchedulerLease.name == self.name, SchedulerLease.owner == self.owner)
+            .values(expires_at=get_peru_time().replace(tzinfo=None)),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+
+
+class Scheduler:
+    """Hilo que ejecuta las tareas vencidas si este proceso tiene la lease."""
+
+    def __init__(self):
+        self.app = None
+        self.lease = None
+        self._jobs = []
+        self._order = itertools.count()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        config = app.config
+        self.lease = Lease(LEASE_NAME, config['SCHEDULER_LEASE_SECONDS'])
+        self._jobs = []
+        if config['REMINDERS_ENABLED']:
+            self.add_job('send_reminders', config['REMINDER_INTERVAL_SECONDS'],
+                         lambda: jobs.send_reminders(config['REMINDER_LEAD_MINUTES'],
+                                                     config['REMINDER_BATCH_SIZE']))
+        if config['AUTO_COMPLETE_APPOINTMENTS']:
+            self.add_job('auto_complete', config['AUTO_COMPLETE_INTERVAL_SECONDS'], jobs.auto_complete)
+        app.before_request(self.ensure_started)
+
+    def add_job(self, name, interval, fn):
+        """Ejecuta fn() cada `interval` segundos; la primera vez, al arrancar."""
+        heapq.heappush(self._jobs, (0.0, next(self._order), name, interval, fn))
+
+    def ensure_started(self):
+        if self._thread is not None or self.app is None or not self.app.config['SCHEDULER_THREAD']:
+            return
+        with self._lock:
+            if self._thread is None and self._jobs:
+                self._thread = threading.Thread(target=self.run, name='scheduler', daemon=True)
+                self._thread.start()
+                # Al terminar el worker, soltar la lease para no esperar a que venza
+                atexit.register(self.stop)
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run_pending(self, run_all=False):
+        """
+        Ejecuta las tareas vencidas (todas con `run_all`) si este proceso es
+        el líder, y las vuelve a programar.
+
+        Returns:
+            Segundos hasta la próxima tarea
+        """
+        now = time.monotonic()
+        due = []
+        while self._jobs and (run_all or self._jobs[0][0] <= now):
+            due.append(heapq.heappop(self._jobs))
+
+        with self.app.app_context():
+            try:
+                leader = self.lease.hold()
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception('Error renovando la lease del scheduler')
+                leader = False
+            for _, _, name, interval, fn in due:
+                if leader:
+                    self._run_job(name, fn)
+                # Los que no son líderes también reprograman: vuelven a
+                # intentar tomar la lease en la próxima ejecución
+                heapq.heappush(self._jobs, (now + interval, next(self._order), name, interval, fn))
+
+        if not self._jobs:
+            return None
+        return max(self._jobs[0][0] - time.monotonic(), 0)
+
+    def _run_job(self, name, fn):
+        started = time.perf_counter()
+        try:
+            count = fn()
+        except Exception:
+            db.session.rollback()
+            self.app.logger.exception('Error en la tarea %s del scheduler', name)
+            return
+        if count:
+            self.app.logger.info('%s: %d citas en %.0f ms', name, count,
+                                 (time.perf_counter() - started) * 1000)
+
+    def run(self, once=False):
+        self._stop.clear()
+        try:
+            if once:
+                self.run_pending(run_all=True)
+                return
+            while not self._stop.is_set():
+                wait = self.run_pending()
+                # Despertar también a tiempo para renovar la lease entre tareas
+                renew = self.lease.seconds / 3
+                self._stop.wait(renew if wait is None else min(wait, renew))
+        finally:
+            with self.app.app_context():
+                self.lease.release()
+
+
+scheduler = Scheduler()
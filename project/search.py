@@ -0,0 +1,149 @@
+"""
+Búsqueda de texto completo en citas (nombre del paciente y notas).
+
+Índices (migración 7), mantenidos por la base en cada INSERT/UPDATE/DELETE,
+así que también cubren las inserciones masivas con Core:
+  - SQLite: tabla FTS5 appointment_fts con contenido externo (las filas de
+    appointment) y triggers que la actualizan. Sin distinguir mayúsculas ni
+    tildes ("perez" encuentra "Pérez").
+  - PostgreSQL: columna generada appointment.search_vector (tsvector con
+    peso A para el paciente y B para las notas) con índice GIN.
+
+Los resultados se ordenan por relevancia (bm25 / ts_rank) y el texto
+coincidente se marca con <mark> sobre el texto ya escapado, por lo que
+el HTML de los resultados se puede insertar tal cual.
+
+Si el SQLite instalado no tiene FTS5, la migración no crea la tabla y la
+búsqueda recorre las citas con LIKE, sin relevancia ni resaltado.
+"""
+import re
+from html import escape
+
+from sqlalchemy import column, func, literal_column, or_, table
+
+from project import db
+from project.models import Appointment, to_peru_iso
+
+FTS_TABLE = 'appointment_fts'
+SEARCH_VECTOR = 'search_vector'
+
+MAX_TERMS = 8
+SNIPPET_WORDS = 12
+
+# Marcas de resaltado que no aparecen en el texto (Unicode de uso privado);
+# se reemplazan por <mark> después de escapar el HTML
+_START, _STOP = '\ue000', '\ue001'
+
+_TERM = re.compile(r'\w+')
+
+_fts_tables = {}
+
+
+def parse_terms(text):
+    """
+    Palabras a buscar. La última se busca como prefijo, para que la búsqueda
+    funcione mientras se escribe.
+
+    Raises:
+        ValueError: Si el texto no tiene ninguna palabra
+    """
+    terms = _TERM.findall((text or '').lower())
+    if not terms:
+        raise ValueError('El parámetro q debe incluir al menos una palabra')
+    return terms[:MAX_TERMS]
+
+
+def fts5_query(terms):
+    """Consulta FTS5 sin operadores del usuario: "t1" "t2" ... "tn"*"""
+    return ' '.join(f'"{t}"' for t in terms) + '*'
+
+
+def tsquery_text(terms):
+    """Texto para to_tsquery: t1 & t2 & ... & tn:*"""
+    return ' & '.join(terms) + ':*'
+
+
+def highlight_html(value):
+    """Escapa el texto y convierte las marcas de resaltado en <mark>."""
+    if not value:
+        return ''
+    return escape(value).replace(_START, '<mark>').replace(_STOP, '</mark>')
+
+
+def fts_available(connection):
+    """Si la base tiene la tabla FTS5 (se consulta una vez por engine)."""
+    engine = connection.engine
+    if engine not in _fts_tables:
+        _fts_tables[engine] = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+        ).first() is not None
+    return _fts_tables[engine]
+
+
+def search_appointments(query, terms):
+    """
+    Filtra y ordena por relevancia una query de citas (p. ej. appointment_rows,
+    ya restringida a lo que ve el usuario).
+
+    Agrega las columnas rank, patient_name_html y notes_html (ver
+    serialize_result) y ordena de la más a la menos relevante.
+    """
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+
+    if dialect == 'postgresql':
+        tsquery = func.to_tsquery('simple', tsquery_text(terms))
+        vector = literal_column(f'appointment.{SEARCH_VECTOR}')
+        options = f'StartSel={_START}, StopSel={_STOP}'
+        rank = func.ts_rank(vector, tsquery)
+        return query.filter(vector.op('@@')(tsquery)).add_columns(
+            rank.label('rank'),
+            func.ts_headline('simple', Appointment.patient_name, tsquery,
+                             options + ', HighlightAll=true').label('patient_name_html'),
+            func.ts_headline('simple', func.coalesce(Appointment.notes, ''), tsquery,
+                             options + f', MaxWords={SNIPPET_WORDS}, MinWords=3').label('notes_html'),
+        ).order_by(rank.desc(), Appointment.start_datetime.desc(), Appointment.id.desc())
+
+    if dialect == 'sqlite' and fts_available(connection):
+        fts = table(FTS_TABLE, column('rowid'))
+        fts_ref = literal_column(FTS_TABLE)
+        # Los pesos de bm25 siguen el orden de las columnas: paciente, notas
+        rank = func.bm25(fts_ref, 10.0, 1.0)
+        return query.join(fts, fts.c.rowid == Appointment.id).filter(
+            fts_ref.op('MATCH')(fts5_query(terms))
+        ).add_columns(
+            # bm25 es menor cuanto más relevante: se invierte para exponerlo
+            (-rank).label('rank'),
+            func.highlight(fts_ref, 0, _START, _STOP).label('patient_name_html'),
+            func.snippet(fts_ref, 1, _START, _STOP, '…', SNIPPET_WORDS).label('notes_html'),
+        ).order_by(rank, Appointment.start_datetime.desc(), Appointment.id.desc())
+
+    # Sin índice de texto: cada palabra en el paciente o en las notas
+    for term in terms:
+        query = query.filter(or_(
+            Appointment.patient_name.contains(term, autoescape=True),
+            Appointment.notes.contains(term, autoescape=True),
+        ))
+    return query.add_columns(
+        literal_column('0.0').label('rank'),
+        Appointment.patient_name.label('patient_name_html'),
+        func.coalesce(Appointment.notes, '').label('notes_html'),
+    ).order_by(Appointment.start_datetime.desc(), Appointment.id.desc())
+
+
+def serialize_result(row):
+    """Fila de search_appointments -> resultado con el texto resaltado."""
+    return {
+        'id': row.id,
+        'patient_name': row.patient_name,
+        'start_datetime': to_peru_iso(row.start_datetime),
+        'end_datetime': to_peru_iso(row.end_datetime),
+        'status': row.status,
+        'professional': row.professional_name or 'N/A',
+        'client': row.client_name or 'Sin asignar',
+        'rank': float(row.rank or 0),
+        'highlight': {
+            'patient_name': highlight_html(row.patient_name_html),
+            'notes': highlight_html(row.notes_html),
+        },
+    }
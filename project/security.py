@@ -0,0 +1,121 @@
+"""
+Hashing de contraseñas en un pool acotado y rate limiting de login/registro.
+
+bcrypt libera el GIL mientras calcula, así que un pool pequeño de hilos
+limita cuántos hashes corren a la vez sin bloquear al resto de los hilos de
+gunicorn (calendario, API). Si hay demasiados hashes en cola se rechaza de
+inmediato con PasswordPoolBusy en lugar de acumular requests.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from project import bcrypt
+
+
+class PasswordPoolBusy(Exception):
+    """Demasiadas verificaciones de contraseña en curso."""
+
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='bcrypt')
+_slots = threading.BoundedSemaphore(16)
+_log_rounds = 12
+# Limitadores por nombre de configuración (ver init_app)
+limiters = {}
+
+
+def init_app(app):
+    global _executor, _slots, _log_rounds
+    _executor = ThreadPoolExecutor(max_workers=app.config['BCRYPT_POOL_SIZE'], thread_name_prefix='bcrypt')
+    _slots = threading.BoundedSemaphore(app.config['BCRYPT_MAX_PENDING'])
+    _log_rounds = app.config['BCRYPT_LOG_ROUNDS']
+
+    for name in ('LOGIN_RATE_PER_IP', 'LOGIN_RATE_PER_USERNAME', 'REGISTER_RATE_PER_IP'):
+        limiters[name] = TokenBucketLimiter(*parse_rate(app.config[name]))
+
+
+def _run(fn, *args):
+    if not _slots.acquire(blocking=False):
+        raise PasswordPoolBusy()
+    try:
+        return _executor.submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+
+def hash_password(password):
+    return _run(bcrypt.generate_password_hash, password, _log_rounds).decode('utf-8')
+
+
+def verify_password(password_hash, password):
+    return _run(bcrypt.check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """True si el hash se generó con un costo distinto al configurado."""
+    try:
+        return int(password_hash.split('$')[2]) != _log_rounds
+    except (AttributeError, IndexError, ValueError):
+        return False
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket por clave (IP, usuario...). Cada clave tiene `capacity`
+    tokens que se recargan a `refill_per_second`. Guarda como máximo
+    `maxsize` claves (LRU). Seguro entre hilos.
+    """
+
+    def __init__(self, capacity, refill_per_second, maxsize=10000):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated_at) * self.refill_per_second)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return allowed
+
+    def has_tokens(self, key, cost=1):
+        """Si `key` puede gastar `cost` tokens ahora, sin gastarlos."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.capacity, now))
+            return min(self.capacity, tokens + (now - updated_at) * self.refill_per_second) >= cost
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+
+def parse_rate(rate):
+    """'10/60' -> (10, 10/60): 10 intentos de ráfaga, recarga de 10 cada 60 s."""
+    count, seconds = rate.split('/')
+    return int(count), int(count) / float(seconds)
+
+
+def rate_limited(name, key):
+    """True si `key` agotó los intentos del limitador `name`."""
+    return not limiters[name].allow(key)
+
+
+def rate_exhausted(name, key):
+    """Como rate_limited, pero sin gastar un intento (ver charge_rate)."""
+    return not limiters[name].has_tokens(key)
+
+
+def charge_rate(name, key):
+    """Gasta un intento de `key` en el limitador `name` (p. ej. tras un fallo)."""
+    limiters[name].allow(key)
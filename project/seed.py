@@ -0,0 +1,64 @@
+"""
+Preparación de la base: migraciones y usuarios de prueba.
+
+Se ejecuta con `flask setup` antes de arrancar gunicorn (ver Procfile), no en
+create_app: así cada worker arranca sin tocar la base ni calcular bcrypt.
+"""
+from sqlalchemy.exc import IntegrityError
+
+from project import db
+from project.models import User
+
+SEED_USERS = [
+    {'username': 'admin', 'email': 'admin@agendapro.com', 'role': 'admin', 'password': 'admin123'},
+    {'username': 'doctor', 'email': 'doctor@agendapro.com', 'role': 'profesional', 'password': 'doctor123'},
+    {'username': 'cliente', 'email': 'cliente@agendapro.com', 'role': 'cliente', 'password': 'cliente123'},
+]
+
+
+def seed_users(users=SEED_USERS):
+    """
+    Crea los usuarios que falten en una sola transacción.
+
+    Una sola consulta averigua cuáles existen; solo se calcula el hash de
+    contraseña de los nuevos, así que repetirlo cuesta un SELECT.
+
+    Returns:
+        Lista de usernames creados
+    """
+    usernames = [u['username'] for u in users]
+    existing = set(db.session.scalars(
+        db.select(User.username).where(User.username.in_(usernames))
+    ))
+
+    new_users = []
+    for data in users:
+        if data['username'] in existing:
+            continue
+        user = User(username=data['username'], email=data['email'], role=data['role'])
+        user.set_password(data['password'])
+        new_users.append(user)
+
+    if not new_users:
+        return []
+
+    db.session.add_all(new_users)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Otro proceso sembró al mismo tiempo
+        db.session.rollback()
+        return []
+    return [u.username for u in new_users]
+
+
+def setup_database(seed=True, verbose=True):
+    """Aplica migraciones pendientes y, opcionalmente, siembra los usuarios."""
+    from project import migrations
+
+    migrations.upgrade(db.engine, verbose=verbose)
+    created = seed_users() if seed else []
+    if verbose:
+        for username in created:
+            print(f"✅ Usuario {username} creado")
+    return created
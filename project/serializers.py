@@ -0,0 +1,88 @@
+"""
+Serialización rápida de citas para el calendario y el historial.
+
+Trabaja sobre filas de project.queries.appointment_rows() (solo columnas, sin
+hidratar objetos ORM), calcula la hora actual una vez por request y formatea
+las fechas con el mismo helper que Appointment.to_dict. Las respuestas se
+codifican con orjson si está instalado.
+"""
+import json
+
+from flask import Response
+
+from project.models import get_peru_time, to_peru_iso
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+STATUS_COLORS = {
+    'completada': '#198754',  # Verde
+    'programada': '#0d6efd',  # Azul
+}
+DEFAULT_COLOR = STATUS_COLORS['programada']
+
+
+def dumps(data):
+    """JSON como bytes; orjson es varias veces más rápido que json."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(data, status=200):
+    return Response(dumps(data), status=status, mimetype='application/json')
+
+
+def event_serializer(now=None):
+    """
+    Función fila -> evento de FullCalendar.
+
+    Args:
+        now: Hora actual de Perú (naive); por defecto se calcula una sola vez aquí
+    """
+    if now is None:
+        now = get_peru_time().replace(tzinfo=None)
+
+    def serialize(row):
+        color = STATUS_COLORS.get(row.status, DEFAULT_COLOR)
+        return {
+            'id': row.id,
+            'title': row.patient_name,
+            'start': to_peru_iso(row.start_datetime),
+            'end': to_peru_iso(row.end_datetime),
+            'backgroundColor': color,
+            'borderColor': color,
+            'extendedProps': {
+                'patient_name': row.patient_name,
+                'status': row.status,
+                'notes': row.notes or '',
+                'professional': row.professional_name or 'N/A',
+                'client': row.client_name or 'N/A',
+                'client_id': row.client_id,
+                'can_complete': row.end_datetime <= now,
+                'can_cancel': row.status not in ('completada', 'cancelada')
+            }
+        }
+    return serialize
+
+
+def serialize_events(rows, now=None):
+    serialize = event_serializer(now)
+    return [serialize(row) for row in rows]
+
+
+def serialize_cancelled(row):
+    """Fila -> entrada del historial de canceladas."""
+    return {
+        'id': row.id,
+        'patient_name': row.patient_name,
+        'start_datetime': row.start_datetime.isoformat(),
+        'end_datetime': row.end_datetime.isoformat(),
+        'professional': row.professional_name or 'N/A',
+        'client': row.client_name or 'Sin asignar',
+        'cancelled_at': row.cancelled_at.isoformat() if row.cancelled_at else None,
+        'cancellation_reason': row.cancellation_reason or 'Sin motivo especificado',
+        'notes': row.notes or ''
+    }
@@ -1,40 +1,104 @@
 let calendar;
 let currentEventId = null;
+let changeToken = null;  // Último X-Change-Token para la sincronización incremental
+let bootstrapped = false;  // La primera carga del calendario trae todo el dashboard
 
 document.addEventListener('DOMContentLoaded', function() {
+    // ✅ Estadísticas, canceladas y notificaciones llegan con la primera
+    // carga del calendario (/api/dashboard/bootstrap)
     initializeCalendar();
-    loadStatistics();
     setupEventListeners();
-    loadClients();
-    loadAppointmentsList();  // ✅ NUEVO: Cargar lista de citas
+    setupClientPicker();
+    setupAppointmentSearch();
+    // La lista de citas se arma en eventsSet con los eventos del calendario
 });
 
-function loadClients() {
+function canManageAppointments() {
     const roleBadge = document.querySelector('.role-badge');
-    if (!roleBadge || (!roleBadge.classList.contains('profesional') && !roleBadge.classList.contains('admin'))) {
-        return;
-    }
+    return !!roleBadge && (roleBadge.classList.contains('profesional') || roleBadge.classList.contains('admin'));
+}
+
+// ✅ Primer render: una sola request con todo lo que muestra el dashboard
+function loadDashboard(rangeParams) {
+    return fetch(`/api/dashboard/bootstrap?${rangeParams}`)
+        .then(response => {
+            if (!response.ok) throw new Error('Error al cargar el dashboard');
+            return response.json();
+        })
+        .then(data => {
+            changeToken = data.change_token;
+            renderStatistics(data.stats);
+            if (window.renderNotifications) {
+                window.renderNotifications(data.notifications, data.notifications_etag);
+            }
+            if (data.cancelled) renderCancelled(data.cancelled.items, data.cancelled.next_cursor, false);
+            return data.appointments;
+        });
+}
+
+// ✅ Selector de clientes: sugerencias buscadas en el servidor mientras se escribe
+const CLIENT_SEARCH_LIMIT = 20;
+const clientIds = new Map();  // username -> id de los clientes sugeridos
+let clientSearchTimer = null;
+let clientSearchRequest = 0;  // Solo se muestran las sugerencias de la última búsqueda
+
+function setupClientPicker() {
+    const input = document.getElementById('client_search');
+    if (!input) return;
+    
+    input.addEventListener('focus', () => {
+        if (!document.getElementById('client_options').children.length) searchClients('');
+    });
+    input.addEventListener('input', () => {
+        syncClientId();
+        clearTimeout(clientSearchTimer);
+        clientSearchTimer = setTimeout(() => searchClients(input.value.trim()), 250);
+    });
+}
+
+function searchClients(q) {
+    const params = new URLSearchParams({ limit: CLIENT_SEARCH_LIMIT });
+    if (q) params.set('q', q);
+    const requestId = ++clientSearchRequest;
     
-    fetch('/api/clients')
+    fetch(`/api/clients?${params}`)
         .then(response => {
             if (!response.ok) throw new Error('No autorizado');
             return response.json();
         })
         .then(clients => {
-            const clientSelect = document.getElementById('client_id');
-            if (clientSelect) {
-                clientSelect.innerHTML = '<option value="">-- Sin asignar --</option>';
-                clients.forEach(client => {
-                    const option = document.createElement('option');
-                    option.value = client.id;
-                    option.textContent = `${client.username} (${client.email})`;
-                    clientSelect.appendChild(option);
-                });
-            }
+            if (requestId === clientSearchRequest) renderClientOptions(clients);
         })
         .catch(error => console.error('Error loading clients:', error));
 }
 
+function renderClientOptions(clients) {
+    const datalist = document.getElementById('client_options');
+    datalist.innerHTML = '';
+    clients.forEach(client => {
+        clientIds.set(client.username, client.id);
+        const option = document.createElement('option');
+        option.value = client.username;
+        option.label = client.email || '';
+        datalist.appendChild(option);
+    });
+    syncClientId();
+}
+
+// El id del cliente se toma del usuario escrito o elegido en las sugerencias
+function syncClientId() {
+    const input = document.getElementById('client_search');
+    document.getElementById('client_id').value = clientIds.get(input.value.trim()) || '';
+}
+
+function setSelectedClient(id, username) {
+    const input = document.getElementById('client_search');
+    if (!input) return;
+    if (id) clientIds.set(username, id);
+    input.value = id ? username : '';
+    document.getElementById('client_id').value = id || '';
+}
+
 function initializeCalendar() {
     const calendarEl = document.getElementById('calendar-container');
     
@@ -59,11 +123,22 @@ function initializeCalendar() {
         eventResizableFromStart: true,
         
         events: function(info, successCallback, failureCallback) {
-            fetch(`/api/appointments`)
-                .then(response => {
-                    if (!response.ok) throw new Error('Error al cargar citas');
-                    return response.json();
-                })
+            // ✅ Solo pedir las citas del rango visible
+            const rangeParams = buildRangeParams(info.startStr, info.endStr);
+            let request;
+            if (!bootstrapped) {
+                bootstrapped = true;
+                request = loadDashboard(rangeParams).catch(error => {
+                    // Sin bootstrap, cargar cada parte por separado
+                    console.error('Error loading dashboard:', error);
+                    loadStatistics();
+                    loadCancelledAppointments();
+                    return fetchAppointments(rangeParams);
+                });
+            } else {
+                request = fetchAppointments(rangeParams);
+            }
+            request
                 .then(data => {
                     successCallback(data);
                 })
@@ -97,6 +172,15 @@ function initializeCalendar() {
             updateEventDates(info.event);
         },
         
+        datesSet: function() {
+            loadAppointmentsList();
+        },
+        
+        // ✅ Se dispara tras cargar, sincronizar o mover eventos
+        eventsSet: function() {
+            loadAppointmentsList();
+        },
+        
         eventDidMount: function(info) {
             info.el.title = `${info.event.title}\n${info.event.extendedProps.status}\n${new Date(info.event.start).toLocaleString('es-PE')}`;
         }
@@ -105,6 +189,56 @@ function initializeCalendar() {
     calendar.render();
 }
 
+function fetchAppointments(rangeParams) {
+    return fetch(`/api/appointments?${rangeParams}`)
+        .then(response => {
+            if (!response.ok) throw new Error('Error al cargar citas');
+            changeToken = response.headers.get('X-Change-Token');
+            return response.json();
+        });
+}
+
+function buildRangeParams(startStr, endStr) {
+    return new URLSearchParams({ start: startStr, end: endStr }).toString();
+}
+
+// ✅ Sincronización incremental: aplica solo los cambios desde el último token
+function syncCalendar() {
+    if (changeToken === null) {
+        calendar.refetchEvents();
+        return;
+    }
+    
+    fetch(`/api/appointments/changes?since=${encodeURIComponent(changeToken)}`)
+        .then(response => {
+            if (!response.ok) throw new Error('Error al sincronizar citas');
+            return response.json();
+        })
+        .then(data => {
+            if (data.reset) {
+                calendar.refetchEvents();
+                return;
+            }
+            const source = calendar.getEventSources()[0];
+            calendar.batchRendering(() => {
+                data.removed.forEach(id => {
+                    const event = calendar.getEventById(String(id));
+                    if (event) event.remove();
+                });
+                data.events.forEach(eventData => {
+                    const existing = calendar.getEventById(String(eventData.id));
+                    if (existing) existing.remove();
+                    calendar.addEvent(eventData, source);
+                });
+            });
+            changeToken = String(data.next);
+        })
+        .catch(error => {
+            console.error('Error syncing appointments:', error);
+            calendar.refetchEvents();
+        });
+}
+
 function openNewAppointmentModal() {
     currentEventId = null;
     const now = new Date();
@@ -128,10 +262,7 @@ function openAppointmentModal(startStr, endStr) {
     document.getElementById('end_datetime').value = formatDateTimeLocal(new Date(endStr));
     document.getElementById('notes').value = '';
     
-    const clientSelect = document.getElementById('client_id');
-    if (clientSelect) {
-        clientSelect.value = '';
-    }
+    setSelectedClient(null);
     
     deleteBtn.style.display = 'none';
     modal.show();
@@ -149,12 +280,7 @@ function showAppointmentDetails(event) {
     document.getElementById('start_datetime').value = formatDateTimeLocal(new Date(event.start));
     document.getElementById('end_datetime').value = formatDateTimeLocal(new Date(event.end || event.start));
     
-    const clientSelect = document.getElementById('client_id');
-    if (clientSelect && event.extendedProps.client_id) {
-        clientSelect.value = event.extendedProps.client_id;
-    } else if (clientSelect) {
-        clientSelect.value = '';
-    }
+    setSelectedClient(event.extendedProps.client_id, event.extendedProps.client);
     
     // ✅ Solo admin puede eliminar
     const roleBadge = document.querySelector('.role-badge');
@@ -195,9 +321,9 @@ function saveAppointment() {
         notes: notes
     };
     
-    const clientSelect = document.getElementById('client_id');
-    if (clientSelect && clientSelect.value) {
-        formData.client_id = parseInt(clientSelect.value);
+    const clientInput = document.getElementById('client_id');
+    if (clientInput && clientInput.value) {
+        formData.client_id = parseInt(clientInput.value);
     }
     
     const url = currentEventId ? `/api/appointments/${currentEventId}` : '/api/appointments';
@@ -230,9 +356,8 @@ function saveAppointment() {
         
         const modal = bootstrap.Modal.getInstance(document.getElementById('appointmentModal'));
         modal.hide();
-        calendar.refetchEvents();
+        syncCalendar();  // ✅ La lista se refresca en eventsSet
         loadStatistics();
-        loadAppointmentsList();  // ✅ Refrescar lista
         showToast(data.message || 'Cita guardada exitosamente', 'success');
     })
     .catch(error => console.error('Error saving appointment:', error))
@@ -252,9 +377,8 @@ function setupEventListeners() {
                     .then(data => {
                         const modal = bootstrap.Modal.getInstance(document.getElementById('appointmentModal'));
                         modal.hide();
-                        calendar.refetchEvents();
+                        syncCalendar();
                         loadStatistics();
-                        loadAppointmentsList();
                         showToast(data.message || 'Cita eliminada permanentemente', 'success');
                     })
                     .catch(error => {
@@ -290,8 +414,8 @@ function updateEventDates(event) {
             showToast(data.error && data.error.includes('solapa') ? `⚠️ ${data.error}` : 'Error al actualizar la cita', 'danger');
         } else {
             showToast('Cita actualizada', 'success');
+            syncCalendar();
             loadStatistics();
-            loadAppointmentsList();
         }
     })
     .catch(error => {
@@ -301,7 +425,7 @@ function updateEventDates(event) {
     });
 }
 
-// ✅ NUEVO: Cargar lista de citas con acciones
+// ✅ NUEVO: Lista de citas con acciones (mismos eventos que el calendario, sin otra petición)
 function loadAppointmentsList() {
     const roleBadge = document.querySelector('.role-badge');
     if (!roleBadge || (!roleBadge.classList.contains('profesional') && !roleBadge.classList.contains('admin'))) {
@@ -311,54 +435,50 @@ function loadAppointmentsList() {
     const listContainer = document.getElementById('appointments-list');
     if (!listContainer) return;
     
-    listContainer.innerHTML = '<div class="text-center py-3"><i class="fas fa-spinner fa-spin"></i> Cargando...</div>';
+    // ✅ La lista muestra el mismo rango que el calendario
+    const view = calendar.view;
+    const events = calendar.getEvents()
+        .filter(event => event.start < view.activeEnd && (event.end || event.start) > view.activeStart)
+        .sort((a, b) => a.start - b.start || Number(a.id) - Number(b.id));
     
-    fetch('/api/appointments')
-        .then(response => response.json())
-        .then(events => {
-            if (events.length === 0) {
-                listContainer.innerHTML = '<div class="text-center text-muted py-4">No hay citas programadas</div>';
-                return;
-            }
-            
-            listContainer.innerHTML = '';
-            events.forEach(event => {
-                const apt = event.extendedProps;
-                const startDate = new Date(event.start);
-                const isPast = apt.can_complete;
-                
-                const card = document.createElement('div');
-                card.className = 'appointment-card mb-3';
-                card.innerHTML = `
-                    <div class="d-flex justify-content-between align-items-center">
-                        <div class="flex-grow-1">
-                            <h6 class="mb-1">${event.title}</h6>
-                            <small class="text-muted">
-                                <i class="far fa-calendar"></i> ${startDate.toLocaleDateString('es-PE')}
-                                <i class="far fa-clock ms-2"></i> ${startDate.toLocaleTimeString('es-PE', {hour: '2-digit', minute: '2-digit'})}
-                            </small>
-                            ${apt.client && apt.client !== 'N/A' ? `<br><small class="text-muted"><i class="fas fa-user"></i> ${apt.client}</small>` : ''}
-                            <br><span class="badge bg-${apt.status === 'completada' ? 'success' : 'primary'}">${apt.status.toUpperCase()}</span>
-                        </div>
-                        <div class="btn-group btn-group-sm">
-                            ${apt.can_complete && apt.status === 'programada' ? 
-                                `<button class="btn btn-success" onclick="completeAppointment(${event.id})" title="Marcar como completada">
-                                    <i class="fas fa-check"></i>
-                                </button>` : ''}
-                            ${apt.can_cancel && apt.status === 'programada' ?
-                                `<button class="btn btn-danger" onclick="cancelAppointment(${event.id}, '${event.title}')" title="Cancelar cita">
-                                    <i class="fas fa-times"></i>
-                                </button>` : ''}
-                        </div>
-                    </div>
-                `;
-                listContainer.appendChild(card);
-            });
-        })
-        .catch(error => {
-            console.error('Error loading appointments list:', error);
-            listContainer.innerHTML = '<div class="text-center text-danger py-3">Error al cargar citas</div>';
-        });
+    if (events.length === 0) {
+        listContainer.innerHTML = '<div class="text-center text-muted py-4">No hay citas programadas</div>';
+        return;
+    }
+    
+    listContainer.innerHTML = '';
+    events.forEach(event => {
+        const apt = event.extendedProps;
+        const startDate = new Date(event.start);
+        const isPast = apt.can_complete;
+        
+        const card = document.createElement('div');
+        card.className = 'appointment-card mb-3';
+        card.innerHTML = `
+            <div class="d-flex justify-content-between align-items-center">
+                <div class="flex-grow-1">
+                    <h6 class="mb-1">${event.title}</h6>
+                    <small class="text-muted">
+                        <i class="far fa-calendar"></i> ${startDate.toLocaleDateString('es-PE')}
+                        <i class="far fa-clock ms-2"></i> ${startDate.toLocaleTimeString('es-PE', {hour: '2-digit', minute: '2-digit'})}
+                    </small>
+                    ${apt.client && apt.client !== 'N/A' ? `<br><small class="text-muted"><i class="fas fa-user"></i> ${apt.client}</small>` : ''}
+                    <br><span class="badge bg-${apt.status === 'completada' ? 'success' : 'primary'}">${apt.status.toUpperCase()}</span>
+                </div>
+                <div class="btn-group btn-group-sm">
+                    ${apt.can_complete && apt.status === 'programada' ? 
+                        `<button class="btn btn-success" onclick="completeAppointment(${event.id})" title="Marcar como completada">
+                            <i class="fas fa-check"></i>
+                        </button>` : ''}
+                    ${apt.can_cancel && apt.status === 'programada' ?
+                        `<button class="btn btn-danger" onclick="cancelAppointment(${event.id}, '${event.title}')" title="Cancelar cita">
+                            <i class="fas fa-times"></i>
+                        </button>` : ''}
+                </div>
+            </div>
+        `;
+        listContainer.appendChild(card);
+    });
 }
 
 // ✅ NUEVO: Completar cita
@@ -374,9 +494,8 @@ function completeAppointment(id) {
         if (!ok) {
             showToast(data.error || 'Error al completar la cita', 'danger');
         } else {
-            calendar.refetchEvents();
+            syncCalendar();
             loadStatistics();
-            loadAppointmentsList();
             showToast('✅ Cita marcada como completada', 'success');
         }
     })
@@ -402,9 +521,8 @@ function cancelAppointment(id, patientName) {
         if (!ok) {
             showToast(data.error || 'Error al cancelar la cita', 'danger');
         } else {
-            calendar.refetchEvents();
+            syncCalendar();
             loadStatistics();
-            loadAppointmentsList();
             loadCancelledAppointments();  // Refrescar historial de canceladas
             showToast('❌ Cita cancelada exitosamente', 'success');
         }
@@ -415,94 +533,203 @@ function cancelAppointment(id, patientName) {
     });
 }
 
-// ✅ NUEVO: Cargar citas canceladas
-function loadCancelledAppointments() {
-    const roleBadge = document.querySelector('.role-badge');
-    if (!roleBadge || (!roleBadge.classList.contains('profesional') && !roleBadge.classList.contains('admin'))) {
+// ✅ NUEVO: Búsqueda de texto completo en el historial (/api/appointments/search)
+const SEARCH_PAGE_SIZE = 20;
+let searchTimer = null;
+let searchRequest = 0;  // Solo se muestran los resultados de la última búsqueda
+
+function setupAppointmentSearch() {
+    const input = document.getElementById('appointment-search');
+    if (!input) return;
+    
+    input.addEventListener('input', () => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => searchAppointments(input.value.trim()), 250);
+    });
+}
+
+function searchAppointments(q, cursor) {
+    const container = document.getElementById('search-results');
+    const moreBtn = document.getElementById('search-more');
+    if (moreBtn) moreBtn.remove();
+    if (!q) {
+        searchRequest++;
+        container.innerHTML = '';
         return;
     }
     
-    const container = document.getElementById('cancelled-list');
-    if (!container) return;
-    
-    container.innerHTML = '<div class="text-center py-3"><i class="fas fa-spinner fa-spin"></i> Cargando...</div>';
-    
-    fetch('/api/appointments/cancelled')
-        .then(response => response.json())
-        .then(appointments => {
-            if (appointments.length === 0) {
-                container.innerHTML = '<div class="text-center text-muted py-4">No hay citas canceladas</div>';
+    const params = new URLSearchParams({ q, limit: SEARCH_PAGE_SIZE });
+    if (cursor) params.set('cursor', cursor);
+    const requestId = ++searchRequest;
+    
+    fetch(`/api/appointments/search?${params}`)
+        .then(response => response.json().then(results => ({
+            results,
+            nextCursor: response.headers.get('X-Next-Cursor')
+        })))
+        .then(({results, nextCursor}) => {
+            if (requestId !== searchRequest) return;
+            if (!Array.isArray(results)) {
+                container.innerHTML = `<div class="text-center text-muted py-4">${results.error || 'Búsqueda inválida'}</div>`;
+                return;
+            }
+            if (!cursor && results.length === 0) {
+                container.innerHTML = '<div class="text-center text-muted py-4">No se encontraron citas</div>';
                 return;
             }
             
-            container.innerHTML = '';
-            appointments.forEach(apt => {
-                const cancelledDate = new Date(apt.cancelled_at);
+            if (!cursor) container.innerHTML = '';
+            results.forEach(apt => {
                 const aptDate = new Date(apt.start_datetime);
-                
                 const card = document.createElement('div');
-                card.className = 'cancelled-card mb-3';
+                card.className = 'appointment-card search-result mb-3';
+                // highlight ya viene escapado, con las coincidencias entre <mark>
                 card.innerHTML = `
-                    <div>
-                        <h6 class="mb-1 text-muted"><del>${apt.patient_name}</del></h6>
-                        <small class="text-muted">
-                            <i class="far fa-calendar"></i> Programada: ${aptDate.toLocaleDateString('es-PE')} ${aptDate.toLocaleTimeString('es-PE', {hour: '2-digit', minute: '2-digit'})}
-                        </small>
-                        <br><small class="text-danger">
-                            <i class="fas fa-ban"></i> Cancelada: ${cancelledDate.toLocaleDateString('es-PE')} ${cancelledDate.toLocaleTimeString('es-PE', {hour: '2-digit', minute: '2-digit'})}
-                        </small>
-                        ${apt.cancellation_reason ? `<br><small class="text-muted"><i class="fas fa-info-circle"></i> ${apt.cancellation_reason}</small>` : ''}
-                    </div>
+                    <h6 class="mb-1">${apt.highlight.patient_name} <span class="badge bg-secondary">${apt.status}</span></h6>
+                    <small class="text-muted">
+                        <i class="far fa-calendar"></i> ${aptDate.toLocaleDateString('es-PE')} ${aptDate.toLocaleTimeString('es-PE', {hour: '2-digit', minute: '2-digit'})}
+                    </small>
+                    ${apt.highlight.notes ? `<br><small class="text-muted"><i class="fas fa-sticky-note"></i> ${apt.highlight.notes}</small>` : ''}
                 `;
+                card.addEventListener('click', () => showInCalendar(apt));
                 container.appendChild(card);
             });
+            
+            if (nextCursor) {
+                const more = document.createElement('button');
+                more.id = 'search-more';
+                more.className = 'btn btn-outline-secondary btn-sm w-100';
+                more.innerHTML = '<i class="fas fa-chevron-down"></i> Ver más';
+                more.addEventListener('click', () => searchAppointments(q, nextCursor));
+                container.appendChild(more);
+            }
         })
+        .catch(error => {
+            console.error('Error searching appointments:', error);
+            container.innerHTML = '<div class="text-center text-danger py-3">Error al buscar citas</div>';
+        });
+}
+
+// Las canceladas no están en el calendario: solo se muestra su fecha
+function showInCalendar(apt) {
+    const calendarTab = document.getElementById('calendar-tab');
+    if (calendarTab) bootstrap.Tab.getOrCreateInstance(calendarTab).show();
+    calendar.changeView('timeGridDay', apt.start_datetime);
+}
+
+// ✅ NUEVO: Cargar citas canceladas (paginadas por cursor)
+const CANCELLED_PAGE_SIZE = 50;
+
+function loadCancelledAppointments(cursor) {
+    if (!canManageAppointments()) return;
+    
+    const container = document.getElementById('cancelled-list');
+    if (!container) return;
+    
+    const params = new URLSearchParams({ limit: CANCELLED_PAGE_SIZE });
+    if (cursor) {
+        params.set('cursor', cursor);
+        const moreBtn = document.getElementById('cancelled-more');
+        if (moreBtn) moreBtn.remove();
+    } else {
+        container.innerHTML = '<div class="text-center py-3"><i class="fas fa-spinner fa-spin"></i> Cargando...</div>';
+    }
+    
+    fetch(`/api/appointments/cancelled?${params}`)
+        .then(response => response.json().then(appointments => ({
+            appointments,
+            nextCursor: response.headers.get('X-Next-Cursor')
+        })))
+        .then(({appointments, nextCursor}) => renderCancelled(appointments, nextCursor, !!cursor))
         .catch(error => {
             console.error('Error loading cancelled appointments:', error);
             container.innerHTML = '<div class="text-center text-danger py-3">Error al cargar historial</div>';
         });
 }
 
+function renderCancelled(appointments, nextCursor, append) {
+    const container = document.getElementById('cancelled-list');
+    if (!container) return;
+    
+    if (!append && appointments.length === 0) {
+        container.innerHTML = '<div class="text-center text-muted py-4">No hay citas canceladas</div>';
+        return;
+    }
+    
+    if (!append) container.innerHTML = '';
+    appointments.forEach(apt => {
+        const cancelledDate = new Date(apt.cancelled_at);
+        const aptDate = new Date(apt.start_datetime);
+        
+        const card = document.createElement('div');
+        card.className = 'cancelled-card mb-3';
+        card.innerHTML = `
+            <div>
+                <h6 class="mb-1 text-muted"><del>${apt.patient_name}</del></h6>
+                <small class="text-muted">
+                    <i class="far fa-calendar"></i> Programada: ${aptDate.toLocaleDateString('es-PE')} ${aptDate.toLocaleTimeString('es-PE', {hour: '2-digit', minute: '2-digit'})}
+                </small>
+                <br><small class="text-danger">
+                    <i class="fas fa-ban"></i> Cancelada: ${cancelledDate.toLocaleDateString('es-PE')} ${cancelledDate.toLocaleTimeString('es-PE', {hour: '2-digit', minute: '2-digit'})}
+                </small>
+                ${apt.cancellation_reason ? `<br><small class="text-muted"><i class="fas fa-info-circle"></i> ${apt.cancellation_reason}</small>` : ''}
+            </div>
+        `;
+        container.appendChild(card);
+    });
+    
+    if (nextCursor) {
+        const moreBtn = document.createElement('button');
+        moreBtn.id = 'cancelled-more';
+        moreBtn.className = 'btn btn-outline-secondary btn-sm w-100';
+        moreBtn.innerHTML = '<i class="fas fa-chevron-down"></i> Ver más';
+        moreBtn.addEventListener('click', () => loadCancelledAppointments(nextCursor));
+        container.appendChild(moreBtn);
+    }
+}
+
 function loadStatistics() {
     fetch('/api/stats')
         .then(response => response.json())
-        .then(data => {
-            const roleBadge = document.querySelector('.role-badge');
-            
-            if (roleBadge && roleBadge.classList.contains('admin')) {
-                document.getElementById('stat1').textContent = data.total_users || 0;
-                document.getElementById('label1').textContent = 'Total Usuarios';
-                
-                document.getElementById('stat2').textContent = data.total_appointments || 0;
-                document.getElementById('label2').textContent = 'Total Citas';
-                
-                document.getElementById('stat3').textContent = data.active_appointments || 0;
-                document.getElementById('label3').textContent = 'Citas Activas';
-            } else if (roleBadge && roleBadge.classList.contains('profesional')) {
-                document.getElementById('stat1').textContent = data.my_appointments || 0;
-                document.getElementById('label1').textContent = 'Mis Citas';
-                
-                document.getElementById('stat2').textContent = data.pending || 0;
-                document.getElementById('label2').textContent = 'Pendientes';
-                
-                document.getElementById('stat3').textContent = data.completed || 0;
-                document.getElementById('label3').textContent = 'Completadas';
-            } else {
-                document.getElementById('stat1').textContent = data.my_appointments || 0;
-                document.getElementById('label1').textContent = 'Mis Citas';
-                
-                document.getElementById('stat2').textContent = data.upcoming || 0;
-                document.getElementById('label2').textContent = 'Próximas';
-                
-                document.getElementById('stat3').textContent = 0;
-                document.getElementById('label3').textContent = 'Historial';
-            }
-            
-            animateCounters();
-        })
+        .then(renderStatistics)
         .catch(error => console.error('Error loading statistics:', error));
 }
 
+function renderStatistics(data) {
+    const roleBadge = document.querySelector('.role-badge');
+    
+    if (roleBadge && roleBadge.classList.contains('admin')) {
+        document.getElementById('stat1').textContent = data.total_users || 0;
+        document.getElementById('label1').textContent = 'Total Usuarios';
+        
+        document.getElementById('stat2').textContent = data.total_appointments || 0;
+        document.getElementById('label2').textContent = 'Total Citas';
+        
+        document.getElementById('stat3').textContent = data.active_appointments || 0;
+        document.getElementById('label3').textContent = 'Citas Activas';
+    } else if (roleBadge && roleBadge.classList.contains('profesional')) {
+        document.getElementById('stat1').textContent = data.my_appointments || 0;
+        document.getElementById('label1').textContent = 'Mis Citas';
+        
+        document.getElementById('stat2').textContent = data.pending || 0;
+        document.getElementById('label2').textContent = 'Pendientes';
+        
+        document.getElementById('stat3').textContent = data.completed || 0;
+        document.getElementById('label3').textContent = 'Completadas';
+    } else {
+        document.getElementById('stat1').textContent = data.my_appointments || 0;
+        document.getElementById('label1').textContent = 'Mis Citas';
+        
+        document.getElementById('stat2').textContent = data.upcoming || 0;
+        document.getElementById('label2').textContent = 'Próximas';
+        
+        document.getElementById('stat3').textContent = 0;
+        document.getElementById('label3').textContent = 'Historial';
+    }
+    
+    animateCounters();
+}
+
 function animateCounters() {
     document.querySelectorAll('.stat-value').forEach(el => {
         const target = parseInt(el.textContent);
@@ -566,8 +793,3 @@ function showToast(message, type) {
         setTimeout(() => toastContainer.remove(), 300);
     }, duration);
 }
-
-// ✅ Cargar historial de canceladas al inicio
-if (document.getElementById('cancelled-list')) {
-    loadCancelledAppointments();
-}
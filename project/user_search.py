@@ -0,0 +1,116 @@
+"""
+Búsqueda de usuarios compartida por la tabla del panel de admin
+(GET /admin/users) y el selector de clientes del dashboard (GET /api/clients).
+
+Busca por usuario o email sin distinguir mayúsculas, por prefijo (lo normal
+en un typeahead) o por subcadena, y filtra por rol y estado. Los resultados
+se paginan por cursor con project.pagination, así que ninguna de las dos
+pantallas carga todos los usuarios.
+
+Índices (migración 6):
+  - SQLite: índices de expresión sobre lower(username) y lower(email). El
+    prefijo se busca como rango (lower(col) >= q AND lower(col) < q'), que
+    usa esos índices; LIKE no los usaría. La subcadena recorre la tabla.
+    lower() de SQLite solo convierte letras ASCII.
+  - PostgreSQL: índices GIN de trigramas (pg_trgm) sobre las mismas
+    expresiones, que sirven para LIKE por prefijo y por subcadena.
+"""
+from sqlalchemy import and_, func, or_
+
+from project import db
+from project.models import User
+
+ROLES = ('admin', 'profesional', 'cliente')
+MATCH_MODES = ('prefix', 'contains')
+MAX_QUERY_LENGTH = 100
+
+# Orden de los resultados; el id desempata y hace único el cursor
+SORTS = {
+    'id': [(User.id, 'asc')],
+    '-id': [(User.id, 'desc')],
+    'username': [(User.username, 'asc'), (User.id, 'asc')],
+    '-username': [(User.username, 'desc'), (User.id, 'desc')],
+}
+
+SEARCH_COLUMNS = (User.username, User.email)
+
+
+def parse_search_args(args, default_sort='id'):
+    """
+    Lee q, match, role, active y sort de los query params.
+
+    Returns:
+        (filtros para search_users, orden para paginated_response)
+
+    Raises:
+        ValueError: Si algún parámetro es inválido
+    """
+    text = (args.get('q') or '').strip()
+    if len(text) > MAX_QUERY_LENGTH:
+        raise ValueError(f'q admite hasta {MAX_QUERY_LENGTH} caracteres')
+
+    match = args.get('match') or 'prefix'
+    if match not in MATCH_MODES:
+        raise ValueError(f'match debe ser uno de: {", ".join(MATCH_MODES)}')
+
+    role = args.get('role') or None
+    if role is not None and role not in ROLES:
+        raise ValueError('Rol inválido')
+
+    active = args.get('active')
+    if active in (None, ''):
+        active = None
+    elif active in ('1', 'true'):
+        active = True
+    elif active in ('0', 'false'):
+        active = False
+    else:
+        raise ValueError('active debe ser 1 o 0')
+
+    sort = args.get('sort') or default_sort
+    if sort not in SORTS:
+        raise ValueError(f'sort debe ser uno de: {", ".join(SORTS)}')
+
+    return {'text': text, 'match': match, 'role': role, 'active': active}, SORTS[sort]
+
+
+def _prefix_upper_bound(prefix):
+    """Menor texto mayor que todos los que empiezan con `prefix`."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def text_condition(text, match='prefix', dialect=None):
+    """Condición "usuario o email coinciden con `text`" (sin distinguir mayúsculas)."""
+    text = text.lower()
+    if dialect is None:
+        dialect = db.engine.dialect.name
+
+    conditions = []
+    for column in SEARCH_COLUMNS:
+        normalized = func.lower(column)
+        if match == 'contains':
+            conditions.append(normalized.contains(text, autoescape=True))
+        elif dialect == 'sqlite':
+            conditions.append(and_(normalized >= text, normalized < _prefix_upper_bound(text)))
+        else:
+            conditions.append(normalized.startswith(text, autoescape=True))
+    return or_(*conditions)
+
+
+def search_users(query, text='', match='prefix', role=None, active=None):
+    """
+    Filtra una query de usuarios (entidades o columnas de User).
+
+    Args:
+        text: Texto a buscar en usuario o email; vacío para no filtrar
+        match: 'prefix' o 'contains'
+        role: Solo usuarios con este rol
+        active: True/False para filtrar por estado
+    """
+    if role is not None:
+        query = query.filter(User.role == role)
+    if active is not None:
+        query = query.filter(User.is_active == active)
+    if text:
+        query = query.filter(text_condition(text, match))
+    return query
@@ -0,0 +1,99 @@
+"""
+Versiones de cambios para requests condicionales (ETag / If-None-Match).
+
+Cada escritura incrementa contadores en memoria por alcance: todas las citas
+(vista de admin), las de un profesional, las de un cliente y la lista de
+usuarios. Las rutas de lectura arman el ETag con los contadores de lo que
+muestran y responden 304 antes de consultar la base si no cambió.
+
+Como el bus de notificaciones, vive en el proceso y cambia de época en cada
+arranque para que un ETag viejo nunca coincida. Los cambios de citas que
+confirman otros procesos (el scheduler, otro worker) llegan por
+ConflictEngine.sync(), que el hilo de project.relay corre cada
+RELAY_POLL_SECONDS.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from flask import Response, request
+
+ALL_APPOINTMENTS = ('appointments',)
+USERS = ('users',)
+
+
+class ChangeVersions:
+    """Contadores por alcance, seguros entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = defaultdict(int)
+        self._epoch = uuid.uuid4().hex[:8]
+
+    def bump(self, *scopes):
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] += 1
+
+    def renew_epoch(self):
+        """Invalida todos los ETag emitidos (cuando no se sabe qué cambió)."""
+        with self._lock:
+            self._epoch = uuid.uuid4().hex[:8]
+
+    def token(self, *scopes):
+        with self._lock:
+            return self._epoch + '-' + '.'.join(str(self._versions[scope]) for scope in scopes)
+
+
+versions = ChangeVersions()
+
+
+def bump_appointments(professional_id, *client_ids):
+    """Registra un cambio en las citas de un profesional (y sus clientes)."""
+    scopes = [ALL_APPOINTMENTS, ('profesional', professional_id)]
+    scopes += [('cliente', client_id) for client_id in client_ids if client_id]
+    versions.bump(*scopes)
+
+
+def bump_users():
+    versions.bump(USERS)
+
+
+def appointment_scope(user):
+    """Alcance de las citas que ve un usuario."""
+    if user.is_admin():
+        return ALL_APPOINTMENTS
+    if user.is_professional():
+        return ('profesional', user.id)
+    return ('cliente', user.id)
+
+
+def make_etag(scopes, *extra, ttl=None):
+    """
+    ETag a partir de las versiones de `scopes` y datos que afectan la
+    respuesta (usuario, query string...).
+
+    Args:
+        ttl: Si la respuesta depende de la hora, segundos que puede reutilizarse
+    """
+    if ttl:
+        extra += (int(time.time() // ttl),)
+    digest = hashlib.blake2b(repr(extra).encode(), digest_size=8).hexdigest()
+    return f'{versions.token(*scopes)}-{digest}'
+
+
+def not_modified(etag):
+    """Respuesta 304 si el cliente ya tiene esta versión; None si no."""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        return with_etag(response, etag)
+    return None
+
+
+def with_etag(response, etag):
+    # ETag débil: sigue siendo válido cuando la respuesta se comprime
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -4,6 +4,11 @@ from project import create_app
 app = create_app()
 
 if __name__ == '__main__':
-    # En desarrollo local
+    # En desarrollo local: preparar la base (en producción lo hace `flask setup`)
+    from project.seed import setup_database
+    
+    with app.app_context():
+        setup_database()
+    
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)